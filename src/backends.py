@@ -0,0 +1,250 @@
+# Import dependencies
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+import pandas as pd
+from store import project_root, apply_schema, load_table
+from aggregates import (
+    feature_tables, feature_views, source_rows, sort_order, PandasBackend, write_feature_tables
+)
+
+
+# Execution backends for the feature views in src/aggregates.py. Besides the pandas engine,
+# the views are compiled to SQL and run on an in-memory SQLite database, standing in for the
+# Postgres the notebook used. SQLite has no MODE() or PERCENTILE_CONT(), so they are written
+# with window functions, and rint() is registered from Python and runs once per group. A
+# differential check runs every view on every backend and requires identical tables, and a
+# benchmark times each view per backend and picks the faster one. The picks are kept on disk,
+# and `build --backend auto` runs each view on its pick.
+picks_path = os.path.join(project_root, 'data', 'benchmarks', 'backend_picks.json')
+
+
+def rint(value):
+    return None if value is None else float(np.rint(value))
+
+
+def order_sql(order):
+    cols, ascending = sort_order(order)
+    return ', '.join(col if up else f'{col} DESC' for col, up in zip(cols, ascending))
+
+
+def aggregate_sql(function, expression):
+    if function == 'count':
+        return 'COUNT(*)'
+    if function == 'sum':
+        return f'SUM({expression})'
+    if function == 'distinct':
+        return f'COUNT(DISTINCT {expression})'
+    raise ValueError(f'unknown aggregate {function}')
+
+
+# MODE() and PERCENTILE_CONT() need each row's place within its group, so rows are numbered
+# with window functions first and the values picked out by that number in the GROUP BY.
+# MODE() WITHIN GROUP (ORDER BY expression) is the most frequent value, the smallest on ties.
+def mode_sql(col, expression):
+    return f'MAX(CASE WHEN {col}_position = 1 THEN {expression} END)'
+
+
+# PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY expression), interpolated like the pandas engine
+def median_sql(col):
+    middle = f'CASE WHEN {col}_position IN (({col}_size + 1) / 2, ({col}_size + 2) / 2) THEN {col}_value END'
+    return f'MIN({middle}) + (MAX({middle}) - MIN({middle})) * 0.5'
+
+
+def derived_sql(function, argument, order):
+    if function == 'rint':
+        return f'rint({argument})'
+    if function == 'round':
+        return f'ROUND({argument})'
+    if function == 'growth':
+        previous = f'LAG({argument}) OVER (ORDER BY {order_sql(order)})'
+        return f'ROUND(({argument} - {previous}) / {previous} * 100)'
+    if function == 'row_number':
+        partition, rank_order = argument
+        return f'ROW_NUMBER() OVER (PARTITION BY {", ".join(partition)} ORDER BY {order_sql(rank_order)})'
+    raise ValueError(f'unknown column function {function}')
+
+
+# SQL for one view over the `orders` table of source rows
+def view_sql(name):
+    view = feature_views[name]
+    keys = ', '.join(view['by'])
+    where = f' WHERE {view["where"]}' if view['where'] else ''
+    query = f'SELECT * FROM orders{where}'
+    counts, positions, grouped = [], [], [keys]
+    for col, function, expression in view['aggregates']:
+        if function == 'mode':
+            counts.append(f'COUNT(*) OVER (PARTITION BY {keys}, {expression}) AS {col}_count')
+            positions.append(
+                f'ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY {col}_count DESC, {expression}) AS {col}_position'
+            )
+            grouped.append(f'{mode_sql(col, expression)} AS {col}')
+        elif function == 'median':
+            positions += [
+                f'{expression} AS {col}_value',
+                f'ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY {expression}) AS {col}_position',
+                f'COUNT(*) OVER (PARTITION BY {keys}) AS {col}_size'
+            ]
+            grouped.append(f'{median_sql(col)} AS {col}')
+        else:
+            grouped.append(f'{aggregate_sql(function, expression)} AS {col}')
+    for layer in [counts, positions]:
+        if layer:
+            query = f'SELECT *, {", ".join(layer)} FROM ({query})'
+    query = f'SELECT {", ".join(grouped)} FROM ({query}) GROUP BY {keys}'
+    for col, function, argument in view['derived']:
+        query = f'SELECT *, {derived_sql(function, argument, view["order"])} AS {col} FROM ({query})'
+    return f'SELECT {", ".join(view["columns"])} FROM ({query}) ORDER BY {order_sql(view["order"])}'
+
+
+# Views run as SQL on an in-memory SQLite database holding the source rows
+class SQLiteBackend:
+    name = 'sqlite'
+
+    def __init__(self, rows):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.create_function('rint', 1, rint, deterministic=True)
+        columns = {}
+        for col in rows:
+            values = rows[col]
+            if values.dtype.kind == 'M':
+                values = values.dt.strftime('%Y-%m-%d')
+            elif values.dtype.kind == 'b':
+                values = values.astype('int64')
+            columns[col] = values.astype(object).where(values.notna(), None).tolist()
+        self.connection.execute(f'CREATE TABLE orders ({", ".join(columns)})')
+        self.connection.executemany(
+            f'INSERT INTO orders VALUES ({", ".join("?" * len(columns))})', zip(*columns.values())
+        )
+
+    def run(self, name):
+        return pd.read_sql_query(view_sql(name), self.connection)
+
+
+backends = {'pandas': PandasBackend, 'sqlite': SQLiteBackend}
+
+
+# Every view on every backend, each table cast to its schema. Returns backend -> table name ->
+# table, and backend -> seconds spent loading the rows and running each view.
+def run_backends(orders, names=backends):
+    rows = source_rows(orders)
+    tables, seconds = {}, {}
+    for name in names:
+        start = time.perf_counter()
+        engine = backends[name](rows)
+        seconds[name] = {'load': time.perf_counter() - start}
+        tables[name] = {}
+        for table in feature_tables:
+            start = time.perf_counter()
+            tables[name][table] = apply_schema(engine.run(table), table)
+            seconds[name][table] = time.perf_counter() - start
+    return tables, seconds
+
+
+# Differential check: the tables every backend returns must equal the pandas ones. Returns
+# (backend, table, what differs) for each mismatch.
+def differences(tables):
+    found = []
+    for name, results in tables.items():
+        for table, result in results.items():
+            expected = tables['pandas'][table]
+            if result.equals(expected):
+                continue
+            if list(result.columns) != list(expected.columns):
+                found.append((name, table, f'columns {list(result.columns)}'))
+            elif len(result) != len(expected):
+                found.append((name, table, f'{len(result)} rows, pandas has {len(expected)}'))
+            else:
+                cols = [col for col in result if not result[col].equals(expected[col])]
+                found.append((name, table, f'values differ in {", ".join(cols)}'))
+    return found
+
+
+# Faster backend per view, on view time alone: the load is paid once for all views
+def fastest(seconds):
+    return {
+        table: min(seconds, key=lambda name: seconds[name][table])
+        for table in feature_tables
+    }
+
+
+def write_picks(picks, path=picks_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(picks, f, indent=1)
+
+
+# Stored picks, or None when no benchmark wrote any or they miss a view
+def read_picks(path=picks_path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        picks = json.load(f)
+    if set(picks) != set(feature_tables) or not set(picks.values()) <= set(backends):
+        return None
+    return picks
+
+
+# Every view on its picked backend (view -> backend name). Rows are loaded once into each
+# backend that is picked at least once.
+def build_tables(orders, picks):
+    rows = source_rows(orders)
+    engines = {name: backends[name](rows) for name in dict.fromkeys(picks.values())}
+    return {table: apply_schema(engines[picks[table]].run(table), table) for table in feature_tables}
+
+
+def print_timings(seconds):
+    picks = fastest(seconds)
+    print(f"{'view':<22}" + ''.join(f'{name:>10}' for name in seconds) + f"{'faster':>10}")
+    for table in ['load', *feature_tables]:
+        print(f'{table:<22}' + ''.join(f'{seconds[name][table]:>10.3f}' for name in seconds) + f'{picks.get(table, ""):>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the feature views on a choice of backend.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='write the feature tables with one backend')
+    build.add_argument('--backend', choices=[*backends, 'auto'], default='pandas',
+                       help='auto runs each view on the faster backend of the last bench, timing them first if none')
+    check = subparsers.add_parser('check', help='exit with status 1 unless every backend returns the same tables')
+    bench = subparsers.add_parser('bench', help='time every view on every backend and pick the faster')
+    bench.add_argument('--repeat', type=int, default=3, help='keep the fastest of this many runs')
+    sql = subparsers.add_parser('sql', help='print the SQL of a view')
+    sql.add_argument('view', choices=feature_tables)
+    for command in [build, check, bench]:
+        command.add_argument('--orders', default='orders', help='store table with the cleaned orders')
+    args = parser.parse_args()
+
+    if args.command == 'sql':
+        print(view_sql(args.view))
+    elif args.command == 'build':
+        orders = load_table(args.orders)
+        if args.backend == 'auto':
+            picks = read_picks()
+            if picks is None:
+                picks = fastest(run_backends(orders)[1])
+                write_picks(picks)
+        else:
+            picks = dict.fromkeys(feature_tables, args.backend)
+        write_feature_tables(build_tables(orders, picks))
+    elif args.command == 'check':
+        found = differences(run_backends(load_table(args.orders))[0])
+        for name, table, detail in found:
+            print(f'{table} on {name}: {detail}')
+        print(f'{len(found)} differences across {len(feature_tables)} views and {len(backends)} backends')
+        sys.exit(1 if found else 0)
+    else:
+        orders = load_table(args.orders)
+        best = {}
+        for _ in range(args.repeat):
+            seconds = run_backends(orders)[1]
+            for name, steps in seconds.items():
+                for step, value in steps.items():
+                    best.setdefault(name, {})[step] = min(value, best.get(name, {}).get(step, value))
+        print(f'{len(orders):,} order lines')
+        print_timings(best)
+        write_picks(fastest(best))
@@ -0,0 +1,288 @@
+# Import dependencies
+import argparse
+import filecmp
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pandas_cleaning
+import aggregates
+import backends
+import imputation
+import visualization
+import profiler
+from store import write_table
+from synthetic import generate
+
+
+# Repeatable benchmarks for every cleaning stage, feature aggregate and figure. Inputs are
+# synthetic reports of a given size and seed, so runs are comparable across commits. Each run
+# is appended to data/benchmarks/history.jsonl and compared with the previous run of the
+# same size and seed; steps that got slower by more than the threshold are flagged.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+benchmark_path = os.path.join(project_root, 'data', 'benchmarks')
+history_path = os.path.join(benchmark_path, 'history.jsonl')
+regression_threshold = 0.2
+# Differences below this are timer noise on small inputs
+regression_floor = 0.05
+suites = ['clean', 'aggregates', 'figures']
+# Opt-in: the parallel cleaning speedup curve, and the feature views on every backend
+extra_suites = ['parallel', 'backends']
+# Reports above this many rows are cleaned in chunks, like stream_clean, so the raw frame is
+# never held in memory at once
+stream_rows = 2_000_000
+stream_chunksize = 500_000
+
+
+# Run `func` and record its wall time under `name`, keeping the fastest of repeated runs
+def timed(results, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    results[name] = min(elapsed, results.get(name, elapsed))
+    return value
+
+
+# Run `func` and add its wall time to `name`, for steps that run once per chunk
+def summed(results, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    results[name] = results.get(name, 0) + time.perf_counter() - start
+    return value
+
+
+def raw_report(rows, seed):
+    path = os.path.join(benchmark_path, f'raw-{rows}-{seed}.csv')
+    if not os.path.exists(path):
+        os.makedirs(benchmark_path, exist_ok=True)
+        generate(rows, path, seed)
+    return path
+
+
+def bench_clean(results, path, rows):
+    if rows > stream_rows:
+        return bench_stream_clean(results, path)
+    df = timed(results, 'clean/read_raw', pandas_cleaning.read_raw, path)
+    df = timed(results, 'clean/normalize', pandas_cleaning.normalize_orders, df)
+    df = timed(results, 'clean/dedup', pandas_cleaning.drop_duplicate_orders, df)
+    df = timed(results, 'clean/status', pandas_cleaning.reconcile_orders, df)
+    df = timed(results, 'clean/states', pandas_cleaning.fix_addresses, df)
+    df = timed(results, 'clean/payments', imputation.impute_orders, df)
+    return timed(results, 'clean/cities', imputation.build_orders, df)
+
+
+# Chunks parse their categoricals with their own categories. Widen them to the union first
+# so they concatenate as categoricals rather than as object columns.
+def concat_chunks(chunks):
+    for col in chunks[0].select_dtypes('category'):
+        categories = union_categoricals([chunk[col] for chunk in chunks], sort_categories=True).categories
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks)
+
+
+# The streamed cleaning: a key pass finds the duplicates, then every stage up to the address
+# fixes one chunk at a time, with stage times summed over the chunks. Payments and cities
+# impute from modes over all orders, so they run once on the cleaned chunks put together.
+def bench_stream_clean(results, path, chunksize=stream_chunksize):
+    seconds = {}
+    keep = summed(seconds, 'clean/dedup', pandas_cleaning.build_keep_mask, path, chunksize)
+    reader = pandas_cleaning.read_raw(path, chunksize=chunksize)
+    chunks, start = [], 0
+    while (chunk := summed(seconds, 'clean/read_raw', next, reader, None)) is not None:
+        chunk_keep = keep[start:start + len(chunk)]
+        start += len(chunk)
+        chunk = chunk[chunk_keep]
+        chunk = summed(seconds, 'clean/normalize', pandas_cleaning.normalize_orders, chunk)
+        chunk = summed(seconds, 'clean/status', pandas_cleaning.reconcile_orders, chunk)
+        chunks.append(summed(seconds, 'clean/states', pandas_cleaning.fix_addresses, chunk))
+    df = summed(seconds, 'clean/concat', concat_chunks, chunks)
+    df = summed(seconds, 'clean/payments', imputation.impute_orders, df)
+    df = summed(seconds, 'clean/cities', imputation.build_orders, df)
+    for name, elapsed in seconds.items():
+        results[name] = min(elapsed, results.get(name, elapsed))
+    return df
+
+
+def bench_aggregates(results, orders):
+    rows = timed(results, 'aggregates/source_rows', aggregates.source_rows, orders)
+    engine = aggregates.PandasBackend(rows)
+    return {
+        name: timed(results, f'aggregates/{name}', engine.run, name)
+        for name in aggregates.feature_tables
+    }
+
+
+# Every feature view on every backend. All backends must return the same tables.
+def bench_backends(results, orders):
+    tables, seconds = backends.run_backends(orders)
+    found = backends.differences(tables)
+    if found:
+        raise AssertionError('; '.join(f'{table} on {name}: {detail}' for name, table, detail in found))
+    for name, steps in seconds.items():
+        for step, value in steps.items():
+            results[f'backends/{name}/{step}'] = min(value, results.get(f'backends/{name}/{step}', value))
+
+
+# Faster backend per view, from the backends suite
+def backend_picks(results):
+    seconds = {}
+    for name, value in results.items():
+        if name.startswith('backends/'):
+            _, backend, step = name.split('/')
+            seconds.setdefault(backend, {})[step] = value
+    if seconds:
+        backends.print_timings(seconds)
+
+
+# Figures are drawn from the synthetic tables into a scratch directory
+def bench_figures(results, orders, tables, rows):
+    path = os.path.join(benchmark_path, f'tables-{rows}')
+    figures = os.path.join(benchmark_path, 'figures')
+    os.makedirs(path, exist_ok=True)
+    os.makedirs(figures, exist_ok=True)
+    aggregates.write_feature_tables(tables, path)
+    orders.to_csv(os.path.join(path, 'orders.csv'), index=False)
+    write_table(orders, 'orders', path)
+    visualization.figures_path = figures
+    visualization.data = timed(results, 'figures/load_data', visualization.load_data, path)
+    for name in visualization.figures:
+        timed(results, f'figures/{name}', visualization.render, name)
+
+
+def serial_export(path, output):
+    df = pandas_cleaning.clean(pandas_cleaning.read_raw(path))
+    pandas_cleaning.export_orders(df, output)
+    return df
+
+
+# Cleaning and export with 1 to N workers, against the serial run. Every parallel export must
+# match the serial one exactly.
+def bench_parallel(results, path, workers):
+    scratch = os.path.join(benchmark_path, 'parallel')
+    os.makedirs(scratch, exist_ok=True)
+    serial_output = os.path.join(scratch, 'serial.csv')
+    # The serial run has no profiling hooks, so the parallel runs are timed without them too.
+    # The other suites are timed with the profiler as configured.
+    profiling, profiler.enabled = profiler.enabled, False
+    try:
+        serial = timed(results, 'parallel/serial', serial_export, path, serial_output)
+        for n in workers:
+            output = os.path.join(scratch, f'workers-{n}.csv')
+            df = timed(results, f'parallel/workers_{n}', pandas_cleaning.parallel_clean, path, output, n)
+            if not (df.equals(serial) and filecmp.cmp(serial_output, output, shallow=False)):
+                raise AssertionError(f'parallel cleaning with {n} workers does not match the serial run')
+    finally:
+        profiler.enabled = profiling
+
+
+def speedup_curve(results):
+    serial = results.get('parallel/serial')
+    curve = {int(name.rpartition('_')[2]): seconds for name, seconds in results.items() if name.startswith('parallel/workers_')}
+    if serial and curve:
+        print(f"{'workers':>8}{'seconds':>10}{'speedup':>9}")
+        for n, seconds in sorted(curve.items()):
+            print(f'{n:>8}{seconds:>10.3f}{serial / seconds:>8.2f}x')
+
+
+def run(rows, seed=0, repeat=1, selected=suites, workers=()):
+    path = raw_report(rows, seed)
+    results = {}
+    for _ in range(repeat):
+        # Suites that are not selected still run to feed the next one, untimed
+        if set(selected) & set(suites + ['backends']):
+            orders = bench_clean(results if 'clean' in selected else {}, path, rows)
+            tables = bench_aggregates(results if 'aggregates' in selected else {}, orders)
+        if 'figures' in selected:
+            bench_figures(results, orders, tables, rows)
+        if 'parallel' in selected:
+            bench_parallel(results, path, workers)
+        if 'backends' in selected:
+            bench_backends(results, orders)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history():
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(record):
+    os.makedirs(benchmark_path, exist_ok=True)
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+# Compare with the previous run of the same size. Returns the steps that regressed.
+def compare(record, history):
+    previous = [past for past in history if past['rows'] == record['rows'] and past['seed'] == record['seed']]
+    baseline = previous[-1]['results'] if previous else {}
+    regressions = []
+    print(f"{'step':<55}{'seconds':>10}{'previous':>10}{'change':>9}")
+    for name, seconds in record['results'].items():
+        before = baseline.get(name)
+        change = '' if not before else f'{(seconds - before) / before:+.0%}'
+        flag = ''
+        if before and seconds > before * (1 + regression_threshold) and seconds - before > regression_floor:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        before = '' if before is None else f'{before:.3f}'
+        print(f'{name:<55}{seconds:>10.3f}{before:>10}{change:>9}{flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the cleaning stages, aggregates and figures.',
+        epilog=f'Reports of up to {stream_rows:,} rows are cleaned in memory, one stage at a time. Larger '
+               f'ones are cleaned in chunks of {stream_chunksize:,} rows like stream_clean: a clean/dedup '
+               'pass over the keys finds the duplicates, each stage time is summed over the chunks, and '
+               'only the cleaned orders are held in memory for the payment and city imputation and the '
+               'later suites.'
+    )
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000], help='synthetic report sizes, e.g. 1000000 10000000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='keep the fastest of this many runs')
+    parser.add_argument('--suites', nargs='+', choices=suites + extra_suites, default=suites)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count()}),
+                        help='worker counts for the parallel suite')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when a step regressed')
+    args = parser.parse_args()
+
+    regressed = False
+    history = read_history()
+    for rows in args.rows:
+        print(f'\n{rows:,} rows')
+        record = {
+            'time': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'rows': rows,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'cpus': os.cpu_count(),
+            'results': run(rows, args.seed, args.repeat, args.suites, args.workers)
+        }
+        regressed |= bool(compare(record, history))
+        speedup_curve(record['results'])
+        backend_picks(record['results'])
+        append_history(record)
+        history.append(record)
+    sys.exit(1 if args.check and regressed else 0)
@@ -0,0 +1,65 @@
+# Import dependencies
+from collections.abc import Mapping
+import pandas as pd
+from store import store_path, schemas, load_table
+from compact import compact_tables, load_compact
+from categoricals import relabel_categories
+from instrument import step
+
+
+# Lazy catalog of named datasets. Each entry is a function of the catalog that builds its
+# value; nothing is built until the entry is first read, and then it is kept, so a run only
+# pays for the tables and frames it touches. Entries can read other entries, which are built
+# on demand in turn.
+class Catalog(Mapping):
+    def __init__(self, entries=None, path=store_path):
+        self.entries = dict(entries or {})
+        self.path = path
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            if name not in self.entries:
+                raise KeyError(name)
+            with step(f'load {name}') as info:
+                value = self.entries[name](self)
+                info['rows_out'] = len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None
+            self.values[name] = value
+        return self.values[name]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Entries built so far
+    def loaded(self):
+        return list(self.values)
+
+    def clear(self):
+        self.values.clear()
+
+
+# Catalog entry for a store table. `columns` are the only ones read (all when None), their
+# dtypes are the ones the store declares for the table, and `relabel` maps a categorical
+# column to the labels to rename in it, applied once here rather than by every consumer.
+def table(name, columns=None, relabel=None):
+    unknown = [col for col in columns or [] if col not in schemas[name]]
+    if unknown:
+        raise ValueError(f'{name} has no columns {", ".join(unknown)}')
+
+    def build(catalog):
+        # Compact tables are mapped from their file rather than read
+        if name in compact_tables:
+            df = load_compact(name, columns, catalog.path)
+        else:
+            df = load_table(name, columns, catalog.path)
+        fixes = {col: mapping for col, mapping in (relabel or {}).items() if col in df}
+        if fixes:
+            # Shallow copy: the relabeled columns are replaced, the others shared
+            df = df.copy(deep=False)
+            for col, mapping in fixes.items():
+                df[col] = relabel_categories(df[col], mapping)
+        return df
+    return build
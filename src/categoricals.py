@@ -0,0 +1,62 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+
+
+# Transforms for categorical columns that rewrite the category dictionary and the integer codes
+# instead of the rows, so their cost grows with the number of distinct values. Results stay
+# categorical with lexically sorted categories, like a fresh astype('category').
+
+
+def from_codes(series, codes, categories):
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=series.index, name=series.name)
+
+
+# Relabel a categorical by rewriting its categories. `mapping` is a dict of old -> new labels
+# or a function applied to every label. Labels mapped onto the same value are merged.
+def relabel_categories(series, mapping):
+    old = series.cat.categories
+    if callable(mapping):
+        labels = old.map(mapping)
+    else:
+        labels = old.map(lambda label: mapping.get(label, label))
+    categories = pd.Index(sorted(pd.unique(np.asarray(labels, dtype=object))), dtype=old.dtype)
+    lookup = categories.get_indexer(labels)
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, lookup[codes], -1)
+    return from_codes(series, codes, categories)
+
+
+# Index of `value` in the series' categories, adding it when missing
+def category_code(series, value):
+    if value not in series.cat.categories:
+        series = relabel_categories(series.cat.add_categories(value), {})
+    return series, series.cat.categories.get_loc(value)
+
+
+# Set rows selected by `mask` to `value`
+def assign_category(series, mask, value):
+    series, code = category_code(series, value)
+    codes = series.cat.codes.to_numpy().copy()
+    codes[np.asarray(mask, dtype=bool)] = code
+    return from_codes(series, codes, series.cat.categories)
+
+
+# Fill missing values with `value`
+def fill_category(series, value):
+    return assign_category(series, series.cat.codes.to_numpy() < 0, value)
+
+
+# Row mask for values in `values`, matched on the codes
+def category_mask(series, values):
+    codes = series.cat.categories.get_indexer(pd.Index(values))
+    return np.isin(series.cat.codes.to_numpy(), codes[codes >= 0])
+
+
+# Subsets keep the full category list. Drop the unused ones so plots and groupbys only see
+# the labels actually present.
+def drop_unused_categories(df):
+    df = df.copy()
+    for col in df.select_dtypes('category'):
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
@@ -0,0 +1,165 @@
+# Import dependencies
+import argparse
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+from pipeline import cache_path, file_digest, fingerprint
+from store import load_table
+
+
+# Fuzzy ship_city resolver against a reference list of (state, city) names. Cities are
+# indexed by character trigrams per state, so a lookup only scores the few reference names
+# sharing grams with the query before running a bounded edit distance on them. Resolved
+# names are remembered on disk per reference file and reused on the next run.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+reference_path = os.path.join(project_root, 'data', 'reference', 'cities.csv')
+gram_size = 3
+max_candidates = 10
+unknown = 'unknown'
+
+
+def trigrams(name):
+    padded = f' {name} '
+    return {padded[i:i + gram_size] for i in range(len(padded) - gram_size + 1)}
+
+
+# Longer names tolerate more typos
+def max_distance(name):
+    return 1 if len(name) <= 5 else 2
+
+
+# Levenshtein distance, or None once it is certain to exceed `bound`
+def bounded_distance(a, b, bound):
+    if abs(len(a) - len(b)) > bound:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > bound:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= bound else None
+
+
+# Reference list: one row per (state, city), optionally with a count used to break ties
+def load_reference(path=reference_path):
+    reference = pd.read_csv(path, dtype={'ship_state_or_territory': 'string', 'ship_city': 'string'})
+    if 'orders' not in reference:
+        reference['orders'] = 0
+    return reference
+
+
+class CityIndex:
+    def __init__(self, reference):
+        self.cities = reference['ship_city'].to_numpy(dtype=object)
+        self.states = reference['ship_state_or_territory'].to_numpy(dtype=object)
+        self.weights = reference['orders'].to_numpy()
+        self.known = set(self.cities)
+        # (state, gram) -> reference rows; state None indexes every row
+        self.grams = defaultdict(list)
+        for row, (state, city) in enumerate(zip(self.states, self.cities)):
+            for gram in trigrams(city):
+                self.grams[state, gram].append(row)
+                self.grams[None, gram].append(row)
+
+    # Rows sharing the most grams with `city`, within `state` when it is indexed
+    def candidates(self, city, state):
+        grams = trigrams(city)
+        scope = state if any((state, gram) in self.grams for gram in grams) else None
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self.grams.get((scope, gram), ()))
+        return [row for row, _ in overlap.most_common(max_candidates)]
+
+    # Closest reference name within the distance bound; ties go to the most common name
+    def resolve(self, city, state):
+        if city in self.known or city == unknown:
+            return city
+        bound = max_distance(city)
+        best = None
+        for row in self.candidates(city, state):
+            distance = bounded_distance(city, self.cities[row], bound)
+            if distance is not None and (
+                best is None or (distance, -self.weights[row]) < (best[0], -self.weights[best[1]])
+            ):
+                best = (distance, row)
+        return city if best is None else self.cities[best[1]]
+
+
+# Resolved names per reference file and matching code, keyed by 'state|city'
+def memo_path(path):
+    digest = hashlib.sha256(file_digest(path).encode())
+    for part in [trigrams, max_distance, bounded_distance, CityIndex, gram_size, max_candidates]:
+        digest.update(fingerprint(part).encode())
+    return os.path.join(cache_path, f'city_matches-{digest.hexdigest()[:16]}.json')
+
+
+def read_memo(path):
+    if os.path.exists(memo_path(path)):
+        with open(memo_path(path)) as f:
+            return json.load(f)
+    return {}
+
+
+def write_memo(memo, path):
+    os.makedirs(cache_path, exist_ok=True)
+    with open(memo_path(path), 'w') as f:
+        json.dump(memo, f)
+
+
+# Resolve every distinct (state, city) pair once and map the result back onto the rows
+def resolve_cities(orders, path=reference_path):
+    keys = orders[['ship_state_or_territory', 'ship_city']].astype('object')
+    codes = keys.groupby(list(keys.columns), sort=False, dropna=False).ngroup().to_numpy()
+    memo = read_memo(path)
+    index = None
+    resolved = []
+    for state, city in keys.drop_duplicates().itertuples(index=False):
+        state = None if pd.isna(state) else state
+        key = f'{state}|{city}'
+        if key not in memo:
+            if pd.isna(city):
+                memo[key] = None
+            else:
+                index = index or CityIndex(load_reference(path))
+                memo[key] = index.resolve(city, state)
+        resolved.append(memo[key])
+    if index is not None:
+        write_memo(memo, path)
+    resolved = np.array(resolved, dtype=object)
+    orders['ship_city'] = pd.array(resolved[codes], dtype=orders['ship_city'].dtype)
+    return orders
+
+
+# Bootstrap a reference list from the cities seen on at least `min_orders` orders in a state
+def build_reference(orders, min_orders=20):
+    counts = (orders[orders['ship_city'] != unknown]
+              .groupby(['ship_state_or_territory', 'ship_city'], observed=True)
+              .size().rename('orders').reset_index())
+    counts = counts[counts['orders'] >= min_orders]
+    return counts.sort_values(['ship_state_or_territory', 'ship_city']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fuzzy ship_city resolution against a reference list.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='write a reference list from the cleaned orders')
+    build.add_argument('--min-orders', type=int, default=20, help='orders a city needs to be listed')
+    build.add_argument('--orders', default='orders', help='store table with the cleaned orders')
+    resolve = subparsers.add_parser('resolve', help='print the resolved name of a city')
+    resolve.add_argument('city')
+    resolve.add_argument('--state', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        reference = build_reference(load_table(args.orders), args.min_orders)
+        os.makedirs(os.path.dirname(reference_path), exist_ok=True)
+        reference.to_csv(reference_path, index=False)
+        print(f'{len(reference)} cities written to {reference_path}')
+    else:
+        print(CityIndex(load_reference()).resolve(args.city.strip().lower(), args.state))
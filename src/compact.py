@@ -0,0 +1,179 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from store import store_path, schemas, table_path, csv_path, load_table
+
+
+# Compact, memory-mapped layout for order tables. The file is uncompressed Arrow IPC, so it is
+# mapped straight into memory: nothing is read until a column is touched, and processes that
+# open the same file share its pages in the OS page cache instead of each holding a copy.
+#   - string ids (order_id, asin, sku, ...) become codes into one sorted vocabulary per
+#     column, stored once in the file
+#   - categoricals keep their categories; codes of both take the type pandas uses for that
+#     many categories
+#   - integers take the narrowest type that fits, amounts are stored as int32 paise when
+#     that round-trips exactly, and dates as int32 days
+#   - booleans are bit-packed
+# Reading decodes back to the store's dtypes, except that string ids stay categoricals over
+# their vocabulary. Codes without nulls and numbers stored in their declared type are
+# read-only views of the mapped pages. Everything else is decoded into new arrays: booleans,
+# dates, amounts in paise, integers stored narrower than declared, and columns with nulls.
+compact_tables = ['orders']
+int_types = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+amount_scale = 100
+
+
+def compact_path(name, path=store_path):
+    return os.path.join(path, f'{name}.arrow')
+
+
+def narrowest_int(low, high):
+    for kind in int_types:
+        info = np.iinfo(kind.to_pandas_dtype())
+        if info.min <= low and high <= info.max:
+            return kind
+    return pa.int64()
+
+
+# The code type pandas keeps for `n` categories, so codes are read in place
+def code_type(n):
+    return narrowest_int(-1, n + 1)
+
+
+def dictionary_array(codes, labels, index_type):
+    indices = pa.array(codes, type=index_type, mask=codes < 0)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(labels, type=pa.string()))
+
+
+# Arrow array and field metadata for one column of the declared schema
+def encode_column(values, dtype):
+    if dtype == 'string':
+        # Sorting the vocabulary afterwards is much cheaper than factorize(sort=True)
+        codes, vocabulary = pd.factorize(values.to_numpy(dtype=object))
+        order = np.argsort(vocabulary.astype(str), kind='stable')
+        rank = np.empty(len(order), dtype='int32')
+        rank[order] = np.arange(len(order))
+        codes = np.where(codes >= 0, rank[codes], -1)
+        return dictionary_array(codes, vocabulary[order], code_type(len(order))), {}
+    if dtype == 'category':
+        values = values.astype('category')
+        categories = values.cat.categories.astype(str)
+        return dictionary_array(values.cat.codes.to_numpy(), np.asarray(categories, dtype=object),
+                                code_type(len(categories))), {}
+    if dtype == 'bool':
+        return pa.array(values.to_numpy(dtype=bool)), {}
+    if dtype.startswith('datetime'):
+        dates = pd.to_datetime(values)
+        if (dates.dropna() == dates.dropna().dt.normalize()).all():
+            return pa.array(dates.to_numpy().astype('datetime64[D]'), type=pa.date32(), from_pandas=True), {}
+        return pa.array(dates, type=pa.timestamp('ns')), {}
+    numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+    present = numbers[~np.isnan(numbers)]
+    if dtype.startswith('float'):
+        scaled = np.rint(present * amount_scale)
+        exact = len(present) and np.array_equal(scaled / amount_scale, present)
+        if not exact or np.abs(scaled).max() > np.iinfo('int32').max:
+            return pa.array(numbers, type=pa.float64(), from_pandas=True), {}
+        ints = np.rint(np.nan_to_num(numbers) * amount_scale).astype('int32')
+        return pa.array(ints, type=pa.int32(), mask=np.isnan(numbers)), {b'scale': str(amount_scale).encode()}
+    low, high = (present.min(), present.max()) if len(present) else (0, 0)
+    kind = narrowest_int(low, high)
+    ints = np.nan_to_num(numbers).astype(kind.to_pandas_dtype())
+    return pa.array(ints, type=kind, mask=np.isnan(numbers)), {}
+
+
+def to_arrow(df, name):
+    schema = schemas[name]
+    arrays, fields = [], []
+    for col in df.columns:
+        array, metadata = encode_column(df[col], schema.get(col, str(df[col].dtype)))
+        arrays.append(array)
+        fields.append(pa.field(col, array.type, metadata=metadata or None))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata={b'table': name.encode()}))
+
+
+# Write through a temporary file and rename it into place, so processes that still map the
+# old file keep a valid view of it
+def write_compact(df, name, path=store_path):
+    table = to_arrow(df, name)
+    target = compact_path(name, path)
+    temporary = f'{target}.tmp'
+    with pa.OSFile(temporary, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temporary, target)
+    return target
+
+
+# Zero-copy view of the file; columns are paged in when touched
+def open_compact(name, path=store_path):
+    return pa.ipc.open_file(pa.memory_map(compact_path(name, path), 'r')).read_all()
+
+
+def decode_column(column, field, dtype):
+    column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    if pa.types.is_dictionary(column.type):
+        indices = column.indices
+        codes = indices.fill_null(-1).to_numpy() if indices.null_count else indices.to_numpy()
+        # Id vocabularies stay Arrow strings on the mapped pages instead of Python objects
+        if dtype == 'string':
+            return pd.Categorical.from_codes(codes, pd.Index(column.dictionary, dtype='string[pyarrow]'))
+        return pd.Categorical.from_codes(codes, column.dictionary.to_pandas())
+    if pa.types.is_boolean(column.type):
+        return column.to_numpy(zero_copy_only=False)
+    if pa.types.is_date32(column.type) or pa.types.is_timestamp(column.type):
+        return column.to_numpy(zero_copy_only=False).astype('datetime64[ns]')
+    metadata = field.metadata or {}
+    if b'scale' in metadata:
+        return column.to_numpy(zero_copy_only=False).astype('float64') / int(metadata[b'scale'])
+    values = column.to_numpy(zero_copy_only=False)
+    return values if column.null_count else values.astype(dtype or values.dtype, copy=False)
+
+
+# Decode the file (or some of its columns) to pandas
+def read_compact(name, columns=None, path=store_path):
+    table = open_compact(name, path)
+    schema = schemas.get(name, {})
+    columns = table.column_names if columns is None else columns
+    return pd.DataFrame({
+        col: decode_column(table.column(col), table.schema.field(col), schema.get(col))
+        for col in columns
+    }, copy=False)
+
+
+# The compact file when it is at least as new as the table in the store, else a fresh one
+def load_compact(name, columns=None, path=store_path):
+    target = compact_path(name, path)
+    sources = [file for file in [table_path(name, path), csv_path(name, path)] if os.path.exists(file)]
+    if not os.path.exists(target) or any(os.path.getmtime(target) < os.path.getmtime(file) for file in sources):
+        write_compact(load_table(name, path=path), name, path)
+    return read_compact(name, columns, path)
+
+
+# Bytes per row of each column: as a pandas frame read from the store, in the compact file,
+# and decoded from the compact file
+def memory_report(name, path=store_path):
+    before = load_table(name, path=path)
+    write_compact(before, name, path)
+    table = open_compact(name, path)
+    after = read_compact(name, path=path)
+    rows = max(len(before), 1)
+    report = pd.DataFrame({
+        'store frame': before.memory_usage(deep=True, index=False),
+        'compact file': pd.Series({col: table.column(col).nbytes for col in table.column_names}),
+        'decoded frame': after.memory_usage(deep=True, index=False)
+    }) / rows
+    report.loc['total'] = report.sum()
+    return report, os.path.getsize(compact_path(name, path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the compact memory-mapped copy of a table and report its size.')
+    parser.add_argument('--table', default='orders', choices=compact_tables)
+    args = parser.parse_args()
+
+    report, size = memory_report(args.table)
+    print(f'{args.table}: {size:,} bytes on disk, bytes per row')
+    print(report.round(1).to_string())
@@ -0,0 +1,129 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from store import store_path, table_path, csv_path, apply_schema, read_table, write_table, load_table
+from categoricals import relabel_categories
+from aggregates import cancelled_status
+
+
+# Order and cancellation counts for every dimension the cancellation figures break down by,
+# and for the pairs they cross-tabulate. The orders are scanned once: every row gets the id of
+# its full dimension combination, counts are taken per combination, and each grouping is
+# rolled up from those cells. The cube is kept in the store as a long table with one row per
+# (grouping, labels), so any rate is a lookup on a few thousand rows.
+cube_dimensions = [
+    'category', 'size', 'sales_channel', 'ship_service_level',
+    'fulfillment', 'style', 'b2b', 'ship_state_or_territory'
+]
+cube_pairs = [('ship_state_or_territory', 'category')]
+
+
+def grouping_sets(dimensions=cube_dimensions, pairs=cube_pairs):
+    return [()] + [(dim,) for dim in dimensions] + [tuple(pair) for pair in pairs]
+
+
+def grouping_name(dims):
+    return ','.join(dims)
+
+
+# Codes in sorted label order, -1 for missing values, which groupbys leave out
+def encode_dimension(values):
+    codes, labels = pd.factorize(values, sort=True)
+    return codes, np.asarray(labels.astype(str), dtype=object)
+
+
+def build_cube(orders, dimensions=cube_dimensions, pairs=cube_pairs):
+    orders = orders[dimensions + ['status']].copy()
+    # Dupatta is counted with ethnic dress, as in the figures
+    if isinstance(orders['category'].dtype, pd.CategoricalDtype):
+        orders['category'] = relabel_categories(orders['category'], {'dupatta': 'ethnic dress'})
+    cancelled = (orders['status'] == cancelled_status).to_numpy()
+    codes, labels = {}, {}
+    for dim in dimensions:
+        codes[dim], labels[dim] = encode_dimension(orders[dim])
+
+    # Cell id of each row's dimension combination, compacted after every dimension so it
+    # stays below rows * labels. Ids are numbered by first appearance, so a row opens a new
+    # cell exactly where the running maximum id grows.
+    cell = np.zeros(len(orders), dtype='int64')
+    for dim in dimensions:
+        cell, _ = pd.factorize(cell * (len(labels[dim]) + 1) + codes[dim] + 1)
+    running = np.maximum.accumulate(cell)
+    first = np.flatnonzero(np.r_[len(cell) > 0, running[1:] > running[:-1]])
+    cell_codes = {dim: codes[dim][first] for dim in dimensions}
+    cell_totals = np.bincount(cell, minlength=len(first))
+    cell_cancelled = np.bincount(cell, cancelled, len(first))
+
+    # Each grouping sums the cells labelled in all of its dimensions
+    parts = []
+    for dims in grouping_sets(dimensions, pairs):
+        shape = tuple(len(labels[dim]) for dim in dims)
+        present = np.ones(len(first), dtype=bool)
+        for dim in dims:
+            present &= cell_codes[dim] >= 0
+        if dims:
+            key = np.ravel_multi_index(tuple(cell_codes[dim][present] for dim in dims), shape)
+        else:
+            key = np.zeros(present.sum(), dtype='int64')
+        size = int(np.prod(shape))
+        totals = np.bincount(key, cell_totals[present], size)
+        observed = np.flatnonzero(totals > 0)
+        part = pd.DataFrame({'grouping': grouping_name(dims)}, index=range(len(observed)))
+        positions = dict(zip(dims, np.unravel_index(observed, shape))) if dims else {}
+        for dim in dimensions:
+            part[dim] = labels[dim][positions[dim]] if dim in dims else None
+        part['total_orders'] = totals[observed].astype('int64')
+        part['cancelled_orders'] = np.bincount(key, cell_cancelled[present], size)[observed].astype('int64')
+        parts.append(part)
+    # Same dtypes as the stored table, so figure keys do not depend on where the cube came from
+    return apply_schema(pd.concat(parts, ignore_index=True), 'cancellation_cube')
+
+
+# Stored cube when it is at least as new as the orders it summarizes, else a fresh build
+def load_cube(orders=None, path=store_path):
+    cube_file = table_path('cancellation_cube', path)
+    sources = [file for file in [table_path('orders', path), csv_path('orders', path)] if os.path.exists(file)]
+    if os.path.exists(cube_file) and all(os.path.getmtime(cube_file) >= os.path.getmtime(file) for file in sources):
+        return read_table('cancellation_cube', path=path)
+    cube = build_cube(load_table('orders', path=path) if orders is None else orders)
+    write_table(cube, 'cancellation_cube', path)
+    return cube
+
+
+# Orders, cancellations and cancellation rate by `dims`, in sorted label order
+def rates(cube, *dims):
+    for grouping in cube['grouping'].unique():
+        stored = grouping.split(',') if grouping else []
+        if sorted(stored) == sorted(dims):
+            rows = cube[cube['grouping'] == grouping]
+            table = rows[list(dims) + ['total_orders', 'cancelled_orders']]
+            table = table.set_index(list(dims)) if dims else table.reset_index(drop=True)
+            return table.assign(cancel_rate=table['cancelled_orders'] / table['total_orders'])
+    raise ValueError(f'no grouping by {", ".join(dims) or "nothing"} in the cancellation cube')
+
+
+# Cancellation rate of one cell, e.g. cancel_rate(cube, category='kurta', ship_state_or_territory='kerala')
+def cancel_rate(cube, **labels):
+    table = rates(cube, *labels)
+    key = tuple(labels.values()) if len(labels) > 1 else next(iter(labels.values()), None)
+    return table['cancel_rate'].iloc[0] if not labels else table.loc[key, 'cancel_rate']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and query the cancellation cube.')
+    parser.add_argument('--by', nargs='*', choices=cube_dimensions, default=None,
+                        help='print cancellation rates grouped by these dimensions')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild even when the stored cube is current')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        cube = build_cube(load_table('orders'))
+        write_table(cube, 'cancellation_cube')
+    else:
+        cube = load_cube()
+    if args.by is None:
+        print(f'{len(cube)} rows in {cube["grouping"].nunique()} groupings')
+    else:
+        print(rates(cube, *args.by).to_string())
@@ -0,0 +1,128 @@
+# Import dependencies
+import math
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba
+import seaborn as sns
+
+
+# Fixed-size inputs for density plots of order-level columns. A column is reduced to weights on
+# an evenly spaced grid per hue level (linear binning: every value splits its weight between
+# the two nearest grid points), and densities are evaluated from the grid instead of the rows.
+# Binning is one pass over the rows, everything after it costs the same for any number of
+# orders. Kernel, bandwidth rule, support and stacking follow sns.kdeplot, so the curves match
+# the ones seaborn draws from the full rows.
+grid_size = 2048
+ns_per_day = 86400 * 10**9
+
+
+# Hue order as seaborn picks it: categories, sorted numbers, or order of appearance
+def hue_levels(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return list(series.cat.categories)
+    order = series.dropna().unique()
+    return list(np.sort(order)) if pd.api.types.is_numeric_dtype(series) else list(order)
+
+
+# Dates are binned as days, the unit matplotlib plots them in
+def as_numbers(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype('int64') / ns_per_day
+    return values.to_numpy(dtype='float64')
+
+
+# Binned weights of `frame[x]` per level of `frame[hue]`. Returns hue, x and weight columns
+# with one row per non-empty grid point; x keeps the column's dtype.
+def bin_density(frame, x, hue, size=grid_size):
+    order = hue_levels(frame[hue])
+    frame = frame[[x, hue]].dropna()
+    values = as_numbers(frame[x])
+    codes = pd.Categorical(frame[hue], categories=order).codes
+    lo, hi = (values.min(), values.max()) if len(values) else (0.0, 0.0)
+    position = (values - lo) / (hi - lo) * (size - 1) if hi > lo else np.zeros(len(values))
+    left = np.minimum(position.astype('int64'), size - 2)
+    share = position - left
+    slots = codes.astype('int64') * size + left
+    weight = (np.bincount(slots, 1 - share, len(order) * size)
+              + np.bincount(slots + 1, share, len(order) * size))
+    grid = np.tile(np.linspace(lo, hi, size), len(order))
+    used = weight > 0
+    binned = pd.DataFrame({
+        hue: pd.Categorical.from_codes(np.repeat(np.arange(len(order)), size)[used], order),
+        x: grid[used],
+        'weight': weight[used]
+    })
+    if pd.api.types.is_datetime64_any_dtype(frame[x]):
+        binned[x] = pd.to_datetime(np.rint(binned[x] * ns_per_day).astype('int64'))
+    return binned
+
+
+# Scott's rule on weighted points, as gaussian_kde computes it for unweighted rows
+def scott_bandwidth(points, weights):
+    n = weights.sum()
+    mean = np.average(points, weights=weights)
+    variance = (weights * (points - mean) ** 2).sum() / (n - 1)
+    return np.sqrt(variance) * n ** -0.2, variance
+
+
+# Density curves on a shared support, one column per hue level with enough spread, each
+# scaled by the level's share of rows (kdeplot's common_norm)
+def kde_curves(binned, x, hue, gridsize=200, cut=3, bw_adjust=1):
+    points = as_numbers(binned[x])
+    weights = binned['weight'].to_numpy()
+    total = weights.sum()
+    bandwidth, _ = scott_bandwidth(points, weights)
+    bandwidth *= bw_adjust
+    support = np.linspace(points.min() - bandwidth * cut, points.max() + bandwidth * cut, gridsize)
+    curves = {}
+    codes = binned[hue].cat.codes.to_numpy()
+    for code, level in enumerate(binned[hue].cat.categories):
+        level_points, level_weights = points[codes == code], weights[codes == code]
+        if level_weights.sum() < 2:
+            continue
+        bandwidth, variance = scott_bandwidth(level_points, level_weights)
+        if math.isclose(variance, 0):
+            continue
+        bandwidth *= bw_adjust
+        kernel = np.exp(-0.5 * ((support[:, None] - level_points[None, :]) / bandwidth) ** 2)
+        curves[level] = kernel @ level_weights / (total * bandwidth * np.sqrt(2 * np.pi))
+    return pd.DataFrame(curves, index=support)
+
+
+# Hue colors as seaborn assigns them
+def hue_colors(levels, palette=None):
+    if palette is None:
+        cycle = mpl.rcParams['axes.prop_cycle'].by_key().get('color', ['.5'])
+        palette = None if len(levels) <= len(cycle) else 'husl'
+    return dict(zip(levels, sns.color_palette(palette, len(levels))))
+
+
+# Draw binned densities like sns.kdeplot(..., hue=hue, fill=True, multiple='stack')
+def stacked_kdeplot(binned, x, hue, palette=None, ax=None, **kde_kws):
+    ax = ax or plt.gca()
+    levels = list(binned[hue].cat.categories)
+    colors = hue_colors(levels, palette)
+    if pd.api.types.is_datetime64_any_dtype(binned[x]):
+        ax.xaxis.update_units(binned[x])
+    curves = kde_curves(binned, x, hue, **kde_kws)
+    # seaborn stacks the last level at the bottom and draws from the bottom up
+    curves = curves.iloc[:, ::-1]
+    tops = curves.cumsum(axis='columns')
+    bottoms = tops.shift(1, axis='columns').fillna(0)
+    edgecolor = mpl.rcParams['patch.edgecolor']
+    for level in curves.columns:
+        artist = ax.fill_between(
+            curves.index, bottoms[level], tops[level],
+            facecolor=to_rgba(colors[level], .75), edgecolor=edgecolor
+        )
+        artist.sticky_edges.x[:] = []
+        artist.sticky_edges.y[:] = (0, np.inf)
+    if not ax.get_xlabel():
+        ax.set_xlabel(x)
+    if not ax.get_ylabel():
+        ax.set_ylabel('Density')
+    handles = [mpl.patches.Patch(facecolor=to_rgba(colors[level], .75), edgecolor=edgecolor) for level in levels]
+    ax.legend(handles, levels, title=hue)
+    return ax
@@ -0,0 +1,100 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from aggregates import group_mode
+from categoricals import fill_category
+from store import store_path, load_table, write_table, table_path
+
+
+# Vectorized port of the payment and address recovery in notebooks/sql_cleaning.txt. The
+# unit_price and standard_city tables are group modes computed with one sort each, and every
+# UPDATE ... FROM join becomes an array lookup of that mode by group code.
+output_path = os.path.join(store_path, 'orders.csv')
+default_currency = 'INR'
+
+
+# mode() WITHIN GROUP (ORDER BY value) for each row's group, over the rows in `mask`. Ties go
+# to the smallest value; groups without any value get NaN (or None for text).
+def broadcast_mode(groups, values, mask):
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    value_codes, uniques = pd.factorize(values[mask], sort=True)
+    mode = group_mode(groups[mask], value_codes, n_groups, len(uniques))[groups]
+    uniques = np.asarray(uniques)
+    missing = np.nan if uniques.dtype.kind == 'f' else None
+    return np.where(mode >= 0, uniques.take(np.maximum(mode, 0)) if len(uniques) else missing, missing)
+
+
+# Recover quantity and amount from the most common unit price of the same asin. Orders left
+# with no quantity (38 in the original report) or no amount (30) have nothing to recover
+# from and are dropped, as in the SQL step. `unit_prices` (asin -> price), e.g. modes over a
+# longer history, replace the modes found among `orders` for the asins they list.
+def impute_payments(orders, unit_prices=None):
+    quantity = orders['quantity'].to_numpy(dtype='int64')
+    amount = orders['amount'].to_numpy(dtype='float64')
+    asin_codes, _ = pd.factorize(orders['asin'])
+    priced = (quantity >= 1) & (amount > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unit_price = broadcast_mode(asin_codes, amount / quantity, priced).astype('float64')
+        if unit_prices is not None:
+            known = unit_prices.reindex(orders['asin'].astype(object)).to_numpy(dtype='float64')
+            unit_price = np.where(np.isnan(known), unit_price, known)
+        has_price = ~np.isnan(unit_price)
+        no_amount = np.isnan(amount)
+        # ROUND() on float8 rounds half to even
+        recovered = np.rint(np.where(has_price & ~no_amount, amount / unit_price, 0))
+    quantity = np.where(has_price & (quantity == 0),
+                        np.where(no_amount, 1, recovered), quantity).astype('int64')
+    # Orders with an amount but no unit price on record are assumed to be single items
+    quantity[(quantity == 0) & ~no_amount] = 1
+    amount = np.where(has_price & ((amount == 0) | no_amount), unit_price * quantity, amount)
+    keep = (quantity != 0) & (amount != 0) & ~np.isnan(amount)
+    orders = orders[keep].copy()
+    orders['quantity'] = quantity[keep]
+    orders['amount'] = amount[keep]
+    return orders
+
+
+# Orders with no currency are priced like the INR ones
+def fill_currency(orders):
+    orders['currency'] = fill_category(orders['currency'], default_currency)
+    return orders
+
+
+# Replace ship_city with the most common city recorded for the same state and postal code.
+# Orders missing either key are left alone, like the SQL join that cannot match NULL.
+def standardize_cities(orders):
+    keys = orders[['ship_state_or_territory', 'ship_postal_code']]
+    groups = keys.groupby(list(keys.columns), sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    cities = orders['ship_city'].astype('object').to_numpy()
+    standard_city = broadcast_mode(groups, cities, pd.notna(cities))
+    matched = keys.notna().all(axis=1).to_numpy()
+    orders['ship_city'] = pd.array(np.where(matched, standard_city, cities), dtype=orders['ship_city'].dtype)
+    return orders
+
+
+# Stage functions for the cached pipeline
+def impute_orders(orders, unit_prices=None):
+    return fill_currency(impute_payments(orders, unit_prices))
+
+
+# The SQL table numbers rows by the pandas export index
+def build_orders(orders):
+    orders = standardize_cities(orders)
+    orders = orders.rename(columns={'index': 'index_id'})
+    return orders.sort_values('index_id', kind='stable').reset_index(drop=True)
+
+
+# Export the recovered orders like the SQL \copy of amazon_orders
+def write_orders(orders, output=output_path):
+    orders.to_csv(output, index=False)
+    write_table(orders, 'orders', os.path.dirname(output))
+    return [output, table_path('orders', os.path.dirname(output))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recover payment and address info in the cleaned orders.')
+    parser.add_argument('--source', default='amazon_sales_pdcleaned', help='store table with the pandas cleaned orders')
+    args = parser.parse_args()
+    write_orders(build_orders(impute_orders(load_table(args.source))))
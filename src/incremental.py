@@ -0,0 +1,348 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from aggregates import cancelled_status, round_numeric, paise, build_feature_tables, write_feature_tables
+from pandas_cleaning import clean, read_raw
+from store import load_table
+from rollups import daily_rollups, merge_rollups, clear_rollups
+from items import line_rows, item_counts, mode_from_counts, quantile_from_counts, update_item_stats
+from imputation import impute_orders
+
+
+# Append mode for the feature tables. Instead of the orders history we persist mergeable
+# summaries: additive totals, category counts for MODE() and unit price counts for the exact
+# PERCENTILE_CONT(0.5). Distinct order counts use per-week partitions of order id hashes. A
+# new report is summarized on its own, merged in, and only the asins and weeks it touched
+# are recomputed in the feature tables.
+#
+# The week partitions also keep a hash of every merged order line's (order_id, asin, date),
+# the key the cleaning dedups on, so lines a report repeats from the history are dropped
+# rather than counted twice. A full rebuild keeps the last copy of a repeated line and
+# append keeps the first, since merged summaries cannot take a line back out; the two only
+# differ when a repeated line changed in between. The history also stays as it was imputed:
+# a rebuild recovers its payments again from unit price modes that count the new report,
+# and can price lines the SQL step had dropped for want of a price, while append only
+# imputes the new report (from the modes of both, see report_unit_prices).
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+state_path = os.path.join(project_root, 'data', 'aggregates')
+state_keys = {
+    'item_totals': ['asin', 'cancelled'],
+    'item_categories': ['asin', 'cancelled', 'category'],
+    'item_prices': ['asin', 'cancelled', 'unit_price'],
+    'regional_counts': ['asin', 'ship_state_or_territory', 'cancelled'],
+    'regional_categories': ['asin', 'ship_state_or_territory', 'category'],
+    'weekly_totals': ['week_start'],
+    'state_totals': ['ship_state_or_territory']
+}
+
+
+def week_start(dates):
+    dates = pd.to_datetime(dates)
+    return (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.normalize()
+
+
+# The SQL step keeps only orders with payment info, so the same rows are kept here
+def complete_orders(orders):
+    return orders[(orders['quantity'] > 0) & (orders['amount'] > 0)]
+
+
+def partition_file(week):
+    return os.path.join(state_path, 'orders', f'week={week:%Y-%m-%d}.npz')
+
+
+# Order id, order line and (state, order id) hashes already merged for a week
+def read_partition(week):
+    empty = np.empty(0, dtype='uint64')
+    if not os.path.exists(partition_file(week)):
+        return empty, empty, empty
+    with np.load(partition_file(week)) as partition:
+        return partition['orders'], partition['lines'], partition['pairs']
+
+
+def line_hashes(orders):
+    return pd.util.hash_pandas_object(pd.DataFrame({
+        'order_id': orders['order_id'].astype(str).to_numpy(),
+        'asin': orders['asin'].astype(str).to_numpy(),
+        'date': pd.to_datetime(orders['date']).to_numpy()
+    }), index=False).to_numpy()
+
+
+# Order lines not merged before, and not repeated earlier in the batch
+def new_lines(orders):
+    hashes = line_hashes(orders)
+    weeks = week_start(orders['date']).to_numpy()
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    for week in np.unique(weeks):
+        rows = weeks == week
+        keep[rows] &= ~np.isin(hashes[rows], read_partition(pd.Timestamp(week))[1])
+    return orders[keep]
+
+
+# Partial summaries of a batch of cleaned orders
+def summarize(orders):
+    orders = pd.DataFrame({
+        'asin': orders['asin'].astype(str),
+        'ship_state_or_territory': orders['ship_state_or_territory'].astype(str),
+        'category': orders['category'].astype(str),
+        'order_id': orders['order_id'].astype(str),
+        'week_start': week_start(orders['date']),
+        'cancelled': (orders['status'] == cancelled_status).to_numpy(),
+        'promotion': orders['promotion_ids'].to_numpy(dtype=bool),
+        'quantity': orders['quantity'].to_numpy(dtype='int64'),
+        'amount': orders['amount'].to_numpy(dtype='float64'),
+        'amount_paise': paise(orders['amount']),
+        'line_hash': line_hashes(orders)
+    })
+    orders['unit_price'] = orders['amount'] / orders['quantity']
+    orders['discounted_units'] = orders['quantity'] * orders['promotion']
+    completed = orders[~orders['cancelled']]
+    return orders, {
+        # The per-asin counts the item statistics are built from (src/items.py)
+        **item_counts(orders),
+        'regional_counts': orders.groupby(state_keys['regional_counts']).size()
+            .rename('count').reset_index(),
+        'regional_categories': orders.groupby(state_keys['regional_categories']).size()
+            .rename('count').reset_index(),
+        'weekly_totals': completed.groupby('week_start').agg(
+            units_sold=('quantity', 'sum'),
+            orders_at_discount=('promotion', 'sum'),
+            amount_paise=('amount_paise', 'sum')
+        ).reset_index(),
+        'state_totals': orders.assign(
+            completed_units=orders['quantity'] * ~orders['cancelled']
+        ).groupby('ship_state_or_territory').agg(
+            total_orders=('quantity', 'size'),
+            cancelled_orders=('cancelled', 'sum'),
+            units_sold=('completed_units', 'sum')
+        ).reset_index()
+    }
+
+
+def state_file(name):
+    return os.path.join(state_path, f'{name}.parquet')
+
+
+def read_state(name):
+    if os.path.exists(state_file(name)):
+        return pd.read_parquet(state_file(name))
+    return None
+
+
+# Add a partial summary into the persisted one
+def merge_state(name, partial):
+    current = read_state(name)
+    if current is not None:
+        partial = pd.concat([current, partial], ignore_index=True)
+        partial = partial.groupby(state_keys[name], sort=False).sum().reset_index()
+    partial.to_parquet(state_file(name), index=False)
+    return partial
+
+
+# Merge order id hashes into the week partitions they fall in. Each partition keeps the
+# completed orders (for weekly distinct orders) and every (state, order) pair (for regional
+# distinct orders). Returns the new distinct counts per week and per state. An order id is
+# assumed to belong to a single date, as it does in the Amazon reports.
+def merge_order_partitions(orders):
+    orders = orders[['week_start', 'ship_state_or_territory', 'order_id', 'cancelled', 'line_hash']]
+    orders = orders.assign(
+        order_hash=pd.util.hash_array(orders['order_id'].to_numpy(dtype=object)),
+        pair_hash=pd.util.hash_pandas_object(
+            orders[['ship_state_or_territory', 'order_id']], index=False
+        ).to_numpy()
+    )
+    new_orders, new_pairs = {}, []
+    os.makedirs(os.path.join(state_path, 'orders'), exist_ok=True)
+    for week, batch in orders.groupby('week_start'):
+        known_orders, known_lines, known_pairs = read_partition(week)
+        lines = batch['line_hash'].to_numpy()
+        completed = np.unique(batch.loc[~batch['cancelled'], 'order_hash'].to_numpy())
+        completed = completed[~np.isin(completed, known_orders)]
+        batch = batch.drop_duplicates('pair_hash')
+        batch = batch[~np.isin(batch['pair_hash'].to_numpy(), known_pairs)]
+        new_orders[week] = len(completed)
+        new_pairs.append(batch)
+        np.savez(
+            partition_file(week),
+            orders=np.union1d(known_orders, completed),
+            lines=np.union1d(known_lines, lines),
+            pairs=np.union1d(known_pairs, batch['pair_hash'].to_numpy())
+        )
+    pairs = pd.concat(new_pairs) if new_pairs else orders.iloc[:0]
+    weekly = pd.DataFrame({
+        'week_start': pd.DatetimeIndex(list(new_orders)),
+        'total_orders': np.array(list(new_orders.values()), dtype='int64')
+    })
+    return (
+        weekly[weekly['total_orders'] > 0],
+        pairs.groupby('ship_state_or_territory').size().rename('unique_orders').reset_index()
+    )
+
+
+def item_rows(asins, cancelled):
+    totals = read_state('item_totals')
+    totals = totals[totals['asin'].isin(asins) & (totals['cancelled'] == cancelled)]
+    categories = read_state('item_categories')
+    categories = categories[categories['asin'].isin(asins) & (categories['cancelled'] == cancelled)]
+    prices = read_state('item_prices')
+    prices = prices[prices['asin'].isin(asins) & (prices['cancelled'] == cancelled)]
+    table = totals.set_index('asin')
+    return pd.DataFrame({
+        'asin': table.index,
+        'category': mode_from_counts(categories, ['asin'], 'category').reindex(table.index).to_numpy(),
+        'total_orders': table['total_orders'].to_numpy(),
+        'orders_at_discount': table['orders_at_discount'].to_numpy(),
+        'units_sold': table['units_sold'].to_numpy(),
+        'median_unit_price': quantile_from_counts(prices, 0.5).reindex(table.index).to_numpy(),
+        'missed_revenue' if cancelled else 'revenue': np.rint(table['amount_paise'].to_numpy() / 100.0)
+    })
+
+
+# ROW_NUMBER() per asin by order count, ties broken by state
+def ranked(table):
+    table = table.sort_values(
+        ['asin', 'regional_orders', 'ship_state_or_territory'], ascending=[True, False, True]
+    )
+    table['rank'] = table.groupby('asin').cumcount() + 1
+    return table
+
+
+def regional_rows(asins, cancelled_only):
+    counts = read_state('regional_counts')
+    counts = counts[counts['asin'].isin(asins)]
+    if cancelled_only:
+        counts = counts[counts['cancelled']]
+        table = counts.drop(columns='cancelled').rename(columns={'count': 'regional_orders'})
+        return ranked(table[['asin', 'ship_state_or_territory', 'regional_orders']])
+    # Regional demand counts every order, like the SQL view it reproduces
+    table = counts.groupby(['asin', 'ship_state_or_territory'])['count'].sum()
+    categories = read_state('regional_categories')
+    categories = categories[categories['asin'].isin(asins)]
+    category = mode_from_counts(categories, ['asin', 'ship_state_or_territory'], 'category')
+    table = pd.DataFrame({
+        'category': category.reindex(table.index),
+        'regional_orders': table
+    }).reset_index()
+    return ranked(table)
+
+
+# Replace the rows of the touched keys and restore the table's sort order
+def replace_rows(name, key, touched, rows, sort_by, ascending):
+    table = load_table(name).astype({key: object})
+    table = table[~table[key].isin(touched)]
+    if len(rows):
+        table = pd.concat([table, rows], ignore_index=True)
+    return table.sort_values(sort_by, ascending=ascending, kind='stable').reset_index(drop=True)
+
+
+def refresh_tables(asins, weeks):
+    tables = {}
+    for name, cancelled in [('sales', False), ('sales_cancelled', True)]:
+        tables[name] = replace_rows(
+            name, 'asin', asins, item_rows(asins, cancelled),
+            ['units_sold', 'asin'], [False, True]
+        )
+    for name, cancelled in [('regional_demand', False), ('regional_cancelled', True)]:
+        tables[name] = replace_rows(
+            name, 'asin', asins, regional_rows(asins, cancelled),
+            ['regional_orders', 'asin', 'ship_state_or_territory'], [False, True, True]
+        )
+
+    regional = read_state('state_totals')
+    regional['completed_orders'] = regional['total_orders'] - regional['cancelled_orders']
+    tables['regional_sales'] = regional[[
+        'ship_state_or_territory', 'total_orders', 'cancelled_orders', 'completed_orders',
+        'unique_orders', 'units_sold'
+    ]].sort_values(['total_orders', 'ship_state_or_territory'], ascending=[False, True])
+
+    # Growth depends on the previous week, so the week after each touched week is redone too
+    weekly = load_table('weekly_revenue')
+    totals = read_state('weekly_totals').set_index('week_start').sort_index()
+    totals = totals[totals['total_orders'] > 0]
+    stale = set(weeks)
+    stale |= {totals.index[i + 1] for i, week in enumerate(totals.index[:-1]) if week in stale}
+    weekly = weekly[~weekly['week_start'].isin(stale)].set_index('week_start')
+    for week in sorted(stale):
+        position = totals.index.get_loc(week)
+        revenue = np.rint(totals.loc[week, 'amount_paise'] / 100.0)
+        previous = np.rint(totals['amount_paise'].iloc[position - 1] / 100.0) if position > 0 else np.nan
+        weekly.loc[week] = pd.Series({
+            'total_orders': totals.loc[week, 'total_orders'],
+            'units_sold': totals.loc[week, 'units_sold'],
+            'orders_at_discount': totals.loc[week, 'orders_at_discount'],
+            'avg_order_value': round_numeric(revenue / totals.loc[week, 'total_orders']),
+            'revenue': revenue,
+            'revenue_growth_pct': round_numeric((revenue - previous) / previous * 100)
+        })
+    tables['weekly_revenue'] = weekly.sort_index().reset_index()
+    return tables
+
+
+# Summarize a batch of cleaned orders and merge it into the persisted summaries
+def merge_batch(orders):
+    orders = new_lines(complete_orders(orders))
+    merge_rollups(daily_rollups(orders))
+    orders, partials = summarize(orders)
+    week_orders, state_orders = merge_order_partitions(orders)
+    partials['weekly_totals'] = partials['weekly_totals'].merge(week_orders, how='outer').fillna(0)
+    partials['state_totals'] = partials['state_totals'].merge(state_orders, how='outer').fillna(0)
+    merged = {name: merge_state(name, partial) for name, partial in partials.items()}
+    asins = orders['asin'].unique()
+    update_item_stats(asins, merged['item_totals'], merged['item_categories'], merged['item_prices'])
+    return asins, partials['weekly_totals']['week_start'].unique()
+
+
+# Unit price mode per asin over the merged price counts and the report's priced orders, the
+# mode the SQL step finds over the history and the report together. Merged counts include
+# lines whose payment was recovered at their asin's mode, so the history's mode weighs a
+# little more than in the raw orders; the two can only differ on near ties.
+def report_unit_prices(orders):
+    counts = item_counts(line_rows(orders))['item_prices']
+    history = read_state('item_prices')
+    if history is not None:
+        counts = pd.concat([history, counts], ignore_index=True)
+    counts = counts.groupby(['asin', 'unit_price'])['count'].sum().reset_index()
+    return mode_from_counts(counts, ['asin'], 'unit_price')
+
+
+# Recover quantity and amount of a new report's orders like the SQL step does for the
+# history, from the unit price modes of both
+def impute_report(orders):
+    return impute_orders(orders, report_unit_prices(orders))
+
+
+# Merge new orders and refresh the feature tables for the keys they touched
+def append_orders(orders):
+    tables = refresh_tables(*merge_batch(orders))
+    write_feature_tables(tables)
+    return tables
+
+
+# Start the summaries from the full orders history and write the feature tables from it
+def initialize(orders):
+    os.makedirs(state_path, exist_ok=True)
+    for file in os.listdir(state_path):
+        if file.endswith('.parquet'):
+            os.remove(os.path.join(state_path, file))
+    orders_dir = os.path.join(state_path, 'orders')
+    if os.path.isdir(orders_dir):
+        for file in os.listdir(orders_dir):
+            os.remove(os.path.join(orders_dir, file))
+    clear_rollups()
+    merge_batch(orders)
+    write_feature_tables(build_feature_tables(complete_orders(orders)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally maintain the feature tables.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('init', help='build the summaries from the cleaned orders table')
+    append = subparsers.add_parser('append', help='merge a new raw report into the tables')
+    append.add_argument('report', help='path to a raw report shaped like amazon_sales_report.csv')
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        initialize(load_table('orders'))
+    else:
+        append_orders(impute_report(clean(read_raw(args.report))))
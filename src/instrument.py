@@ -0,0 +1,150 @@
+# Import dependencies
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+
+# Lightweight per-step instrumentation. A step records wall time, CPU time, the process's peak
+# RSS and how far the step raised it, and the rows going in and out. Steps nest, and repeated
+# steps (one per chunk, say) accumulate under the same path. Each measurement is a couple of
+# clock and getrusage calls, so it stays on by default; PIPELINE_INSTRUMENT=0 turns it off.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+runs_path = os.path.join(project_root, 'data', 'runs')
+enabled = os.environ.get('PIPELINE_INSTRUMENT', '1') != '0'
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+rss_unit = 1 if sys.platform == 'darwin' else 1024
+
+steps = {}
+stack = []
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_unit
+
+
+def empty_record():
+    return {
+        'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_rss': 0, 'rss_growth': 0,
+        'rows_in': None, 'rows_out': None
+    }
+
+
+def rows(value):
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None
+
+
+# Time a block as step `name`. The yielded dict takes optional 'rows_in' and 'rows_out'.
+@contextmanager
+def step(name, rows_in=None):
+    info = {'rows_in': rows_in, 'rows_out': None}
+    if not enabled:
+        yield info
+        return
+    stack.append(name)
+    path = ';'.join(stack)
+    # Created on entry so parents are listed before their children
+    record = steps.setdefault(path, empty_record())
+    rss_before = peak_rss()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield info
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        rss = peak_rss()
+        stack.pop()
+        record['calls'] += 1
+        record['wall'] += wall
+        record['cpu'] += cpu
+        record['peak_rss'] = max(record['peak_rss'], rss)
+        record['rss_growth'] += rss - rss_before
+        for key in ['rows_in', 'rows_out']:
+            if info[key] is not None:
+                record[key] = (record[key] or 0) + info[key]
+
+
+# Time every item an iterator produces, e.g. each chunk read from a file
+def iterate(name, iterable):
+    iterator = iter(iterable)
+    while True:
+        with step(name) as info:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            info['rows_out'] = rows(item)
+        yield item
+
+
+# Start a fresh record, optionally nested under the steps of a parent process
+def reset(parents=()):
+    steps.clear()
+    stack[:] = parents
+
+
+def snapshot():
+    return {path: dict(record) for path, record in steps.items()}
+
+
+# Fold the steps recorded in another process (e.g. a pool worker) into this one
+def merge(records):
+    for path, other in records.items():
+        record = steps.setdefault(path, empty_record())
+        for key in ['calls', 'wall', 'cpu', 'rss_growth']:
+            record[key] += other[key]
+        record['peak_rss'] = max(record['peak_rss'], other['peak_rss'])
+        for key in ['rows_in', 'rows_out']:
+            if other[key] is not None:
+                record[key] = (record[key] or 0) + other[key]
+
+
+# Wall time not spent in child steps, as folded stacks ("a;b;c microseconds") that
+# flamegraph.pl or speedscope read directly
+def folded_stacks(records):
+    self_time = {path: record['wall'] for path, record in records.items()}
+    for path, record in records.items():
+        parent = path.rpartition(';')[0]
+        if parent in self_time:
+            self_time[parent] -= record['wall']
+    return [f'{path} {max(int(seconds * 1e6), 0)}' for path, seconds in self_time.items()]
+
+
+def summary(records):
+    lines = [f"{'step':<60}{'calls':>7}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'rows in':>11}{'rows out':>11}"]
+    for path, record in records.items():
+        depth = path.count(';')
+        name = '  ' * depth + path.rpartition(';')[2]
+        rows_in = '' if record['rows_in'] is None else f"{record['rows_in']:,}"
+        rows_out = '' if record['rows_out'] is None else f"{record['rows_out']:,}"
+        lines.append(
+            f"{name:<60}{record['calls']:>7}{record['wall']:>9.3f}{record['cpu']:>9.3f}"
+            f"{record['peak_rss'] / 2**20:>9.0f}{rows_in:>11}{rows_out:>11}"
+        )
+    return '\n'.join(lines)
+
+
+# Write the run report to data/runs/<run>-<timestamp>.json, and the folded stacks next to it
+# when `flame` is set. Returns the report path, or None when instrumentation is off.
+def write_report(run, flame=False, path=runs_path):
+    if not enabled:
+        return None
+    os.makedirs(path, exist_ok=True)
+    stamp = pd.Timestamp.now().strftime('%Y%m%d-%H%M%S')
+    report_path = os.path.join(path, f'{run}-{stamp}.json')
+    records = snapshot()
+    report = {
+        'run': run,
+        'finished': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'argv': sys.argv,
+        'steps': [{'step': path, **record} for path, record in records.items()]
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    if flame:
+        with open(report_path.replace('.json', '.folded'), 'w') as f:
+            f.write('\n'.join(folded_stacks(records)) + '\n')
+        print(summary(records))
+    return report_path
@@ -0,0 +1,219 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from store import store_path, table_path, csv_path, apply_schema, read_table, write_table, load_table
+from aggregates import cancelled_status, paise, row_number
+
+
+# Per-asin statistics kept as one table in the store (item_stats), so consumers look an item
+# up instead of grouping all orders again: its category, unit price mode and quantiles,
+# completed and cancelled totals, and whether it is a top seller. The table is computed from
+# mergeable counts per (asin, cancelled): additive totals, category counts and unit price
+# counts, the summaries src/incremental.py persists, so an appended report only recomputes
+# the asins it touched. Ranks within each category are stored with the rows. An ItemIndex
+# finds asins through a hash index and reads a category's top N off a secondary index of
+# positions sorted by (category, rank), which the stored ranks place without sorting.
+item_columns = ['asin', 'category', 'status', 'quantity', 'amount', 'promotion_ids']
+# Unit price quantiles over every priced line, as in the price variance query of
+# notebooks/sql_cleaning.txt
+price_quantiles = {'unit_price_min': 0, 'unit_price_q1': 0.25, 'unit_price_median': 0.5,
+                   'unit_price_q3': 0.75, 'unit_price_max': 1}
+# Secondary indexes: rank column -> order within a category. Orders rank ties like the
+# top 20 charts, which sort the sales table by orders.
+rank_orders = {
+    'orders_rank': ['-total_orders', '-units_sold', 'asin'],
+    'revenue_rank': ['-revenue', 'asin']
+}
+top_seller_quantile = 0.8
+
+
+# Priced order lines with the columns the counts are taken from
+def line_rows(orders):
+    orders = orders[(orders['quantity'] > 0) & (orders['amount'] > 0)]
+    rows = pd.DataFrame({
+        'asin': orders['asin'].astype(str),
+        'category': orders['category'].astype(str),
+        'cancelled': (orders['status'] == cancelled_status).to_numpy(),
+        'quantity': orders['quantity'].to_numpy(dtype='int64'),
+        'amount_paise': paise(orders['amount'])
+    })
+    rows['unit_price'] = orders['amount'].to_numpy(dtype='float64') / rows['quantity']
+    rows['discounted_units'] = rows['quantity'] * orders['promotion_ids'].to_numpy(dtype=bool)
+    return rows
+
+
+# Mergeable counts per (asin, cancelled) of a batch of order lines
+def item_counts(rows):
+    return {
+        'item_totals': rows.groupby(['asin', 'cancelled']).agg(
+            total_orders=('quantity', 'size'),
+            orders_at_discount=('discounted_units', 'sum'),
+            units_sold=('quantity', 'sum'),
+            amount_paise=('amount_paise', 'sum')
+        ).reset_index(),
+        'item_categories': rows.groupby(['asin', 'cancelled', 'category']).size()
+            .rename('count').reset_index(),
+        'item_prices': rows.groupby(['asin', 'cancelled', 'unit_price']).size()
+            .rename('count').reset_index()
+    }
+
+
+# Most frequent value per key from counts, ties to the smallest value
+def mode_from_counts(counts, keys, value):
+    counts = counts.sort_values(keys + ['count', value], ascending=[True] * len(keys) + [False, True])
+    return counts.drop_duplicates(keys).set_index(keys)[value]
+
+
+# PERCENTILE_CONT(q) per asin from (asin, unit_price, count) rows. Prices are laid out in
+# asin and price order, and the lines either side of the percentile are found by a search
+# on the running count, for every asin at once.
+def quantile_from_counts(prices, q):
+    prices = prices.groupby(['asin', 'unit_price'])['count'].sum().reset_index()
+    asins = prices['asin'].to_numpy()
+    counts = prices['count'].to_numpy()
+    values = prices['unit_price'].to_numpy()
+    first = np.flatnonzero(np.r_[len(asins) > 0, asins[1:] != asins[:-1]])
+    cumulative = np.cumsum(counts)
+    starts = (cumulative - counts)[first]
+    position = q * (np.add.reduceat(counts, first) - 1) if len(first) else np.empty(0)
+    lower, upper = np.floor(position), np.ceil(position)
+    low = values[np.searchsorted(cumulative, starts + lower, side='right')]
+    high = values[np.searchsorted(cumulative, starts + upper, side='right')]
+    return pd.Series(low + (high - low) * (position - lower), index=asins[first], dtype='float64').rename_axis('asin')
+
+
+# Statistics of every asin in the counts, without ranks and top seller flags
+def item_stats(item_totals, item_categories, item_prices):
+    asins = pd.Index(item_totals['asin'].unique(), name='asin').sort_values()
+    totals = item_totals.groupby(['cancelled', 'asin']).sum()
+    completed, cancelled = (
+        totals[totals.index.get_level_values('cancelled') == flag].droplevel('cancelled').reindex(asins, fill_value=0)
+        for flag in [False, True]
+    )
+    # Category of the completed lines, like the sales table, else of the cancelled ones
+    categories = item_categories.groupby(['asin', 'cancelled', 'category'])['count'].sum().reset_index()
+    category = mode_from_counts(categories[~categories['cancelled']], ['asin'], 'category').reindex(asins)
+    category = category.fillna(mode_from_counts(categories, ['asin'], 'category').reindex(asins))
+    stats = pd.DataFrame({
+        'asin': asins,
+        'category': category.to_numpy(),
+        'total_orders': completed['total_orders'].to_numpy(),
+        'units_sold': completed['units_sold'].to_numpy(),
+        'orders_at_discount': completed['orders_at_discount'].to_numpy(),
+        'revenue': np.rint(completed['amount_paise'].to_numpy() / 100.0),
+        'cancelled_orders': cancelled['total_orders'].to_numpy(),
+        'missed_revenue': np.rint(cancelled['amount_paise'].to_numpy() / 100.0),
+        'median_unit_price': quantile_from_counts(item_prices[~item_prices['cancelled']], 0.5).reindex(asins).to_numpy(),
+        # mode() WITHIN GROUP (ORDER BY amount/quantity), the unit_price table of the SQL step
+        'unit_price_mode': mode_from_counts(
+            item_prices.groupby(['asin', 'unit_price'])['count'].sum().reset_index(), ['asin'], 'unit_price'
+        ).reindex(asins).to_numpy()
+    })
+    for col, q in price_quantiles.items():
+        stats[col] = quantile_from_counts(item_prices, q).reindex(asins).to_numpy()
+    prices = item_prices.assign(total=item_prices['unit_price'] * item_prices['count']).groupby('asin')
+    stats['unit_price_mean'] = (prices['total'].sum() / prices['count'].sum()).reindex(asins).to_numpy()
+    return stats
+
+
+# Top seller flags and category ranks over the whole table. Items above the 80th percentile
+# of orders or revenue among those with completed orders are top sellers.
+def rank_items(stats):
+    stats = apply_schema(stats.reset_index(drop=True), 'item_stats')
+    sold = stats['total_orders'] > 0
+    stats['top_seller'] = sold & (
+        (stats['total_orders'] > stats.loc[sold, 'total_orders'].quantile(top_seller_quantile)) |
+        (stats['revenue'] > stats.loc[sold, 'revenue'].quantile(top_seller_quantile))
+    )
+    for col, order in rank_orders.items():
+        stats[col] = row_number(stats, ['category'], order)
+    return stats.sort_values(['category', 'orders_rank'], kind='stable').reset_index(drop=True)
+
+
+def build_item_stats(orders):
+    return rank_items(item_stats(**item_counts(line_rows(orders))))
+
+
+# Stored statistics when they are at least as new as the orders they were counted from, else
+# counted again from `orders` (or the stored orders)
+def load_item_stats(orders=None, path=store_path):
+    stats_file = table_path('item_stats', path)
+    sources = [file for file in [table_path('orders', path), csv_path('orders', path)] if os.path.exists(file)]
+    if os.path.exists(stats_file) and all(os.path.getmtime(stats_file) >= os.path.getmtime(file) for file in sources):
+        return read_table('item_stats', path=path)
+    stats = build_item_stats(load_table('orders', item_columns, path) if orders is None else orders)
+    write_table(stats, 'item_stats', path)
+    return stats
+
+
+# Recompute the rows of the touched asins from the merged counts and rewrite the table. Rows
+# of asins no longer in the counts are dropped.
+def update_item_stats(asins, item_totals, item_categories, item_prices, path=store_path):
+    rows = item_stats(*(counts[counts['asin'].isin(asins)] for counts in [item_totals, item_categories, item_prices]))
+    if os.path.exists(table_path('item_stats', path)):
+        stats = read_table('item_stats', path=path)
+        stats = stats[~stats['asin'].isin(asins) & stats['asin'].isin(item_totals['asin'])]
+        stats = stats.drop(columns=['top_seller', *rank_orders]).astype({'category': object})
+        rows = pd.concat([stats, rows], ignore_index=True) if len(rows) else stats
+    stats = rank_items(rows)
+    write_table(stats, 'item_stats', path)
+    return stats
+
+
+class ItemIndex:
+    def __init__(self, stats):
+        self.stats = stats.reset_index(drop=True)
+        self.rows = pd.Index(self.stats['asin'].astype(object))
+        categories = self.stats['category'].astype('category')
+        self.categories = categories.cat.categories
+        codes = categories.cat.codes.to_numpy().astype('int64')
+        self.starts = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(self.categories)))]
+        # Row positions in (category, rank) order for every rank column
+        self.ranked = {}
+        for col in rank_orders:
+            positions = np.empty(len(self.stats), dtype='int64')
+            positions[self.starts[codes] + self.stats[col].to_numpy() - 1] = np.arange(len(self.stats))
+            self.ranked[col] = positions
+
+    # Statistics of one asin
+    def get(self, asin):
+        return self.stats.iloc[self.rows.get_loc(asin)]
+
+    # Statistics of many asins, in their order, with missing values for unknown asins
+    def lookup(self, asins):
+        return self.stats.reindex(self.rows.get_indexer(np.asarray(asins, dtype=object))).reset_index(drop=True)
+
+    # The first `n` items of a category by `rank`, optionally only its top sellers
+    def top(self, category, n=20, rank='orders_rank', top_sellers=False):
+        if category not in self.categories:
+            return self.stats.iloc[:0]
+        code = self.categories.get_loc(category)
+        rows = self.ranked[rank][self.starts[code]:self.starts[code + 1]]
+        if top_sellers:
+            rows = rows[self.stats['top_seller'].to_numpy()[rows]]
+        return self.stats.iloc[rows[:n]].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and query the per-asin statistics.')
+    parser.add_argument('asins', nargs='*', help='print the statistics of these asins')
+    parser.add_argument('--top', metavar='CATEGORY', help='print the top items of a category')
+    parser.add_argument('-n', type=int, default=20, help='rows to print with --top')
+    parser.add_argument('--rank', choices=list(rank_orders), default='orders_rank')
+    parser.add_argument('--top-sellers', action='store_true', help='only list top sellers with --top')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild even when the stored table is current')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        stats = build_item_stats(load_table('orders', item_columns))
+        write_table(stats, 'item_stats')
+    else:
+        stats = load_item_stats()
+    index = ItemIndex(stats)
+    print(f'{len(stats):,} asins in {len(index.categories)} categories, {stats["top_seller"].sum():,} top sellers')
+    if args.asins:
+        print(index.lookup(args.asins).set_index('asin').T.to_string())
+    if args.top:
+        print(index.top(args.top, args.n, args.rank, args.top_sellers).to_string())
@@ -1,32 +1,46 @@
 # Import dependencies
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
 import pandas as pd
 import os
-import seaborn as sns
-import matplotlib.pyplot as plt
+from store import write_table, table_path, TableWriter
+from pipeline import File, Stage, Pipeline
+import instrument
+from instrument import step, iterate, write_report
+import profiler
+from profiler import observe
+from cities import reference_path, resolve_cities
+from categoricals import relabel_categories, assign_category, fill_category, category_mask
+import pincodes
+from pincodes import repair_states
+from imputation import impute_orders, build_orders, write_orders
 
 
-# Read data file and inspect dataset
+# Paths
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 file_path = os.path.join(project_root, 'data', 'raw', 'amazon_sales_report.csv')
-amazon_sales = pd.read_csv(file_path)
+output_path = os.path.join(project_root, 'data', 'processed', 'amazon_sales_pdcleaned.csv')
+orders_path = os.path.join(project_root, 'data', 'processed', 'orders.csv')
 
 
-# Normalize column names
-amazon_sales.columns = (amazon_sales.columns.str.strip()
-                        .str.replace(r'[-\s]', '_', regex=True)
-                        .str.lower())
-amazon_sales.rename(columns={'qty': 'quantity', 'fulfilment': 'fulfillment'}, inplace=True)
-
-
-# Drop unnamed column and convert date types
-amazon_sales.drop(columns='unnamed:_22', inplace=True)
-amazon_sales['date'] = pd.to_datetime(
-    amazon_sales['date'], 
-    format='%m-%d-%y'
-)
+# Pin raw dtypes so a chunk parses exactly like the full file would. Low-cardinality columns
+# are parsed straight into categories and the remaining text columns are read as object so an
+# all-missing chunk still supports the .str accessor.
+raw_dtypes = {
+    'index': 'int64', 'Order ID': 'object', 'Date': 'object', 'Status': 'category',
+    'Fulfilment': 'category', 'Sales Channel ': 'category', 'ship-service-level': 'category',
+    'Style': 'object', 'SKU': 'object', 'Category': 'category', 'Size': 'category',
+    'ASIN': 'object', 'Courier Status': 'category', 'Qty': 'int64', 'currency': 'category',
+    'Amount': 'float64', 'ship-city': 'object', 'ship-state': 'category',
+    'ship-postal-code': 'float64', 'ship-country': 'category', 'promotion-ids': 'object',
+    'B2B': 'bool', 'fulfilled-by': 'category', 'Unnamed: 22': 'object'
+}
+dedup_subset = ['order_id', 'asin', 'date']
 categorical_columns = [
-    'status', 'fulfillment', 'sales_channel', 'ship_service_level', 
+    'status', 'fulfillment', 'sales_channel', 'ship_service_level',
     'category', 'size', 'courier_status', 'currency', 'ship_state',
     'ship_country', 'fulfilled_by'
 ]
@@ -34,54 +48,9 @@ string_columns = [
     'order_id', 'style', 'sku', 'asin', 'ship_city', 'promotion_ids',
     'ship_postal_code'
 ]
-amazon_sales[categorical_columns] = amazon_sales[categorical_columns].astype('category')
-amazon_sales[string_columns] = amazon_sales[string_columns].astype('string')
-
-
-# Normalize values for categorical and string columns.
 uppercase_strings = ['asin', 'style', 'size', 'sku', 'currency', 'ship_country']
-lowercase_strings = [col for col in (categorical_columns + string_columns) 
+lowercase_strings = [col for col in (categorical_columns + string_columns)
                                  if col not in uppercase_strings]
-amazon_sales[uppercase_strings] = (
-    amazon_sales[uppercase_strings]
-    .apply(lambda x: x.str.strip().str.upper())
-)
-amazon_sales[lowercase_strings] = (
-    amazon_sales[lowercase_strings]
-    .apply(lambda x: x.str.strip().str.lower())
-)
-
-
-# Drop duplicates
-amazon_sales = amazon_sales.drop_duplicates(subset=['order_id', 'asin', 'date'], keep='last')
-
-
-# Fill missing shipping country values. Reconcile fulfillment columns and drop one of them.
-amazon_sales['ship_country'] = amazon_sales['ship_country'].fillna("IN")
-amazon_sales['fulfillment'] = amazon_sales['fulfillment'].replace({'merchant': 'easy ship'})
-amazon_sales.drop(columns='fulfilled_by', inplace=True)
-
-
-# Relabel categories for better consistency
-amazon_sales.loc[
-    (amazon_sales['category']=='dupatta') |
-    (amazon_sales['category']=='saree')
-    , 'category'] ='ethnic dress'
-
-
-# Simplify status values and reconcile with courier status
-amazon_sales.loc[
-    (amazon_sales['courier_status'] == 'unshipped') |
-    (amazon_sales['courier_status'] == 'cancelled'),
-'status'] = 'cancelled'
-
-amazon_sales.loc[
-    (amazon_sales['courier_status'] == 'shipped') &
-    (amazon_sales['status'] == 'pending'),
-'status'] = 'shipped'
-
-
-# Combine status as cancelled or returned. Drop statuses with 0 value count
 combine_status = {
     "shipped - returned to seller": "cancelled",
     "shipped - returning to seller": "cancelled",
@@ -89,33 +58,13 @@ combine_status = {
     "shipped - lost in transit": "cancelled",
     "shipped - damaged": "cancelled"
 }
-amazon_sales['status'] = amazon_sales['status'].replace(combine_status)
-amazon_sales['status'] = amazon_sales['status'].replace({'cancelled': 'cancelled or returned'})
-
-# Drop 0 count status 
 status_to_drop = ['pending', 'pending - waiting for pick up', 'shipping']
-amazon_sales = amazon_sales[~amazon_sales['status'].isin(status_to_drop)]
-
-
-# Drop courier_status
-amazon_sales.drop(columns='courier_status', inplace=True)
-
-
-# Identify incorrectly labeled states/territories
-states_territories = '''Andhra Pradesh, Arunachal Pradesh, Assam, Bihar, Chhattisgarh, Goa, Gujarat, Haryana, 
-Himachal Pradesh, Jharkhand, Karnataka, Kerala, Madhya Pradesh, Maharashtra, Manipur, Meghalaya, 
-Mizoram, Nagaland, Odisha, Punjab, Rajasthan, Sikkim, Tamil Nadu, Telangana, Tripura, Uttar Pradesh, 
-Uttarakhand, West Bengal, Andaman and Nicobar Islands, Chandigarh, Dadra and Nagar Haveli and Daman and Diu, 
+states_territories = '''Andhra Pradesh, Arunachal Pradesh, Assam, Bihar, Chhattisgarh, Goa, Gujarat, Haryana,
+Himachal Pradesh, Jharkhand, Karnataka, Kerala, Madhya Pradesh, Maharashtra, Manipur, Meghalaya,
+Mizoram, Nagaland, Odisha, Punjab, Rajasthan, Sikkim, Tamil Nadu, Telangana, Tripura, Uttar Pradesh,
+Uttarakhand, West Bengal, Andaman and Nicobar Islands, Chandigarh, Dadra and Nagar Haveli and Daman and Diu,
 Delhi, Jammu and Kashmir, Ladakh, Lakshadweep, Puducherry'''
-states_territories = sorted(states_territories.replace('\n', '').lower().split(', '))
-amazon_sales = amazon_sales.rename(columns={'ship_state': 'ship_state_or_territory'})
-incorrect_states_labels = (amazon_sales[
-    ~amazon_sales['ship_state_or_territory']
-    .isin(states_territories)]['ship_state_or_territory']
-.unique())
-
-
-# Update values
+states_territories = sorted(states_territories.replace('\n', ' ').lower().split(', '))
 update = {
     "jammu & kashmir": "jammu and kashmir",
     "dadra and nagar": "dadra and nagar haveli and daman and diu",
@@ -132,19 +81,350 @@ update = {
     "pondicherry": "puducherry",
     "rajsthan": "rajasthan"
 }
-amazon_sales['ship_state_or_territory'] = amazon_sales['ship_state_or_territory'].replace(update)
-# Fill na values and the one address with "apo" as unknown.
-amazon_sales[['ship_state_or_territory', 'ship_city', 'ship_postal_code']] = (
-    amazon_sales[['ship_state_or_territory', 'ship_city', 'ship_postal_code']]
-    .fillna('unknown')
-)
+# Labels the profiler counts as invalid outside of these, e.g. the raw state labels that
+# find_incorrect_states lists
+profiler.vocabularies.update({
+    'ship_state': states_territories,
+    'ship_state_or_territory': states_territories + ['unknown'],
+    'ship_country': ['IN'],
+    'currency': ['INR']
+})
+
+
+# Read data file
+def read_raw(path=file_path, **kwargs):
+    return pd.read_csv(path, dtype=raw_dtypes, **kwargs)
+
+
+# Normalize column names
+def normalize_columns(amazon_sales):
+    amazon_sales.columns = (amazon_sales.columns.str.strip()
+                            .str.replace(r'[-\s]', '_', regex=True)
+                            .str.lower())
+    return amazon_sales.rename(columns={'qty': 'quantity', 'fulfilment': 'fulfillment'})
+
+
+# Drop unnamed column and convert date types
+def convert_types(amazon_sales):
+    amazon_sales = amazon_sales.drop(columns='unnamed:_22')
+    amazon_sales['date'] = pd.to_datetime(
+        amazon_sales['date'],
+        format='%m-%d-%y'
+    )
+    amazon_sales[categorical_columns] = amazon_sales[categorical_columns].astype('category')
+    amazon_sales[string_columns] = amazon_sales[string_columns].astype('string')
+    return amazon_sales
+
+
+# Normalize values for categorical and string columns. Categorical columns are normalized
+# on their categories, string columns row by row.
+def normalize_values(amazon_sales):
+    for col in categorical_columns:
+        case = str.upper if col in uppercase_strings else str.lower
+        amazon_sales[col] = relabel_categories(amazon_sales[col], lambda x: case(x.strip()))
+    uppercase = [col for col in uppercase_strings if col in string_columns]
+    lowercase = [col for col in lowercase_strings if col in string_columns]
+    amazon_sales[uppercase] = (
+        amazon_sales[uppercase]
+        .apply(lambda x: x.str.strip().str.upper())
+    )
+    amazon_sales[lowercase] = (
+        amazon_sales[lowercase]
+        .apply(lambda x: x.str.strip().str.lower())
+    )
+    return amazon_sales
+
+
+# Drop duplicates
+def drop_duplicate_orders(amazon_sales):
+    return amazon_sales.drop_duplicates(subset=dedup_subset, keep='last')
+
+
+# Fill missing shipping country values. Reconcile fulfillment columns and drop one of them.
+# Relabel categories for better consistency
+def reconcile_columns(amazon_sales):
+    amazon_sales['ship_country'] = fill_category(amazon_sales['ship_country'], "IN")
+    amazon_sales['fulfillment'] = relabel_categories(amazon_sales['fulfillment'], {'merchant': 'easy ship'})
+    amazon_sales = amazon_sales.drop(columns='fulfilled_by')
+    amazon_sales['category'] = relabel_categories(
+        amazon_sales['category'], {'dupatta': 'ethnic dress', 'saree': 'ethnic dress'}
+    )
+    return amazon_sales
+
+
+# Simplify status values and reconcile with courier status. Combine status as cancelled
+# or returned, then drop statuses with 0 value count and courier_status
+def reconcile_status(amazon_sales):
+    status, courier_status = amazon_sales['status'], amazon_sales['courier_status']
+    status = assign_category(status, category_mask(courier_status, ['unshipped', 'cancelled']), 'cancelled')
+    status = assign_category(
+        status,
+        category_mask(courier_status, ['shipped']) & category_mask(status, ['pending']),
+        'shipped'
+    )
+    status = relabel_categories(status, combine_status)
+    status = relabel_categories(status, {'cancelled': 'cancelled or returned'})
+    amazon_sales['status'] = status
+    amazon_sales = amazon_sales[~category_mask(status, status_to_drop)]
+    return amazon_sales.drop(columns='courier_status')
+
+
+# Identify incorrectly labeled states/territories
+def find_incorrect_states(amazon_sales):
+    return (amazon_sales[
+        ~amazon_sales['ship_state']
+        .isin(states_territories)]['ship_state']
+    .unique())
+
+
+# Update state values. Fill na values and the one address with "apo" as unknown.
+def fix_states(amazon_sales):
+    amazon_sales = amazon_sales.rename(columns={'ship_state': 'ship_state_or_territory'})
+    amazon_sales['ship_state_or_territory'] = fill_category(
+        relabel_categories(amazon_sales['ship_state_or_territory'], update), 'unknown'
+    )
+    amazon_sales[['ship_city', 'ship_postal_code']] = (
+        amazon_sales[['ship_city', 'ship_postal_code']]
+        .fillna('unknown')
+    )
+    return amazon_sales
 
 
 # Fix postal code decimal place and convert promotion_ids to boolean
-amazon_sales['ship_postal_code'] = amazon_sales['ship_postal_code'].str.replace('\.0$', '', regex=True)
-amazon_sales['promotion_ids'] = amazon_sales['promotion_ids'].notna()
+def fix_postal_codes(amazon_sales):
+    amazon_sales['ship_postal_code'] = amazon_sales['ship_postal_code'].str.replace(r'\.0$', '', regex=True)
+    amazon_sales['promotion_ids'] = amazon_sales['promotion_ids'].notna()
+    return amazon_sales
+
+
+# Every step after dedup only looks at its own row, so chunks can run through it independently
+def clean_rows(amazon_sales):
+    amazon_sales = reconcile_columns(amazon_sales)
+    amazon_sales = reconcile_status(amazon_sales)
+    amazon_sales = fix_states(amazon_sales)
+    return fix_postal_codes(amazon_sales)
+
+
+def clean(amazon_sales):
+    amazon_sales = normalize_orders(amazon_sales)
+    amazon_sales = drop_duplicate_orders(amazon_sales)
+    return clean_rows(amazon_sales)
+
+
+# Stage functions for the cached pipeline
+def normalize_orders(amazon_sales):
+    return normalize_values(convert_types(normalize_columns(amazon_sales)))
+
+
+def reconcile_orders(amazon_sales):
+    return reconcile_status(reconcile_columns(amazon_sales))
+
+
+def fix_addresses(amazon_sales):
+    return fix_postal_codes(fix_states(amazon_sales))
+
+
+# Export processed data to csv for the SQL step and to the typed store
+def export_orders(amazon_sales, output=output_path):
+    amazon_sales.to_csv(output, index=False)
+    write_table(amazon_sales, 'amazon_sales_pdcleaned', os.path.dirname(output))
+    return [output, table_path('amazon_sales_pdcleaned', os.path.dirname(output))]
+
+
+# Named stages, evaluated lazily and cached on disk by a hash of their code and inputs.
+# Nothing is read or computed until a stage's output is requested.
+def build_pipeline(path=file_path, output=output_path, orders_output=orders_path,
+                   reference=reference_path, pin_reference=pincodes.reference_path):
+    # Raw columns are renamed by normalize, so profiling starts there
+    load = Stage('load', read_raw, args=[File(path)], profile=False)
+    normalize = Stage('normalize', normalize_orders, deps=[load])
+    dedup = Stage('dedup', drop_duplicate_orders, deps=[normalize])
+    status = Stage('status', reconcile_orders, deps=[dedup])
+    states = Stage('states', fix_addresses, deps=[status])
+    export = Stage('export', export_orders, deps=[states], args=[output],
+                   outputs=[output, table_path('amazon_sales_pdcleaned', os.path.dirname(output))])
+    stages = [load, normalize, dedup, status, states, export]
+    # States are repaired and checked against PIN codes once a reference list exists (see
+    # src/pincodes.py), before the SQL step groups cities by state and postal code
+    if os.path.exists(pin_reference):
+        states = Stage('pins', repair_states, deps=[states],
+                       args=[File(pin_reference), states_territories, os.path.dirname(orders_output)],
+                       outputs=[table_path('pin_state_report', os.path.dirname(orders_output))])
+        stages.append(states)
+    # Payment and address recovery from notebooks/sql_cleaning.txt
+    payments = Stage('payments', impute_orders, deps=[states])
+    cities = Stage('cities', build_orders, deps=[payments])
+    stages += [payments, cities]
+    # Fuzzy city resolution runs once a reference list exists (see src/cities.py)
+    if os.path.exists(reference):
+        stages.append(Stage('fuzzy_cities', resolve_cities, deps=[cities], args=[File(reference)]))
+    orders = Stage('orders', write_orders, deps=[stages[-1]], args=[orders_output],
+                   outputs=[orders_output, table_path('orders', os.path.dirname(orders_output))])
+    return Pipeline(stages + [orders])
+
+
+# Hash the normalized dedup key of every row to a single uint64
+def hash_dedup_keys(chunk):
+    keys = normalize_columns(chunk)[dedup_subset]
+    keys = pd.DataFrame({
+        'order_id': keys['order_id'].astype('string').str.strip().str.lower(),
+        'asin': keys['asin'].astype('string').str.strip().str.upper(),
+        'date': pd.to_datetime(keys['date'], format='%m-%d-%y')
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+# First pass over the raw file: read only the key columns and mark the last occurrence of
+# every (order_id, asin, date). The index costs 8 bytes per row instead of a full frame.
+def build_keep_mask(path=file_path, chunksize=100_000):
+    hashes = []
+    for chunk in iterate('read_keys', read_raw(path, usecols=['Order ID', 'ASIN', 'Date'], chunksize=chunksize)):
+        with step('hash_keys', len(chunk)):
+            hashes.append(hash_dedup_keys(chunk))
+    hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype='uint64')
+    return ~pd.Series(hashes).duplicated(keep='last').to_numpy()
+
+
+# Streaming mode: second pass cleans one chunk at a time and appends it to the CSV export and
+# the typed store, so peak memory is bounded by the chunk size rather than the file size.
+def stream_clean(path=file_path, output=output_path, chunksize=100_000):
+    with step('keep_mask') as info:
+        keep = build_keep_mask(path, chunksize)
+        info['rows_out'] = int(keep.sum())
+    start = 0
+    with TableWriter('amazon_sales_pdcleaned', os.path.dirname(output)) as store:
+        for i, chunk in enumerate(iterate('read', read_raw(path, chunksize=chunksize))):
+            chunk_keep = keep[start:start + len(chunk)]
+            start += len(chunk)
+            with step('normalize', len(chunk)) as info:
+                chunk = normalize_values(convert_types(normalize_columns(chunk[chunk_keep])))
+                info['rows_out'] = len(chunk)
+            with step('profile', len(chunk)):
+                observe('normalize', chunk)
+            with step('clean_rows', len(chunk)) as info:
+                chunk = clean_rows(chunk)
+                info['rows_out'] = len(chunk)
+            with step('profile', len(chunk)):
+                observe('clean_rows', chunk)
+            with step('write', len(chunk)):
+                chunk.to_csv(output, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+                store.write(chunk)
+
+
+# Parallel mode: rows are hash-partitioned by normalized order_id, so every (order_id, asin,
+# date) key lands in one partition and dedup stays local to it. Each partition runs the whole
+# chain and formats its own CSV lines in a worker process. The parent puts the rows back in
+# file order, so the export is identical to the serial run. Payment and address recovery
+# groups by asin and postal code across orders and runs afterwards, as in streaming mode.
+# Raw rows shared with forked workers, which receive only their partition's positions
+shared_raw = None
+
+
+def order_partitions(raw, partitions):
+    order_ids = raw['Order ID'].astype('string').str.strip().str.lower().fillna('')
+    return pd.util.hash_array(order_ids.to_numpy(dtype=object)) % partitions
+
+
+# Clean one partition and format its rows as CSV lines. Lines are None when a value spans
+# several lines, and the parent formats the export itself.
+def clean_partition(part):
+    with step('clean', len(part)) as info:
+        cleaned = clean(part)
+        info['rows_out'] = len(cleaned)
+    with step('profile', len(cleaned)):
+        observe('clean', cleaned)
+    with step('format', len(cleaned)):
+        lines = cleaned.to_csv(index=False, header=False, lineterminator='\n').split('\n')[:-1]
+    return cleaned, lines if len(lines) == len(cleaned) else None
+
+
+# Pool task: `part` is a frame, or row positions into the raw rows shared by fork
+def partition_task(part, parents=()):
+    instrument.reset(parents)
+    profiler.reset()
+    if not isinstance(part, pd.DataFrame):
+        part = shared_raw.iloc[part]
+    return (*clean_partition(part), instrument.snapshot(), profiler.snapshot())
+
+
+def parallel_clean(path=file_path, output=output_path, workers=None, partitions=None):
+    global shared_raw
+    workers = workers or os.cpu_count()
+    partitions = partitions or workers
+    with step('read') as info:
+        raw = read_raw(path)
+        info['rows_out'] = len(raw)
+    with step('partition', len(raw)):
+        ids = order_partitions(raw, partitions)
+        parts = [rows for rows in (np.flatnonzero(ids == p) for p in range(partitions)) if len(rows)]
+    if workers == 1 or len(parts) < 2:
+        results = [clean_partition(raw.iloc[rows]) for rows in parts] or [clean_partition(raw)]
+    else:
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        shared_raw = raw
+        tasks = parts if method == 'fork' else [raw.iloc[rows] for rows in parts]
+        results = []
+        try:
+            task = partial(partition_task, parents=list(instrument.stack))
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method)) as pool:
+                for cleaned, lines, records, profiles in pool.map(task, tasks):
+                    instrument.merge(records)
+                    profiler.merge(profiles)
+                    results.append((cleaned, lines))
+        finally:
+            shared_raw = None
+    # Every partition starts from the same parsed categories and the categorical transforms
+    # only rewrite the category lists, so the partitions concatenate without recoding
+    with step('merge', len(raw)) as info:
+        amazon_sales = pd.concat([cleaned for cleaned, _ in results]).sort_index(kind='stable')
+        info['rows_out'] = len(amazon_sales)
+    with step('write', len(amazon_sales)):
+        if all(lines is not None for _, lines in results):
+            lines = [line for _, part_lines in results for line in part_lines]
+            positions = np.concatenate([cleaned.index.to_numpy() for cleaned, _ in results])
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(amazon_sales.iloc[:0].to_csv(index=False, lineterminator='\n'))
+                f.writelines(lines[i] + '\n' for i in np.argsort(positions, kind='stable'))
+            write_table(amazon_sales, 'amazon_sales_pdcleaned', os.path.dirname(output))
+        else:
+            export_orders(amazon_sales, output)
+    return amazon_sales
+
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean the raw Amazon sales report.')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the raw file in chunks of this many rows')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='clean hash partitions of the raw file in this many processes')
+    parser.add_argument('--partitions', type=int, default=None,
+                        help='number of hash partitions in parallel mode (default: one per worker)')
+    parser.add_argument('--flame', action='store_true',
+                        help='print a per-step summary and write folded stacks next to the run report')
+    parser.add_argument('--changes', action='store_true',
+                        help='print what the profile of each stage changed since its input and the last run')
+    args = parser.parse_args()
 
-# Export processed data to csv
-output_path = os.path.join(project_root, 'data', 'processed', f'amazon_sales_pdcleaned.csv')
-amazon_sales.to_csv(output_path, index=False)
\ No newline at end of file
+    # Streaming and parallel runs profile different stages, so each mode is diffed against its own last run
+    if args.chunksize:
+        run = 'pandas_cleaning_stream'
+        stream_clean(chunksize=args.chunksize)
+    elif args.workers:
+        run = 'pandas_cleaning_parallel'
+        parallel_clean(workers=args.workers, partitions=args.partitions)
+    else:
+        run = 'pandas_cleaning'
+        pipeline = build_pipeline()
+        pipeline.run('export')
+        pipeline.run('orders')
+        for name, result in pipeline.report().items():
+            print(f'{name}: {result}')
+    report = write_report('pandas_cleaning', args.flame)
+    if report:
+        print(f'run report: {report}')
+    profile_report = profiler.write_report(run)
+    if profile_report:
+        changes = profiler.report_summary(profile_report)
+        if args.changes and changes:
+            print(changes)
+        print(f'profile report: {profile_report}')
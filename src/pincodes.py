@@ -0,0 +1,151 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from store import store_path, load_table, write_table
+from categoricals import from_codes, relabel_categories
+
+
+# PIN-code check of ship_state_or_territory. Indian PIN codes are six digits whose leading
+# digits identify the postal circle and sorting district, so a prefix pins down the state for
+# almost every code. The reference file lists prefixes of any length (longest match wins); it
+# is expanded into a dense array over all 10**6 codes holding a state number, so looking up
+# every row is one gather. States are compared as integer codes too: the labels are matched
+# once per category, never per row. Rows whose state is missing or not a known label take the
+# state of their PIN, and rows whose known state disagrees with it are reported, not changed,
+# since either side may be wrong.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+reference_path = os.path.join(project_root, 'data', 'reference', 'pincodes.csv')
+prefix_digits = 3
+pin_low, pin_high = 100_000, 999_999
+unknown = 'unknown'
+
+
+# Reference list: one row per PIN prefix with its state
+def load_reference(path=reference_path):
+    return pd.read_csv(path, dtype={'prefix': 'string', 'ship_state_or_territory': 'string'})
+
+
+class PinIndex:
+    def __init__(self, reference):
+        prefixes = reference['prefix'].to_numpy(dtype=object)
+        labels = reference['ship_state_or_territory'].to_numpy(dtype=object)
+        self.states = np.array(sorted(set(labels)), dtype=object)
+        codes = np.searchsorted(self.states, labels)
+        self.table = np.full(pin_high + 1, -1, dtype='int16')
+        # Shorter prefixes first, so a longer one overrides the part of the range it narrows
+        for row in sorted(range(len(prefixes)), key=lambda row: len(prefixes[row])):
+            width = 10 ** (6 - len(prefixes[row]))
+            start = int(prefixes[row]) * width
+            self.table[start:start + width] = codes[row]
+
+    # State number of every PIN, or -1 for invalid codes and prefixes not in the reference
+    def lookup(self, pins):
+        valid = (pins >= pin_low) & (pins <= pin_high)
+        return np.where(valid, self.table[np.where(valid, pins, 0)], -1).astype('int64')
+
+
+# Postal codes as integers, -1 where they are not a six digit PIN. Only distinct values are
+# parsed; rows get theirs with a gather.
+def pin_numbers(postal_codes):
+    codes, uniques = pd.factorize(postal_codes)
+    numbers = pd.to_numeric(pd.Series(np.asarray(uniques, dtype=object)), errors='coerce').to_numpy(dtype='float64')
+    valid = (numbers >= pin_low) & (numbers <= pin_high) & (numbers == np.floor(numbers))
+    numbers = np.where(valid, numbers, -1).astype('int64')
+    return np.where(codes >= 0, numbers[np.maximum(codes, 0)], -1)
+
+
+# Repair missing or unknown states from the PIN code and count what was changed or disagrees,
+# per (state, PIN state). `known` lists the labels kept as they are; by default the
+# reference's states. A reference without states repairs nothing and reports nothing.
+def repair_states(orders, path=reference_path, known=None, output=store_path):
+    index = PinIndex(load_reference(path))
+    column = orders['ship_state_or_territory'].astype('category')
+    labels = column.cat.categories
+    if not len(index.states):
+        none = np.zeros(0, dtype='int64')
+        write_table(state_report(none, none, none.astype(bool), none.astype(bool), labels, index.states),
+                    'pin_state_report', output)
+        return orders
+    known = pd.Index(index.states if known is None else known)
+    # Per category: its PIN state number, or -1 when it is not a known label
+    category_state = np.where(labels.isin(known), pd.Index(index.states).get_indexer(labels), -1)
+    category_known = labels.isin(known) & (labels != unknown)
+    codes = column.cat.codes.to_numpy().astype('int64')
+    state = np.where(codes >= 0, category_state[codes], -1)
+    is_known = np.where(codes >= 0, category_known[codes], False)
+    pin_state = index.lookup(pin_numbers(orders['ship_postal_code']))
+    repaired = ~is_known & (pin_state >= 0)
+    conflict = is_known & (pin_state >= 0) & (pin_state != state)
+
+    # New labels are the PIN states appended to the existing categories
+    categories = labels.append(pd.Index(index.states).difference(labels))
+    state_code = categories.get_indexer(index.states)
+    new_codes = np.where(repaired, state_code[np.maximum(pin_state, 0)], codes)
+    orders['ship_state_or_territory'] = relabel_categories(from_codes(column, new_codes, categories), {})
+    write_table(state_report(codes, pin_state, repaired, conflict, labels, index.states), 'pin_state_report', output)
+    return orders
+
+
+# Orders per (kind, state label, PIN state), counted on integer codes
+def state_report(codes, pin_state, repaired, conflict, labels, states):
+    parts = []
+    for kind, mask in [('repaired', repaired), ('conflict', conflict)]:
+        # Missing states are counted under an extra label code
+        pairs = np.where(codes[mask] >= 0, codes[mask], len(labels)) * len(states) + pin_state[mask]
+        counts = np.bincount(pairs, minlength=(len(labels) + 1) * len(states))
+        pairs = np.flatnonzero(counts)
+        parts.append(pd.DataFrame({
+            'kind': kind,
+            'ship_state_or_territory': np.append(np.asarray(labels, dtype=object), None)[pairs // len(states)],
+            'pin_state_or_territory': states[pairs % len(states)],
+            'orders': counts[pairs]
+        }))
+    report = pd.concat(parts, ignore_index=True)
+    return report.sort_values(['kind', 'orders'], ascending=[True, False], kind='stable').reset_index(drop=True)
+
+
+# Bootstrap a reference list from the cleaned orders: each prefix seen on at least
+# `min_orders` orders whose most common known state holds at least `min_share` of them
+def build_reference(orders, digits=prefix_digits, min_orders=20, min_share=0.9):
+    pins = pin_numbers(orders['ship_postal_code'])
+    states = orders['ship_state_or_territory'].astype('category')
+    keep = (pins >= 0) & (states.cat.codes.to_numpy() >= 0) & (states != unknown).to_numpy()
+    counts = pd.DataFrame({
+        'prefix': pins[keep] // 10 ** (6 - digits),
+        'ship_state_or_territory': states[keep].to_numpy()
+    }).groupby(['prefix', 'ship_state_or_territory'], observed=True).size().rename('orders').reset_index()
+    totals = counts.groupby('prefix')['orders'].transform('sum')
+    counts['share'] = counts['orders'] / totals
+    counts = counts[(totals >= min_orders) & (counts['share'] >= min_share)].copy()
+    counts['prefix'] = counts['prefix'].astype(str).str.zfill(digits)
+    counts['share'] = counts['share'].round(3)
+    return counts.sort_values('prefix').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PIN-code lookup of ship_state_or_territory.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='write a PIN prefix reference list from the cleaned orders')
+    build.add_argument('--digits', type=int, default=prefix_digits, help='prefix length')
+    build.add_argument('--min-orders', type=int, default=20, help='orders a prefix needs to be listed')
+    build.add_argument('--min-share', type=float, default=0.9, help='share of its orders the state must hold')
+    build.add_argument('--orders', default='orders', help='store table with the cleaned orders')
+    lookup = subparsers.add_parser('lookup', help='print the state of PIN codes')
+    lookup.add_argument('pins', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        reference = build_reference(load_table(args.orders), args.digits, args.min_orders, args.min_share)
+        # An empty list would only disable the repair while looking like a reference
+        if reference.empty:
+            parser.error('no prefix has enough orders with one state; lower --min-orders or --min-share')
+        os.makedirs(os.path.dirname(reference_path), exist_ok=True)
+        reference[['prefix', 'ship_state_or_territory', 'orders', 'share']].to_csv(reference_path, index=False)
+        print(f'{len(reference)} prefixes written to {reference_path}')
+    else:
+        index = PinIndex(load_reference())
+        found = index.lookup(pin_numbers(pd.Series(args.pins, dtype=object)))
+        for pin, state in zip(args.pins, found):
+            print(f'{pin}: {index.states[state] if state >= 0 else unknown}')
@@ -0,0 +1,191 @@
+# Import dependencies
+import hashlib
+import inspect
+import json
+import os
+import sys
+import pandas as pd
+from instrument import rows, step
+import profiler
+
+
+# Lazy stages with an on-disk cache. A stage's key hashes its code, its arguments (file
+# arguments by content) and the keys of the stages it depends on, so keys can be computed
+# without running anything. Only stages whose key has no cached output are evaluated. A
+# stage's code is the source of every project module its function can reach, so editing any
+# helper it calls, however indirectly, changes the key.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+source_path = os.path.dirname(os.path.abspath(__file__))
+cache_path = os.path.join(project_root, 'data', 'cache')
+
+
+# Marks a stage argument as a file whose content is part of the key
+class File:
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f'File({self.path!r})'
+
+
+# Content hash of a file. Hashes are remembered by (size, mtime) so an untouched file is
+# not read again on the next run.
+def file_digest(path):
+    index_path = os.path.join(cache_path, 'file_digests.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    entry = index.get(path)
+    if entry and entry['stamp'] == stamp:
+        return entry['digest']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    index[path] = {'stamp': stamp, 'digest': digest.hexdigest()}
+    os.makedirs(cache_path, exist_ok=True)
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    return index[path]['digest']
+
+
+# Content hash of a frame or series, including its labels and dtypes
+def frame_digest(obj):
+    digest = hashlib.sha256(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    if isinstance(obj, pd.DataFrame):
+        digest.update(repr(list(obj.columns)).encode())
+        digest.update(repr(list(obj.dtypes)).encode())
+    else:
+        digest.update(repr((obj.name, obj.dtype)).encode())
+    return digest.hexdigest()
+
+
+# Functions contribute their source, frames their content, everything else its repr
+def fingerprint(obj):
+    if isinstance(obj, File):
+        return file_digest(obj.path)
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return frame_digest(obj)
+    if callable(obj):
+        return inspect.getsource(obj)
+    return repr(obj)
+
+
+# Source files of the project modules `func` depends on: its own module and, in turn, every
+# project module that a module already found imports a name from
+def project_modules(func):
+    found = set()
+    pending = [sys.modules[func.__module__]]
+    while pending:
+        module = pending.pop()
+        file = getattr(module, '__file__', None)
+        if file is None:
+            continue
+        file = os.path.abspath(file)
+        if os.path.dirname(file) != source_path or file in found:
+            continue
+        found.add(file)
+        for value in vars(module).values():
+            name = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+            if isinstance(name, str) and name in sys.modules:
+                pending.append(sys.modules[name])
+    return sorted(found)
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), args=(), code=(), outputs=(), profile=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.args = list(args)
+        # Values the stage relies on beyond the project source, e.g. settings built at run time
+        self.code = list(code)
+        # Files the stage writes. A cached result is only valid while they exist.
+        self.outputs = list(outputs)
+        # Whether the output frame is profiled (see src/profiler.py)
+        self.profile = profile
+        self._key = None
+        self._value = None
+        self.hit = None
+
+    def key(self):
+        if self._key is None:
+            digest = hashlib.sha256(self.name.encode())
+            modules = [File(file) for file in project_modules(self.func)]
+            for part in [self.func] + modules + self.code + self.args:
+                digest.update(fingerprint(part).encode())
+            for dep in self.deps:
+                digest.update(dep.key().encode())
+            self._key = digest.hexdigest()[:16]
+        return self._key
+
+    def cache_file(self):
+        return os.path.join(cache_path, f'{self.name}-{self.key()}.pkl')
+
+    # Profile of the cached output, so a hit does not profile it again
+    def profile_file(self):
+        return os.path.join(cache_path, f'{self.name}-{self.key()}.profile.pkl')
+
+    def output(self):
+        if self._value is not None:
+            return self._value
+        path = self.cache_file()
+        hit = os.path.exists(path) and all(os.path.exists(out) for out in self.outputs)
+        # A stage reloaded for a second consumer keeps the result of its first evaluation
+        first = self.hit is None
+        if first:
+            self.hit = hit
+        if hit:
+            with step(f'{self.name} (cached)') as info:
+                self._value = pd.read_pickle(path)
+                info['rows_out'] = rows(self._value)
+        else:
+            args = [arg.path if isinstance(arg, File) else arg for arg in self.args]
+            # Inputs are evaluated first so each stage is timed on its own
+            inputs = [dep.output() for dep in self.deps]
+            with step(self.name, rows(inputs[0]) if inputs else None) as info:
+                self._value = self.func(*inputs, *args)
+                info['rows_out'] = rows(self._value)
+            self.save(path)
+            # Stages may modify their inputs in place, so upstream values are not reused
+            for dep in self.deps:
+                dep._value = None
+        # Profiled once per run and diffed against the stage it reads from
+        if first and self.profile and profiler.enabled and isinstance(self._value, pd.DataFrame):
+            with step(f'{self.name} (profile)'):
+                profiler.observe_cached(self.name, self._value, self.profile_file(), self.deps[0].name if self.deps else None)
+        return self._value
+
+    # Keep one cached result per stage
+    def save(self, path):
+        os.makedirs(cache_path, exist_ok=True)
+        for file in os.listdir(cache_path):
+            if file.startswith(f'{self.name}-') and file.endswith('.pkl'):
+                os.remove(os.path.join(cache_path, file))
+        pd.to_pickle(self._value, path)
+
+    def invalidate(self):
+        self._key = None
+        self._value = None
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def run(self, name=None):
+        stage = self.stages[name] if name else list(self.stages.values())[-1]
+        return stage.output()
+
+    # Stage name -> 'hit', 'miss', or 'skipped' when a downstream hit made it unnecessary
+    def report(self):
+        return {
+            name: 'skipped' if stage.hit is None else ('hit' if stage.hit else 'miss')
+            for name, stage in self.stages.items()
+        }
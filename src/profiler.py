@@ -0,0 +1,469 @@
+# Import dependencies
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from store import load_table, read_batches
+
+
+# One-pass data-quality profiles, replacing the width_bucket histograms, min/max subqueries and
+# null counts that notebooks/sql_cleaning.txt re-runs after each imputation. Every column of a
+# frame is summarized with a few vectorized passes over its values:
+#   - rows and nulls, 'unknown' placeholders, and labels outside a declared vocabulary
+#   - distinct values, exact up to `distinct_size` and estimated above it from the smallest
+#     value hashes (k minimum values)
+#   - min, max and mean of numbers, dates and booleans, quantiles from a bottom-k sample of
+#     rows, and a histogram whose bin width is a power of two, doubled as the range grows
+# All of these merge, so chunks (streaming mode) and partitions (parallel mode) are profiled
+# on their own and folded together, like instrument's step records. Rows are sampled by a
+# hash of their index label, so stages that keep the same rows keep the same sample and their
+# quantiles only move when the values do. Profiles are on by default; PIPELINE_PROFILE=0
+# turns them off.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+profiles_path = os.path.join(project_root, 'data', 'profiles')
+enabled = os.environ.get('PIPELINE_PROFILE', '1') != '0'
+version = 1
+distinct_size = 4096
+sample_size = 2048
+max_bins = 64
+quantile_levels = [0.01, 0.25, 0.5, 0.75, 0.99]
+probe_rows = 10_000
+placeholder = 'unknown'
+# Largest relative change of a distinct count and largest histogram shift (total variation
+# distance) reported as unchanged
+tolerance = 0.01
+
+# Column -> labels it may hold, registered by the modules that define them
+vocabularies = {}
+
+profiles = {}
+parents = {}
+
+
+# Values of a column as numbers when it has an order: floats, dates as int64 nanoseconds and
+# booleans as 0/1. Text and categories return None.
+def numeric_values(values):
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+        return None, None
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return 'bool', values.to_numpy(dtype='float64', na_value=np.nan)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        numbers = values.to_numpy(dtype='datetime64[ns]').view('int64').astype('float64')
+        return 'datetime', np.where(values.isna().to_numpy(), np.nan, numbers)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return 'number', values.to_numpy(dtype='float64', na_value=np.nan)
+    return None, None
+
+
+# Nulls, value hashes, placeholder count and per-label counts outside `vocabulary`. Text is
+# counted per distinct label and each label hashed once: categories directly, other text after
+# a factorize, which reuses the hashes Python caches on its strings and finds the nulls on the
+# way. Mostly unique ids (judged on the first `probe_rows`) are hashed row by row instead,
+# skipping a hash table as large as the column.
+def text_summary(values, vocabulary):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        labels = np.asarray(values.cat.categories.astype(str), dtype=object)
+    else:
+        present = np.asarray(values.array, dtype=object)
+        probe = present[:probe_rows]
+        if len(pd.unique(probe)) > 0.9 * len(probe):
+            missing = pd.isna(present)
+            present = present[~missing]
+            hashes = pd.util.hash_array(present, categorize=False)
+            unknown = int((present == placeholder).sum())
+            if vocabulary is None:
+                return int(missing.sum()), hashes, unknown, {}
+            labels, counts = np.unique(present[~pd.Index(present).isin(vocabulary)].astype(str), return_counts=True)
+            return int(missing.sum()), hashes, unknown, dict(zip(labels.tolist(), counts.tolist()))
+        codes, labels = pd.factorize(present)
+        labels = np.asarray(labels, dtype=object).astype(str).astype(object)
+    nulls = int((codes < 0).sum())
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    labels, counts = labels[counts > 0], counts[counts > 0]
+    hashes = pd.util.hash_array(labels, categorize=False)
+    unknown = int(counts[labels == placeholder].sum())
+    if vocabulary is None:
+        return nulls, hashes, unknown, {}
+    outside = ~pd.Index(labels).isin(vocabulary)
+    return nulls, hashes, unknown, dict(zip(labels[outside].tolist(), counts[outside].tolist()))
+
+
+# The `size` smallest distinct hashes, looking only below a cut when the column is large
+def smallest_unique(hashes, size=distinct_size):
+    if len(hashes) > 4 * size:
+        smallest = np.unique(hashes[hashes <= np.partition(hashes, 4 * size)[4 * size]])
+        if len(smallest) >= size:
+            return smallest[:size]
+    return np.sort(pd.unique(hashes))[:size]
+
+
+# Positions of the `size` rows with the smallest priorities, in no particular order
+def bottom(priorities, size=sample_size):
+    if len(priorities) <= size:
+        return np.arange(len(priorities))
+    return np.argpartition(priorities, size)[:size]
+
+
+# Histogram bins are floor(value / 2**exponent); a coarser exponent halves the bin indices
+def coarsen(bins, counts, exponent, target):
+    if target == exponent:
+        return bins, counts
+    bins, inverse = np.unique(np.floor_divide(bins, 2 ** (target - exponent)), return_inverse=True)
+    return bins, np.bincount(inverse, weights=counts, minlength=len(bins)).astype('int64')
+
+
+def fit_bins(bins, counts, exponent):
+    while len(bins) and bins[-1] - bins[0] >= max_bins:
+        bins, counts = coarsen(bins, counts, exponent, exponent + 1)
+        exponent += 1
+    return bins, counts, exponent
+
+
+# A single value has no range to size its bins by, so it is kept as (values, counts, None)
+# and binned at the width of whatever it is merged with: a width of its own could be coarser
+# than the single-pass histogram's.
+def histogram(numbers):
+    low, high = numbers.min(), numbers.max()
+    if high == low:
+        return np.array([high]), np.array([len(numbers)], dtype='int64'), None
+    exponent = int(np.ceil(np.log2((high - low) / max_bins)))
+    bins = np.floor(numbers / 2.0 ** exponent).astype('int64')
+    first = bins.min()
+    counts = np.bincount(bins - first)
+    bins = np.flatnonzero(counts)
+    return fit_bins(bins + first, counts[bins].astype('int64'), exponent)
+
+
+def bin_point(point, exponent):
+    return np.floor(point[0] / 2.0 ** exponent).astype('int64'), point[1], exponent
+
+
+# Bins of a histogram for reporting; a single value takes the width of its leading power of two
+def settled(histogram):
+    if histogram is None or histogram[2] is not None:
+        return histogram
+    value = histogram[0][0]
+    return bin_point(histogram, int(np.floor(np.log2(abs(value)))) if value else 0)
+
+
+def merge_histograms(first, second):
+    if first is None or second is None:
+        return first if second is None else second
+    if first[2] is None and second[2] is None:
+        if first[0][0] == second[0][0]:
+            return first[0], first[1] + second[1], None
+        exponent = histogram(np.array([first[0][0], second[0][0]]))[2]
+        first, second = bin_point(first, exponent), bin_point(second, exponent)
+    elif first[2] is None:
+        first = bin_point(first, second[2])
+    elif second[2] is None:
+        second = bin_point(second, first[2])
+    exponent = max(first[2], second[2])
+    bins, counts = zip(coarsen(*first[:2], first[2], exponent), coarsen(*second[:2], second[2], exponent))
+    bins, inverse = np.unique(np.concatenate(bins), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(bins)).astype('int64')
+    return fit_bins(bins, counts, exponent)
+
+
+def column_state(values, priorities, vocabulary=None):
+    kind, numbers = numeric_values(values)
+    if kind is None:
+        nulls, hashes, unknown, invalid = text_summary(values, vocabulary)
+        return {
+            'kind': 'text', 'rows': len(values), 'nulls': nulls, 'hashes': smallest_unique(hashes),
+            'unknown': unknown, 'invalid': None if vocabulary is None else invalid
+        }
+    present = ~np.isnan(numbers)
+    numbers, priorities = numbers[present], priorities[present]
+    state = {
+        'kind': kind, 'rows': len(values), 'nulls': len(values) - len(numbers),
+        'hashes': smallest_unique(pd.util.hash_array(numbers))
+    }
+    if not len(numbers):
+        state.update(min=None, max=None, sum=0.0, sample=(priorities, numbers), histogram=None)
+        return state
+    keep = bottom(priorities)
+    state.update(
+        min=float(numbers.min()), max=float(numbers.max()), sum=float(numbers.sum()),
+        sample=(priorities[keep], numbers[keep]), histogram=histogram(numbers)
+    )
+    return state
+
+
+def merge_states(first, second):
+    if first['kind'] != second['kind']:
+        raise ValueError(f"cannot merge a {first['kind']} column into a {second['kind']} column")
+    state = {
+        'kind': first['kind'], 'rows': first['rows'] + second['rows'], 'nulls': first['nulls'] + second['nulls'],
+        'hashes': smallest_unique(np.concatenate([first['hashes'], second['hashes']]))
+    }
+    if first['kind'] == 'text':
+        invalid = None
+        if first['invalid'] is not None:
+            invalid = dict(first['invalid'])
+            for label, count in second['invalid'].items():
+                invalid[label] = invalid.get(label, 0) + count
+        state.update(unknown=first['unknown'] + second['unknown'], invalid=invalid)
+        return state
+    bounds = [value for value in [first['min'], second['min'], first['max'], second['max']] if value is not None]
+    priorities = np.concatenate([first['sample'][0], second['sample'][0]])
+    numbers = np.concatenate([first['sample'][1], second['sample'][1]])
+    keep = bottom(priorities)
+    state.update(
+        min=min(bounds) if bounds else None, max=max(bounds) if bounds else None,
+        sum=first['sum'] + second['sum'], sample=(priorities[keep], numbers[keep]),
+        histogram=merge_histograms(first['histogram'], second['histogram'])
+    )
+    return state
+
+
+def distinct_estimate(hashes):
+    if len(hashes) < distinct_size:
+        return len(hashes)
+    return int(round((distinct_size - 1) * 2.0 ** 64 / (float(hashes[-1]) + 1)))
+
+
+# Dates are reported as timestamps to the second; their histograms stay in nanoseconds
+def readable(value, kind):
+    return pd.Timestamp(int(value)).round('s').isoformat() if kind == 'datetime' else float(value)
+
+
+# Mergeable summary of every column of a frame
+class Profile:
+    def __init__(self, labels=None):
+        self.vocabularies = dict(vocabularies if labels is None else labels)
+        self.columns = {}
+
+    def add(self, frame):
+        priorities = pd.util.hash_array(frame.index.to_numpy())
+        for col in frame.columns:
+            state = column_state(frame[col], priorities, self.vocabularies.get(col))
+            self.columns[col] = merge_states(self.columns[col], state) if col in self.columns else state
+        return self
+
+    def merge(self, other):
+        for col, state in other.columns.items():
+            self.columns[col] = merge_states(self.columns[col], state) if col in self.columns else state
+        return self
+
+    # JSON-ready statistics of every column
+    def summary(self):
+        summary = {}
+        for col, state in self.columns.items():
+            present = state['rows'] - state['nulls']
+            column = {
+                'kind': state['kind'], 'rows': state['rows'], 'nulls': state['nulls'],
+                'distinct': distinct_estimate(state['hashes'])
+            }
+            if state['kind'] == 'text':
+                column['unknown'] = state['unknown']
+                if state['invalid'] is not None:
+                    column['invalid'] = sum(state['invalid'].values())
+                    largest = sorted(state['invalid'].items(), key=lambda item: -item[1])[:10]
+                    column['invalid_labels'] = dict(largest)
+            elif state['min'] is not None:
+                quantiles = np.quantile(state['sample'][1], quantile_levels)
+                histogram = settled(state['histogram'])
+                column.update(
+                    min=readable(state['min'], state['kind']), max=readable(state['max'], state['kind']),
+                    mean=readable(state['sum'] / present, state['kind']),
+                    quantiles={str(q): readable(v, state['kind']) for q, v in zip(quantile_levels, quantiles)},
+                    histogram={
+                        'exponent': histogram[2], 'bins': histogram[0].tolist(), 'counts': histogram[1].tolist()
+                    }
+                )
+            summary[col] = column
+        return summary
+
+
+# Profile `frame` as stage `name` of this run. A stage seen again (the next chunk, another
+# partition) is merged into what it already has. `parent` is the stage it is diffed against,
+# by default the stage profiled before it.
+def observe(name, frame, parent=None, labels=None):
+    if not enabled or not isinstance(frame, pd.DataFrame):
+        return None
+    profile = Profile(labels).add(frame)
+    record(name, profile, parent)
+    return profile
+
+
+def record(name, profile, parent=None):
+    if name not in profiles:
+        parents[name] = parent if parent is not None else (list(profiles)[-1] if profiles else None)
+        profiles[name] = profile
+    else:
+        profiles[name].merge(profile)
+
+
+# Profile a stage's output, or reuse the profile saved at `path` by the run that cached it
+def observe_cached(name, frame, path, parent=None, labels=None):
+    if not enabled or not isinstance(frame, pd.DataFrame):
+        return None
+    if os.path.exists(path):
+        saved = pd.read_pickle(path)
+        if saved.get('version') == version:
+            record(name, saved['profile'], parent)
+            return saved['profile']
+    profile = observe(name, frame, parent, labels)
+    pd.to_pickle({'version': version, 'profile': profile}, path)
+    return profile
+
+
+def reset():
+    profiles.clear()
+    parents.clear()
+
+
+def snapshot():
+    return {name: (parents[name], profile) for name, profile in profiles.items()}
+
+
+# Fold the profiles recorded in another process (e.g. a pool worker) into this one
+def merge(records):
+    for name, (parent, profile) in records.items():
+        record(name, profile, parent)
+
+
+# Share of rows that moved between the bins of two histograms, at the coarser of their widths
+def histogram_shift(before, after):
+    exponent = max(before['exponent'], after['exponent'])
+    first = coarsen(np.array(before['bins'], dtype='int64'), np.array(before['counts']), before['exponent'], exponent)
+    second = coarsen(np.array(after['bins'], dtype='int64'), np.array(after['counts']), after['exponent'], exponent)
+    bins = np.union1d(first[0], second[0])
+    shares = [
+        pd.Series(counts, index=labels).reindex(bins, fill_value=0).to_numpy() / max(counts.sum(), 1)
+        for labels, counts in [first, second]
+    ]
+    return float(np.abs(shares[0] - shares[1]).sum() / 2)
+
+
+def changed(before, after, estimate):
+    if before is None or after is None or isinstance(before, str):
+        return before != after
+    return not np.isclose(before, after, rtol=tolerance if estimate else 1e-9, atol=0)
+
+
+# Metrics that differ between two profile summaries, one row per (column, metric), with the
+# row count listed once for the frame. Counts, bounds and means are compared exactly, distinct
+# counts within `tolerance`. Sampled quantiles are listed when the exact histogram moved.
+def diff(before, after):
+    rows = []
+    count = [next(iter(summary.values()))['rows'] if summary else 0 for summary in [before, after]]
+    if count[0] != count[1]:
+        rows.append(['', 'rows', *count])
+    for col in list(before) + [col for col in after if col not in before]:
+        if col not in before or col not in after:
+            rows.append([col, 'column', 'present' if col in before else None, 'present' if col in after else None])
+            continue
+        first, second = before[col], after[col]
+        if first['kind'] != second['kind']:
+            rows.append([col, 'kind', first['kind'], second['kind']])
+            continue
+        for metric in ['nulls', 'unknown', 'invalid', 'min', 'max', 'mean', 'distinct']:
+            if (metric in first or metric in second) and changed(first.get(metric), second.get(metric), metric == 'distinct'):
+                rows.append([col, metric, first.get(metric), second.get(metric)])
+        if 'histogram' in first and 'histogram' in second:
+            shift = histogram_shift(first['histogram'], second['histogram'])
+            if shift > tolerance:
+                rows.append([col, 'histogram shift', 0.0, round(shift, 4)])
+                rows += [
+                    [col, f'q{level}', first['quantiles'][level], value]
+                    for level, value in second['quantiles'].items() if first['quantiles'][level] != value
+                ]
+    return pd.DataFrame(rows, columns=['column', 'metric', 'before', 'after'], dtype=object)
+
+
+def report_files(run, path=profiles_path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, file) for file in os.listdir(path)
+        if file.startswith(f'{run}-') and file.endswith('.json')
+    )
+
+
+def records(table):
+    return json.loads(table.to_json(orient='records'))
+
+
+# Write the stage profiles of this run to data/profiles/<run>-<timestamp>.json, each with its
+# changes since the stage it was diffed against and since the same stage in the previous
+# report of `run`. Returns the report path, or None when profiling is off.
+def write_report(run, path=profiles_path):
+    if not enabled or not profiles:
+        return None
+    previous = report_files(run, path)
+    last = {}
+    if previous:
+        with open(previous[-1]) as f:
+            last = {stage['stage']: stage['columns'] for stage in json.load(f)['stages']}
+    summaries = {name: profile.summary() for name, profile in profiles.items()}
+    stages = []
+    for name, columns in summaries.items():
+        parent = parents[name]
+        stages.append({
+            'stage': name,
+            'parent': parent,
+            'columns': columns,
+            'since_parent': records(diff(summaries[parent], columns)) if parent in summaries else None,
+            'since_last_run': records(diff(last[name], columns)) if name in last else None
+        })
+    os.makedirs(path, exist_ok=True)
+    stamp = pd.Timestamp.now().strftime('%Y%m%d-%H%M%S')
+    report_path = os.path.join(path, f'{run}-{stamp}.json')
+    report = {
+        'run': run,
+        'finished': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'argv': sys.argv,
+        'previous': previous[-1] if previous else None,
+        'stages': stages
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    return report_path
+
+
+# Changes listed in a report, stage by stage
+def report_summary(report_path):
+    with open(report_path) as f:
+        report = json.load(f)
+    lines = []
+    for stage in report['stages']:
+        for key, label in [('since_parent', f"since {stage['parent']}"), ('since_last_run', 'since the last run')]:
+            changes = stage[key]
+            if changes is None:
+                continue
+            lines.append(f"{stage['stage']} {label}: {len(changes)} changes")
+            lines += [
+                f"  {change['column']:<28}{change['metric']:<18}{change['before']!s:>22} -> {change['after']!s}"
+                for change in changes
+            ]
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile a stored table in one streaming pass and diff it against its last profile.')
+    parser.add_argument('--table', default='orders')
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--column', default=None, help='print the summary and histogram of one column')
+    args = parser.parse_args()
+
+    if args.chunksize:
+        start = 0
+        for chunk in read_batches(args.table, batch_size=args.chunksize):
+            # Row positions in the table, so the sample does not depend on the chunk size
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            observe(args.table, chunk)
+    else:
+        observe(args.table, load_table(args.table))
+    if args.column:
+        print(json.dumps(profiles[args.table].summary()[args.column], indent=1))
+    report_path = write_report(f'table-{args.table}')
+    changes = report_summary(report_path)
+    if changes:
+        print(changes)
+    print(f'profile report: {report_path}')
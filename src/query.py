@@ -0,0 +1,247 @@
+# Import dependencies
+import argparse
+import json
+import shlex
+import sys
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+import numpy as np
+import pandas as pd
+from store import store_path, load_table
+from cube import load_cube, rates, cancel_rate
+from rollups import rollup_path, series
+
+
+# Local query service over the derived tables in data/processed. Tables are loaded once and
+# sorted by the keys questions are asked by, with a dict from every key value to its slice of
+# rows, so "top 20 asins in set" is one dict lookup and a slice. Cancellation rates are cube
+# lookups. Answers go through an LRU cache and every query's latency is kept for p50/p99
+# reporting. Nothing leaves the machine: the HTTP server only listens on localhost.
+cache_size = 1024
+latency_window = 10_000
+state_column = 'ship_state_or_territory'
+sales_orderings = ['total_orders', 'revenue', 'units_sold']
+
+
+# JSON-ready rows, with dates as YYYY-MM-DD and missing values as null
+def records(table):
+    table = table.copy()
+    for col in table.select_dtypes('datetime'):
+        table[col] = table[col].dt.strftime('%Y-%m-%d')
+    return json.loads(table.to_json(orient='records', double_precision=15))
+
+
+# Rows sorted by `key` and then `order`, with the slice of rows of every key value
+class SortedIndex:
+    def __init__(self, table, key, order=(), ascending=()):
+        table = table.sort_values([key, *order], ascending=[True, *ascending], kind='stable')
+        self.table = table.reset_index(drop=True)
+        keys = self.table[key].to_numpy(dtype=object)
+        starts = np.flatnonzero(np.r_[len(keys) > 0, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        self.slices = {keys[start]: slice(start, end) for start, end in zip(starts, ends)}
+
+    def get(self, value, n=None):
+        rows = self.table.iloc[self.slices.get(value, slice(0, 0))]
+        return rows if n is None else rows.iloc[:n]
+
+
+class SalesIndex:
+    def __init__(self, path=store_path, rollups=rollup_path):
+        self.rollups = rollups
+        sales = load_table('sales', path=path)
+        self.sales = sales.sort_values(
+            ['total_orders', 'asin'], ascending=[False, True], kind='stable'
+        ).reset_index(drop=True)
+        self.categories = SortedIndex(sales, 'category', ['total_orders', 'asin'], [False, True])
+        self.items = SortedIndex(sales, 'asin')
+        self.cancelled_items = SortedIndex(load_table('sales_cancelled', path=path), 'asin')
+        demand = load_table('regional_demand', path=path)
+        self.states = SortedIndex(demand, state_column, ['regional_orders', 'asin'], [False, True])
+        self.item_regions = SortedIndex(demand, 'asin', ['rank', state_column], [True, True])
+        regional = load_table('regional_sales', path=path).sort_values(
+            'total_orders', ascending=False, kind='stable'
+        ).reset_index(drop=True)
+        regional.insert(1, 'rank', np.arange(1, len(regional) + 1))
+        self.regional = regional
+        self.state_totals = SortedIndex(regional, state_column)
+        self.weeks = load_table('weekly_revenue', path=path).sort_values('week_start').reset_index(drop=True)
+        self.cube = load_cube(path=path)
+
+    # Top asins overall, in a category, or in a state (by regional orders)
+    def top(self, category=None, state=None, n=20, by='total_orders'):
+        n = int(n)
+        if state is not None:
+            rows = self.states.get(state)
+            if category is not None:
+                rows = rows[rows['category'] == category]
+            return records(rows.iloc[:n])
+        if by not in sales_orderings:
+            raise ValueError(f'by must be one of {", ".join(sales_orderings)}')
+        rows = self.sales if category is None else self.categories.get(category)
+        if by != 'total_orders':
+            rows = rows.sort_values([by, 'asin'], ascending=[False, True], kind='stable')
+        return records(rows.iloc[:n])
+
+    # Completed and cancelled totals of one asin and the states it sells best in
+    def asin(self, asin, n=10):
+        sales, cancelled = self.items.get(asin), self.cancelled_items.get(asin)
+        if sales.empty and cancelled.empty:
+            raise KeyError(f'unknown asin {asin}')
+        return {
+            'sales': records(sales)[0] if len(sales) else None,
+            'cancelled': records(cancelled)[0] if len(cancelled) else None,
+            'regions': records(self.item_regions.get(asin, int(n)))
+        }
+
+    # States ranked by total orders, or the rank and totals of one state
+    def regions(self, state=None, n=None):
+        if state is not None:
+            return records(self.state_totals.get(state))
+        return records(self.regional if n is None else self.regional.iloc[:int(n)])
+
+    # Rate of one cell (category=kurta state=kerala), or every rate of a grouping (by=size)
+    def cancellation(self, by=None, state=None, **labels):
+        if state is not None:
+            labels[state_column] = state
+        if by is not None:
+            dims = [state_column if dim == 'state' else dim for dim in by.split(',')]
+            return records(rates(self.cube, *dims).reset_index())
+        try:
+            rate = cancel_rate(self.cube, **labels)
+        except KeyError:
+            raise KeyError(f'no orders for {labels}')
+        return {**labels, 'cancel_rate': float(rate)}
+
+    # Weeks starting between `start` and `end`, inclusive
+    def weekly(self, start=None, end=None):
+        week_start = self.weeks['week_start']
+        lo = 0 if start is None else week_start.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(week_start) if end is None else week_start.searchsorted(pd.Timestamp(end), side='right')
+        return records(self.weeks.iloc[lo:hi])
+
+    # Daily, weekly, monthly or whole-range metrics from the daily rollups, e.g.
+    # freq=M by=category start=2022-04-01 end=2022-06-30
+    def series(self, freq='W', start=None, end=None, by=None):
+        dims = [] if by is None else [state_column if dim == 'state' else dim for dim in by.split(',')]
+        return records(series(freq, start, end, dims, self.rollups))
+
+
+class QueryService:
+    def __init__(self, index, size=cache_size):
+        self.queries = {
+            'top': index.top, 'asin': index.asin, 'regions': index.regions,
+            'cancellation': index.cancellation, 'weekly': index.weekly, 'series': index.series
+        }
+        self.latencies = defaultdict(lambda: deque(maxlen=latency_window))
+        self.answer = lru_cache(maxsize=size)(self.evaluate)
+
+    def evaluate(self, name, params):
+        return self.queries[name](**dict(params))
+
+    # Answer a query; failed queries are timed but not cached
+    def query(self, name, **params):
+        if name not in self.queries:
+            raise ValueError(f'unknown query {name}; one of {", ".join(self.queries)}')
+        start = time.perf_counter()
+        try:
+            return self.answer(name, tuple(sorted(params.items())))
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    def stats(self):
+        info = self.answer.cache_info()
+        latency = {
+            name: {
+                'count': len(times),
+                'p50_ms': round(float(np.percentile(times, 50)) * 1000, 3),
+                'p99_ms': round(float(np.percentile(times, 99)) * 1000, 3)
+            }
+            for name, times in self.latencies.items()
+        }
+        return {
+            'cache': {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize},
+            'latency': latency
+        }
+
+
+# key=value words of a command line query
+def parse_params(words):
+    params = {}
+    for word in words:
+        key, sep, value = word.partition('=')
+        if not sep:
+            raise ValueError(f'expected key=value, got {word!r}')
+        params[key] = value
+    return params
+
+
+# Answer `name key=value ...`, reporting bad queries instead of raising
+def answer(service, name, words):
+    if name == 'stats':
+        return service.stats()
+    try:
+        return service.query(name, **parse_params(words))
+    except (KeyError, ValueError, TypeError) as error:
+        return {'error': str(error).strip('"\'')}
+
+
+# GET /<query>?key=value&...  and  GET /stats
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            name = url.path.strip('/')
+            if name == 'stats':
+                status, body = 200, service.stats()
+            else:
+                try:
+                    status, body = 200, service.query(name, **dict(parse_qsl(url.query)))
+                except (KeyError, ValueError, TypeError) as error:
+                    status, body = 400, {'error': str(error).strip('"\'')}
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Answer queries over the derived sales tables.',
+        epilog='queries: top [category= state= n= by=], asin asin= [n=], regions [state= n=], '
+               'cancellation [by=dim,dim | category= size= state= ...], weekly [start= end=], '
+               'series [freq=D|W|M|range start= end= by=category,state]'
+    )
+    parser.add_argument('command', help="'serve', 'shell', or a query name")
+    parser.add_argument('params', nargs='*', help='query parameters as key=value')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-size', type=int, default=cache_size)
+    args = parser.parse_args()
+
+    service = QueryService(SalesIndex(), args.cache_size)
+    if args.command == 'serve':
+        server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(service))
+        print(f'listening on http://127.0.0.1:{args.port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(json.dumps(service.stats(), indent=1))
+    elif args.command == 'shell':
+        # One query per line, e.g. "top category=set n=20"; latency stats at the end
+        for line in sys.stdin:
+            if line.strip():
+                name, *words = shlex.split(line)
+                print(json.dumps(answer(service, name, words)))
+        print(json.dumps(service.stats(), indent=1), file=sys.stderr)
+    else:
+        print(json.dumps(answer(service, args.command, args.params), indent=1))
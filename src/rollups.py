@@ -0,0 +1,175 @@
+# Import dependencies
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from store import apply_schema, load_table
+from aggregates import cancelled_status, round_numeric
+
+
+# Daily rollups of the orders, partitioned by month. Each day keeps additive metrics for every
+# grouping of category and state, like the cancellation cube. Distinct orders do not add up
+# across categories or states (an order can span several), but they do across days, since an
+# order belongs to a single date. So weekly, monthly or any-range series are sums of daily
+# rows, with growth taken between consecutive periods, and no order rows are read. A range
+# query opens only the month files it overlaps and reads only the days it asks for.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+rollup_path = os.path.join(project_root, 'data', 'rollups')
+rollup_dimensions = ['category', 'ship_state_or_territory']
+rollup_groupings = [(), ('category',), ('ship_state_or_territory',), ('category', 'ship_state_or_territory')]
+# Completed orders, as weekly_revenue counts them, plus all and cancelled order lines
+rollup_metrics = ['total_orders', 'units_sold', 'orders_at_discount', 'revenue', 'order_lines', 'cancelled_lines']
+frequencies = ['D', 'W', 'M', 'range']
+
+
+def grouping_name(dims):
+    return ','.join(dims)
+
+
+def daily_rollups(orders):
+    cancelled = (orders['status'] == cancelled_status).to_numpy()
+    completed = ~cancelled
+    orders = pd.DataFrame({
+        'date': pd.to_datetime(orders['date']).dt.normalize().to_numpy(),
+        'category': orders['category'].astype(str).to_numpy(),
+        'ship_state_or_territory': orders['ship_state_or_territory'].astype(str).to_numpy(),
+        'order_id': orders['order_id'].astype(str).to_numpy(),
+        'completed': completed,
+        'units_sold': orders['quantity'].to_numpy(dtype='int64') * completed,
+        'orders_at_discount': orders['promotion_ids'].to_numpy(dtype=bool) & completed,
+        'revenue': orders['amount'].to_numpy(dtype='float64') * completed,
+        'cancelled_lines': cancelled
+    })
+    parts = []
+    for dims in rollup_groupings:
+        keys = ['date', *dims]
+        totals = orders.groupby(keys).agg(
+            units_sold=('units_sold', 'sum'),
+            orders_at_discount=('orders_at_discount', 'sum'),
+            revenue=('revenue', 'sum'),
+            order_lines=('completed', 'size'),
+            cancelled_lines=('cancelled_lines', 'sum')
+        )
+        distinct = orders[orders['completed']].drop_duplicates(keys + ['order_id']).groupby(keys).size()
+        totals['total_orders'] = distinct.reindex(totals.index, fill_value=0)
+        part = totals.reset_index()
+        part['grouping'] = grouping_name(dims)
+        for dim in rollup_dimensions:
+            if dim not in dims:
+                part[dim] = None
+        parts.append(part)
+    rollups = pd.concat(parts, ignore_index=True)
+    return apply_schema(rollups[['date', 'grouping', *rollup_dimensions, *rollup_metrics]], 'daily_rollups')
+
+
+def partition_file(month, path=rollup_path):
+    return os.path.join(path, f'month={month:%Y-%m}.parquet')
+
+
+def partition_months(path=rollup_path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        pd.Timestamp(file[len('month='):-len('.parquet')])
+        for file in os.listdir(path) if file.startswith('month=') and file.endswith('.parquet')
+    )
+
+
+# Write rollups into their month partitions. Days already stored are added to, so a batch
+# of new orders can be merged in; an order's lines are assumed to arrive in one batch.
+def merge_rollups(rollups, path=rollup_path):
+    os.makedirs(path, exist_ok=True)
+    keys = ['date', 'grouping', *rollup_dimensions]
+    for month, part in rollups.groupby(rollups['date'].dt.to_period('M').dt.to_timestamp()):
+        file = partition_file(month, path)
+        if os.path.exists(file):
+            part = pd.concat([apply_schema(pd.read_parquet(file), 'daily_rollups'), part], ignore_index=True)
+            part = part.groupby(keys, dropna=False, sort=False)[rollup_metrics].sum().reset_index()
+        part = apply_schema(part.sort_values(keys, kind='stable'), 'daily_rollups')
+        part.to_parquet(file, index=False)
+
+
+def clear_rollups(path=rollup_path):
+    for month in partition_months(path):
+        os.remove(partition_file(month, path))
+
+
+# Rebuild every partition from the orders table
+def build_rollups(orders, path=rollup_path):
+    clear_rollups(path)
+    merge_rollups(daily_rollups(orders), path)
+
+
+# Daily rows of one grouping between `start` and `end` (inclusive), read from the month
+# partitions that overlap the range only
+def read_rollups(start=None, end=None, dims=(), path=rollup_path):
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    filters = [('grouping', '=', grouping_name(dims))]
+    if start is not None:
+        filters.append(('date', '>=', start))
+    if end is not None:
+        filters.append(('date', '<=', end))
+    parts = [
+        pq.read_table(partition_file(month, path), filters=filters).to_pandas()
+        for month in partition_months(path)
+        if (start is None or month + pd.offsets.MonthEnd(0) >= start.normalize()) and (end is None or month <= end)
+    ]
+    if not parts:
+        raise ValueError(f'no rollups in {path} for that range; build them with python src/rollups.py build')
+    return apply_schema(pd.concat(parts, ignore_index=True), 'daily_rollups')
+
+
+# Start of the period each day falls in. Weeks start on Monday like date_trunc('week'); a
+# 'range' is a single period from the first day read.
+def period_start(dates, freq):
+    if freq == 'D':
+        return dates
+    if freq == 'W':
+        return dates - pd.to_timedelta(dates.dt.weekday, unit='D')
+    if freq == 'M':
+        return dates.dt.to_period('M').dt.to_timestamp()
+    if freq == 'range':
+        return pd.Series(dates.min(), index=dates.index)
+    raise ValueError(f'freq must be one of {", ".join(frequencies)}')
+
+
+# Metrics per period (and per `by` dimension) with average order value and revenue growth
+# over the previous period, as weekly_revenue computes them. Periods at the ends of the
+# range only cover the days inside it.
+def series(freq='W', start=None, end=None, by=(), path=rollup_path):
+    dims = [dim for dim in rollup_dimensions if dim in by]
+    if len(dims) != len(by):
+        raise ValueError(f'by must be among {", ".join(rollup_dimensions)}')
+    daily = read_rollups(start, end, dims, path)
+    daily['period_start'] = period_start(daily['date'], freq)
+    table = daily.groupby(['period_start', *dims], observed=True)[rollup_metrics].sum().reset_index()
+    # Periods without completed orders have no revenue to average or grow from
+    table = table[table['order_lines'] > table['cancelled_lines']].sort_values(dims + ['period_start'], kind='stable')
+    table['revenue'] = np.rint(table['revenue']).astype('int64')
+    table['avg_order_value'] = round_numeric(table['revenue'] / table['total_orders']).astype('int64')
+    previous = table.groupby(dims, observed=True)['revenue'].shift() if dims else table['revenue'].shift()
+    table['revenue_growth_pct'] = round_numeric((table['revenue'] - previous) / previous * 100).astype('Int64')
+    return table[[
+        'period_start', *dims, 'total_orders', 'units_sold', 'orders_at_discount', 'avg_order_value',
+        'revenue', 'revenue_growth_pct', 'order_lines', 'cancelled_lines'
+    ]].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and query the daily rollups of the orders.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help='rebuild the rollups from the cleaned orders table')
+    query = subparsers.add_parser('series', help='print a time series derived from the rollups')
+    query.add_argument('--freq', choices=frequencies, default='W')
+    query.add_argument('--start', default=None, help='first day, e.g. 2022-04-01')
+    query.add_argument('--end', default=None, help='last day, inclusive')
+    query.add_argument('--by', nargs='*', choices=rollup_dimensions, default=[])
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_rollups(load_table('orders'))
+        print(f'{len(partition_months())} month partitions in {rollup_path}')
+    else:
+        print(series(args.freq, args.start, args.end, args.by).to_string(index=False))
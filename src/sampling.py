@@ -0,0 +1,216 @@
+# Import dependencies
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from store import store_path, table_path, csv_path, load_table
+from categoricals import relabel_categories
+from aggregates import cancelled_status
+
+
+# Approximate mode: a stratified sample of the orders, built once and kept next to the store,
+# from which the exploratory percentages are estimated with 95% confidence intervals. Strata
+# are the (category, state, status) combinations. Each stratum keeps a share of its rows in
+# proportion to its size, at least `min_per_stratum`, chosen at random with a fixed seed, and
+# every sampled row carries its stratum's size over its sample count as a weight. Estimates
+# are weighted ratios; their variance is the usual stratified one, taken on the linearized
+# ratio and corrected for sampling without replacement. Rates and shares that only split
+# whole strata (cancellations by category or state, the category mix of a state) are exact
+# and get a zero-width interval. Cost depends on the sample size only, not on the orders.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sample_path = os.path.join(project_root, 'data', 'samples')
+strata = ['category', 'ship_state_or_territory', 'status']
+sample_columns = [
+    'category', 'ship_state_or_territory', 'status', 'size', 'sales_channel',
+    'ship_service_level', 'fulfillment', 'b2b', 'promotion_ids', 'quantity', 'amount'
+]
+# Columns the cancellation percentages can be broken down by
+estimate_columns = [
+    'category', 'ship_state_or_territory', 'size', 'sales_channel', 'ship_service_level',
+    'fulfillment', 'b2b'
+]
+sample_size = 20_000
+min_per_stratum = 2
+z = 1.96
+
+
+def sample_file(size, seed, path=sample_path):
+    return os.path.join(path, f'orders-{size}-{seed}.parquet')
+
+
+# Rows to keep per stratum: proportional to its size, at least `minimum`, at most all of it
+def allocate(stratum_rows, size, minimum=min_per_stratum):
+    share = np.rint(stratum_rows * size / max(stratum_rows.sum(), 1)).astype('int64')
+    return np.clip(share, np.minimum(minimum, stratum_rows), stratum_rows)
+
+
+def stratified_sample(orders, size=sample_size, seed=0):
+    orders = orders[sample_columns].copy()
+    # Dupatta is counted with ethnic dress, as in the figures
+    if isinstance(orders['category'].dtype, pd.CategoricalDtype):
+        orders['category'] = relabel_categories(orders['category'], {'dupatta': 'ethnic dress'})
+    # Missing labels form strata of their own
+    stratum = np.zeros(len(orders), dtype='int64')
+    for col in strata:
+        codes, labels = pd.factorize(orders[col], use_na_sentinel=False)
+        stratum = stratum * len(labels) + codes
+    stratum, _ = pd.factorize(stratum)
+    stratum_rows = np.bincount(stratum)
+    taken = allocate(stratum_rows, size)
+    # Random order within each stratum; the first `taken` rows of a stratum are kept
+    order = np.lexsort((np.random.default_rng(seed).random(len(orders)), stratum))
+    starts = np.r_[0, np.cumsum(stratum_rows)[:-1]]
+    position = np.arange(len(order)) - starts[stratum[order]]
+    rows = np.sort(order[position < taken[stratum[order]]])
+    sample = orders.iloc[rows].reset_index(drop=True)
+    sample['stratum'] = stratum[rows]
+    sample['stratum_rows'] = stratum_rows[stratum[rows]]
+    sample['stratum_sample'] = taken[stratum[rows]]
+    sample['weight'] = sample['stratum_rows'] / sample['stratum_sample']
+    return sample
+
+
+# Stored sample when it is at least as new as the orders it was drawn from, else a fresh one
+def load_sample(size=sample_size, seed=0, path=store_path, samples=sample_path):
+    file = sample_file(size, seed, samples)
+    sources = [file for file in [table_path('orders', path), csv_path('orders', path)] if os.path.exists(file)]
+    if os.path.exists(file) and all(os.path.getmtime(file) >= os.path.getmtime(source) for source in sources):
+        return pd.read_parquet(file)
+    sample = stratified_sample(load_table('orders', sample_columns, path), size, seed)
+    os.makedirs(samples, exist_ok=True)
+    sample.to_parquet(file, index=False)
+    return sample
+
+
+# Weighted ratio sum(numerator) / sum(denominator) per group of `by`, with its standard error
+# and 95% interval. Groups follow the labels' sorted order.
+def ratio_estimates(sample, numerator, denominator, by):
+    weight = sample['weight'].to_numpy()
+    frame = pd.DataFrame({col: sample[col].to_numpy() for col in by})
+    frame['y'] = np.asarray(numerator, dtype='float64')
+    frame['x'] = np.asarray(denominator, dtype='float64')
+    frame['wy'], frame['wx'] = weight * frame['y'], weight * frame['x']
+    totals = frame.groupby(by, observed=True).agg(
+        numerator=('wy', 'sum'), denominator=('wx', 'sum'), sample_rows=('x', 'size')
+    )
+    totals = totals[totals['denominator'] > 0]
+    totals['estimate'] = totals['numerator'] / totals['denominator']
+    # Linearized ratio per row, then its variance within every stratum of every group
+    group = pd.MultiIndex.from_frame(frame[by]) if len(by) > 1 else pd.Index(frame[by[0]])
+    estimate = totals['estimate'].reindex(group).to_numpy()
+    denominator = totals['denominator'].reindex(group).to_numpy()
+    frame['u'] = (frame['y'] - estimate * frame['x']) / denominator
+    frame['uu'] = frame['u'] ** 2
+    frame['stratum'] = sample['stratum'].to_numpy()
+    cells = frame.groupby(by + ['stratum'], observed=True).agg(u=('u', 'sum'), uu=('uu', 'sum')).reset_index()
+    stratum_sizes = sample.groupby('stratum')[['stratum_rows', 'stratum_sample']].first()
+    big_n = stratum_sizes['stratum_rows'].reindex(cells['stratum']).to_numpy().astype('float64')
+    n = stratum_sizes['stratum_sample'].reindex(cells['stratum']).to_numpy().astype('float64')
+    # Rows of a stratum outside the group count as zeros; a single sampled row has no spread
+    spread = np.where(n > 1, (cells['uu'] - cells['u'] ** 2 / n) / np.maximum(n - 1, 1), 0.0)
+    cells['variance'] = big_n ** 2 * (1 - n / big_n) * np.maximum(spread, 0) / n
+    variance = cells.groupby(by, observed=True)['variance'].sum().reindex(totals.index).fillna(0)
+    totals['std_error'] = np.sqrt(variance.to_numpy())
+    totals['low'] = (totals['estimate'] - z * totals['std_error']).clip(lower=0)
+    totals['high'] = totals['estimate'] + z * totals['std_error']
+    return totals[['estimate', 'std_error', 'low', 'high', 'sample_rows']]
+
+
+# Share of cancelled order lines per label of `col`
+def cancellation_rates(sample, col):
+    cancelled = (sample['status'] == cancelled_status).to_numpy()
+    return ratio_estimates(sample, cancelled, np.ones(len(sample)), [col])
+
+
+# Units sold at a discount per completed order line, by category, as orders_at_discount over
+# total_orders in the sales table
+def discount_rates(sample):
+    completed = (sample['status'] != cancelled_status).to_numpy()
+    discounted = sample['quantity'].to_numpy() * sample['promotion_ids'].to_numpy(dtype=bool) * completed
+    return ratio_estimates(sample, discounted, completed, ['category'])
+
+
+# Share of each state's orders per category
+def regional_shares(sample, states=None):
+    if states is not None:
+        sample = sample[sample['ship_state_or_territory'].isin(states)]
+    parts = []
+    for category in sorted(sample['category'].dropna().unique()):
+        part = ratio_estimates(sample, (sample['category'] == category).to_numpy(), np.ones(len(sample)), ['ship_state_or_territory'])
+        parts.append(part.assign(category=category).set_index('category', append=True))
+    return pd.concat(parts).sort_index()
+
+
+# States by estimated order count, largest first
+def top_states(sample, n=10):
+    orders = sample.groupby('ship_state_or_territory', observed=True)['weight'].sum()
+    return orders.sort_values(ascending=False, kind='stable').index[:n].tolist()
+
+
+# First value whose cumulative weight share reaches `level`
+def weighted_quantile(values, cumulative, level):
+    return values[min(np.searchsorted(cumulative, level), len(values) - 1)]
+
+
+# Weighted quantile per group, with a Woodruff interval: the quantiles at q -/+ z times the
+# standard error of the estimated share of rows at or below the estimate
+def quantile_estimates(sample, values, by, q=0.5):
+    rows = []
+    for label, part in sample.assign(value=np.asarray(values, dtype='float64')).groupby(by, observed=True):
+        part = part.sort_values('value', kind='stable')
+        values = part['value'].to_numpy()
+        cumulative = part['weight'].cumsum().to_numpy() / part['weight'].sum()
+        estimate = weighted_quantile(values, cumulative, q)
+        below = ratio_estimates(part.assign(group=0), values <= estimate, np.ones(len(part)), ['group'])
+        std_error = below['std_error'].iloc[0]
+        rows.append({
+            **dict(zip(by, label if isinstance(label, tuple) else (label,))),
+            'estimate': estimate,
+            'low': weighted_quantile(values, cumulative, max(q - z * std_error, 0)),
+            'high': weighted_quantile(values, cumulative, min(q + z * std_error, 1)),
+            'sample_rows': len(part)
+        })
+    return pd.DataFrame(rows).set_index(by)
+
+
+# Unit price of completed order lines
+def unit_prices(sample):
+    completed = sample[sample['status'] != cancelled_status]
+    return completed, completed['amount'].to_numpy() / completed['quantity'].to_numpy()
+
+
+def price_medians(sample):
+    completed, prices = unit_prices(sample)
+    return quantile_estimates(completed, prices, ['category'])
+
+
+# Estimates and intervals in percent
+def format_percentages(table):
+    return table.assign(**{
+        col: (table[col] * 100).round(1) for col in ['estimate', 'std_error', 'low', 'high']
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Approximate exploration from a stratified sample of the orders.')
+    parser.add_argument('--size', type=int, default=sample_size, help='rows in the sample')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--by', nargs='+', choices=estimate_columns, default=['size', 'fulfillment'],
+                        help='columns to print cancellation percentages for')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sample = load_sample(args.size, args.seed)
+    print(f'{len(sample):,} sampled order lines in {sample["stratum"].nunique():,} strata, '
+          f'standing for {sample["weight"].sum():,.0f}\n')
+    for col in args.by:
+        print(f'Cancellation % by {col}')
+        print(format_percentages(cancellation_rates(sample, col)).to_string(), '\n')
+    print('Discounted units per completed order line, % by category')
+    print(format_percentages(discount_rates(sample)).to_string(), '\n')
+    print('Category % of orders in the top 10 states')
+    print(format_percentages(regional_shares(sample, top_states(sample))).to_string(), '\n')
+    print('Median unit price by category')
+    print(price_medians(sample).round(2).to_string(), '\n')
+    print(f'{time.perf_counter() - start:.2f}s')
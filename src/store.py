@@ -0,0 +1,245 @@
+# Import dependencies
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Typed columnar store for the tables handed between cleaning, SQL feature engineering and
+# visualization. Each table is a parquet file next to its CSV in data/processed. Categoricals
+# are dictionary encoded and strings, dates and booleans keep their dtypes on the way back in.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+store_path = os.path.join(project_root, 'data', 'processed')
+
+
+# Declared schemas: table name -> {column: pandas dtype}
+order_columns = {
+    'order_id': 'string',
+    'date': 'datetime64[ns]',
+    'status': 'category',
+    'fulfillment': 'category',
+    'sales_channel': 'category',
+    'ship_service_level': 'category',
+    'style': 'string',
+    'sku': 'string',
+    'category': 'category',
+    'size': 'category',
+    'asin': 'string',
+    'quantity': 'int64',
+    'currency': 'category',
+    'amount': 'float64',
+    'ship_city': 'string',
+    'ship_state_or_territory': 'category',
+    'ship_postal_code': 'string',
+    'ship_country': 'category',
+    'promotion_ids': 'bool',
+    'b2b': 'bool'
+}
+item_sales_columns = {
+    'asin': 'string',
+    'category': 'category',
+    'total_orders': 'int64',
+    'orders_at_discount': 'int64',
+    'units_sold': 'int64',
+    'median_unit_price': 'float64'
+}
+regional_item_columns = {
+    'asin': 'string',
+    'ship_state_or_territory': 'category',
+    'category': 'category',
+    'regional_orders': 'int64',
+    'rank': 'int64'
+}
+schemas = {
+    # pandas_cleaning.py export and the SQL cleaned orders it turns into
+    'amazon_sales_pdcleaned': {'index': 'int64', **order_columns},
+    'orders': {'index_id': 'int64', **order_columns},
+    # SQL feature views
+    'sales': {**item_sales_columns, 'revenue': 'int64'},
+    'sales_cancelled': {**item_sales_columns, 'missed_revenue': 'int64'},
+    'regional_demand': regional_item_columns,
+    'regional_cancelled': {
+        col: dtype for col, dtype in regional_item_columns.items() if col != 'category'
+    },
+    'regional_sales': {
+        'ship_state_or_territory': 'category',
+        'total_orders': 'int64',
+        'cancelled_orders': 'int64',
+        'completed_orders': 'int64',
+        'unique_orders': 'int64',
+        'units_sold': 'int64'
+    },
+    # cube.py: labels are strings, empty where a dimension is rolled up
+    'cancellation_cube': {
+        'grouping': 'string',
+        **{col: 'string' for col in [
+            'category', 'size', 'sales_channel', 'ship_service_level',
+            'fulfillment', 'style', 'b2b', 'ship_state_or_territory'
+        ]},
+        'total_orders': 'int64',
+        'cancelled_orders': 'int64'
+    },
+    'weekly_revenue': {
+        'week_start': 'datetime64[ns]',
+        'total_orders': 'int64',
+        'units_sold': 'int64',
+        'orders_at_discount': 'int64',
+        'avg_order_value': 'int64',
+        'revenue': 'int64',
+        'revenue_growth_pct': 'Int64'
+    },
+    # rollups.py: daily metrics per grouping of category and state, empty where rolled up
+    'daily_rollups': {
+        'date': 'datetime64[ns]',
+        'grouping': 'string',
+        'category': 'string',
+        'ship_state_or_territory': 'string',
+        'total_orders': 'int64',
+        'units_sold': 'int64',
+        'orders_at_discount': 'int64',
+        'revenue': 'float64',
+        'order_lines': 'int64',
+        'cancelled_lines': 'int64'
+    },
+    # items.py: per-asin statistics, ranked within their category
+    'item_stats': {
+        'asin': 'string',
+        'category': 'category',
+        'total_orders': 'int64',
+        'units_sold': 'int64',
+        'orders_at_discount': 'int64',
+        'revenue': 'int64',
+        'cancelled_orders': 'int64',
+        'missed_revenue': 'int64',
+        'median_unit_price': 'float64',
+        'unit_price_mode': 'float64',
+        'unit_price_min': 'float64',
+        'unit_price_q1': 'float64',
+        'unit_price_median': 'float64',
+        'unit_price_q3': 'float64',
+        'unit_price_max': 'float64',
+        'unit_price_mean': 'float64',
+        'top_seller': 'bool',
+        'orders_rank': 'int64',
+        'revenue_rank': 'int64'
+    },
+    # pincodes.py: states repaired from, or contradicted by, the PIN code
+    'pin_state_report': {
+        'kind': 'category',
+        'ship_state_or_territory': 'category',
+        'pin_state_or_territory': 'category',
+        'orders': 'int64'
+    },
+    # visualization.py export
+    'top_regions_item_sales': regional_item_columns
+}
+
+
+def table_path(name, path=store_path):
+    return os.path.join(path, f'{name}.parquet')
+
+
+def csv_path(name, path=store_path):
+    return os.path.join(path, f'{name}.csv')
+
+
+# Cast a frame to its declared schema. Undeclared tables pass through unchanged.
+def apply_schema(df, name):
+    schema = schemas.get(name, {})
+    dtypes = {col: dtype for col, dtype in schema.items() if col in df.columns}
+    for col, dtype in dtypes.items():
+        if dtype.startswith('datetime'):
+            df[col] = pd.to_datetime(df[col])
+        elif df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def write_table(df, name, path=store_path):
+    df = apply_schema(df.copy(), name)
+    df.to_parquet(table_path(name, path), engine='pyarrow', index=False)
+
+
+def read_table(name, columns=None, path=store_path):
+    df = pd.read_parquet(table_path(name, path), engine='pyarrow', columns=columns)
+    return apply_schema(df, name)
+
+
+# Parse a CSV hand-off with its declared dtypes instead of letting pandas guess
+def read_csv_table(name, columns=None, path=store_path):
+    schema = schemas.get(name, {})
+    dates = [col for col, dtype in schema.items() if dtype.startswith('datetime')]
+    dtypes = {col: dtype for col, dtype in schema.items() if col not in dates}
+    if columns is not None:
+        dates = [col for col in dates if col in columns]
+    df = pd.read_csv(csv_path(name, path), dtype=dtypes, usecols=columns, parse_dates=dates)
+    return apply_schema(df, name)
+
+
+def is_current(name, path=store_path):
+    parquet, csv = table_path(name, path), csv_path(name, path)
+    return os.path.exists(parquet) and (
+        not os.path.exists(csv) or os.path.getmtime(parquet) >= os.path.getmtime(csv)
+    )
+
+
+# Load a table from the store. When the CSV is newer than the parquet copy (e.g. after a fresh
+# SQL \copy), the CSV is parsed once with its schema and the store is refreshed.
+def load_table(name, columns=None, path=store_path):
+    if is_current(name, path):
+        return read_table(name, columns, path)
+    df = read_csv_table(name, path=path)
+    write_table(df, name, path)
+    return df[columns] if columns is not None else df
+
+
+# Read a table in record batches, for consumers that only need one batch in memory at a time
+def read_batches(name, columns=None, batch_size=100_000, path=store_path):
+    if not is_current(name, path):
+        load_table(name, path=path)
+    for batch in pq.ParquetFile(table_path(name, path)).iter_batches(batch_size, columns=columns):
+        yield apply_schema(batch.to_pandas(), name)
+
+
+# Append-only writer for producers that emit a table in chunks
+class TableWriter:
+    def __init__(self, name, path=store_path):
+        self.name = name
+        self.path = table_path(name, path)
+        self.writer = None
+
+    def write(self, df):
+        df = apply_schema(df.copy(), self.name)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            # Widen dictionary indices so later chunks with more categories still fit
+            schema = pa.schema([
+                field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                if pa.types.is_dictionary(field.type) else field
+                for field in table.schema
+            ], metadata=table.schema.metadata)
+            self.writer = pq.ParquetWriter(self.path, schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Convert every CSV in data/processed with a declared schema into the store
+def convert_csvs(path=store_path):
+    for file in sorted(os.listdir(path)):
+        name = file.replace('.csv', '')
+        if file.endswith('.csv') and name in schemas:
+            write_table(read_csv_table(name, path=path), name, path)
+            print(f'{name}: {os.path.getsize(table_path(name, path)):,} bytes')
+
+
+if __name__ == '__main__':
+    convert_csvs()
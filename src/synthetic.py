@@ -0,0 +1,218 @@
+# Import dependencies
+import argparse
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from store import store_path, load_table
+from pandas_cleaning import raw_dtypes, update
+
+
+# Synthetic raw reports shaped like data/raw/amazon_sales_report.csv, for measuring how the
+# pipeline scales. Asin popularity, prices, discounts and categories are fitted from sales and
+# sales_cancelled, the state mix and cancellation rates from regional_sales and the daily
+# volume from weekly_revenue. The dirty values the cleaning handles are injected at fixed
+# rates. Rows are generated and written in chunks, each from its own seed, so any size fits
+# in memory and the same seed always writes the same file.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+start_date = pd.Timestamp('2022-03-31')
+end_date = pd.Timestamp('2022-06-29')
+duplicate_rate = 0.01
+multi_item_rate = 0.07
+dirty_rate = 0.02
+raw_columns = list(raw_dtypes)
+
+# Raw spellings of cleaned values
+state_aliases = {}
+for alias, state in update.items():
+    state_aliases.setdefault(state, []).append(alias)
+category_labels = {
+    'set': ['Set'], 'kurta': ['kurta'], 'western dress': ['Western Dress'], 'top': ['Top'],
+    'ethnic dress': ['Ethnic Dress'], 'blouse': ['Blouse'], 'bottom': ['Bottom'],
+    'saree': ['Saree'], 'dupatta': ['Dupatta']
+}
+completed_status = {
+    'Shipped': 0.6, 'Shipped - Delivered to Buyer': 0.36, 'Shipped - Picked Up': 0.02,
+    'Shipped - Out for Delivery': 0.02
+}
+cancelled_status = {
+    'Cancelled': 0.7, 'Shipped - Returned to Seller': 0.15, 'Shipped - Returning to Seller': 0.1,
+    'Shipped - Rejected by Buyer': 0.03, 'Shipped - Lost in Transit': 0.01, 'Shipped - Damaged': 0.01
+}
+dropped_status = {'Pending': 0.6, 'Pending - Waiting for Pick Up': 0.3, 'Shipping': 0.1}
+dropped_rate = 0.005
+sizes = {'M': 0.17, 'L': 0.17, 'XL': 0.16, 'XXL': 0.14, 'S': 0.13, '3XL': 0.11, 'XS': 0.08, 'Free': 0.04}
+cities = {
+    'maharashtra': ['mumbai', 'pune', 'thane', 'nagpur'], 'karnataka': ['bengaluru', 'mysuru'],
+    'tamil nadu': ['chennai', 'coimbatore'], 'telangana': ['hyderabad'],
+    'uttar pradesh': ['noida', 'lucknow', 'ghaziabad'], 'delhi': ['new delhi', 'delhi'],
+    'kerala': ['kochi', 'thiruvananthapuram'], 'west bengal': ['kolkata', 'howrah'],
+    'haryana': ['gurugram', 'faridabad'], 'gujarat': ['ahmedabad', 'surat'],
+    'rajasthan': ['jaipur', 'udaipur']
+}
+
+
+# Distributions fitted from the processed feature tables
+def fit_profile(path=store_path):
+    sales = pd.concat([
+        load_table('sales', path=path), load_table('sales_cancelled', path=path)
+    ]).groupby('asin', observed=True).agg(
+        category=('category', 'first'),
+        total_orders=('total_orders', 'sum'),
+        orders_at_discount=('orders_at_discount', 'sum'),
+        units_sold=('units_sold', 'sum'),
+        median_unit_price=('median_unit_price', 'median')
+    ).reset_index()
+    regional = load_table('regional_sales', path=path)
+    weekly = load_table('weekly_revenue', path=path)
+    days = pd.date_range(start_date, end_date)
+    week_start = days - pd.to_timedelta(days.weekday, unit='D')
+    week_orders = weekly.set_index('week_start')['total_orders']
+    day_weight = week_orders.reindex(week_start).fillna(0).to_numpy(dtype='float64')
+    # A partial first or last week spreads its orders over fewer days
+    day_weight /= pd.Series(week_start).map(pd.Series(week_start).value_counts()).to_numpy()
+    return {
+        'asins': sales['asin'].to_numpy(dtype=object),
+        'asin_p': (sales['total_orders'] / sales['total_orders'].sum()).to_numpy(),
+        'category': sales['category'].astype(object).to_numpy(),
+        'price': sales['median_unit_price'].to_numpy(dtype='float64'),
+        'discount': (sales['orders_at_discount'] / sales['total_orders']).clip(0, 1).to_numpy(),
+        'extra_units': (sales['units_sold'] / sales['total_orders'] - 1).clip(0, 1).to_numpy(),
+        'states': regional['ship_state_or_territory'].astype(object).to_numpy(),
+        'state_p': (regional['total_orders'] / regional['total_orders'].sum()).to_numpy(),
+        'cancel_rate': (regional['cancelled_orders'] / regional['total_orders']).to_numpy(),
+        'days': days,
+        'day_p': day_weight / day_weight.sum()
+    }
+
+
+def choice(rng, options, n):
+    labels = np.array(list(options), dtype=object)
+    p = np.array(list(options.values()), dtype='float64')
+    return labels[rng.choice(len(labels), n, p=p / p.sum())]
+
+
+def pick(rng, lists, keys):
+    out = np.empty(len(keys), dtype=object)
+    for key in pd.unique(keys):
+        rows = np.flatnonzero(keys == key)
+        out[rows] = np.array(lists[key], dtype=object)[rng.integers(0, len(lists[key]), len(rows))]
+    return out
+
+
+# Stable 2-digit PIN prefix per state so postal codes agree with their state
+def postal_prefix(state):
+    return 11 + zlib.crc32(state.encode()) % 75
+
+
+# Randomly change the case and surrounding whitespace of a share of values
+def scramble(rng, values, rate=dirty_rate):
+    values = values.copy()
+    rows = np.flatnonzero(rng.random(len(values)) < rate)
+    for row, style in zip(rows, rng.integers(0, 3, len(rows))):
+        value = values[row]
+        if isinstance(value, str):
+            values[row] = [value.upper(), value.lower() + ' ', ' ' + value.title()][style]
+    return values
+
+
+def generate_chunk(profile, n, seed, offset=0):
+    rng = np.random.default_rng(seed)
+    item = rng.choice(len(profile['asins']), n, p=profile['asin_p'])
+    state = rng.choice(len(profile['states']), n, p=profile['state_p'])
+    day = rng.choice(len(profile['days']), n, p=profile['day_p'])
+    order_ids = np.char.add(
+        np.char.add(np.char.zfill(rng.integers(100, 1000, n).astype(str), 3), '-'),
+        np.char.add(np.char.zfill(rng.integers(0, 10**7, n).astype(str), 7),
+                    np.char.add('-', np.char.zfill(rng.integers(0, 10**7, n).astype(str), 7)))
+    ).astype(object)
+
+    # Multi-item orders share an order id and date with the previous row
+    multi = np.flatnonzero(rng.random(n) < multi_item_rate)
+    multi = multi[multi > 0]
+    order_ids[multi] = order_ids[multi - 1]
+    day[multi], state[multi] = day[multi - 1], state[multi - 1]
+    # Duplicate rows repeat an earlier (order id, asin, date)
+    duplicate = np.flatnonzero(rng.random(n) < duplicate_rate)
+    duplicate = duplicate[duplicate > 0]
+    source = (rng.random(len(duplicate)) * duplicate).astype('int64')
+    order_ids[duplicate] = order_ids[source]
+    item[duplicate], day[duplicate], state[duplicate] = item[source], day[source], state[source]
+
+    states = profile['states'][state]
+    cancelled = rng.random(n) < profile['cancel_rate'][state]
+    status = np.where(cancelled, choice(rng, cancelled_status, n), choice(rng, completed_status, n))
+    dropped = rng.random(n) < dropped_rate
+    status[dropped] = choice(rng, dropped_status, int(dropped.sum()))
+    courier = np.where(cancelled, np.where(rng.random(n) < 0.5, 'Cancelled', 'Unshipped'), 'Shipped').astype(object)
+    courier[dropped | (rng.random(n) < 0.05)] = np.nan
+
+    quantity = 1 + (rng.random(n) < profile['extra_units'][item] / 2)
+    quantity[cancelled & (rng.random(n) < 0.5)] = 0
+    amount = np.round(profile['price'][item] * np.maximum(quantity, 1) * rng.choice([1, 1, 1, 0.95, 0.9], n), 2)
+    amount[(quantity == 0) & (rng.random(n) < 0.7)] = np.nan
+    amount[rng.random(n) < 0.001] = 0
+
+    category = profile['category'][item]
+    styles = np.char.add('J', np.char.zfill((np.asarray(item) % 4000).astype(str), 4)).astype(object)
+    size = choice(rng, sizes, n)
+    sku = (styles + '-' + size).astype(object)
+
+    # States: raw aliases ("rj", "orissa", ...) and a few missing values
+    raw_state = states.astype(object).copy()
+    alias_rows = np.flatnonzero(np.isin(states, list(state_aliases)) & (rng.random(n) < 0.3))
+    raw_state[alias_rows] = pick(rng, state_aliases, states[alias_rows])
+    raw_state[states == 'unknown'] = np.nan
+    city = np.array([np.nan if s == 'unknown' else f'{s} city' for s in states], dtype=object)
+    known = np.isin(states, list(cities))
+    city[known] = pick(rng, cities, states[known])
+    prefixes = np.array([postal_prefix(s) for s in profile['states']])[state]
+    # Float postal codes are written with the trailing ".0" the cleaning strips
+    postal = (prefixes * 10**4 + rng.integers(0, 10**4, n)).astype('float64')
+    postal[states == 'unknown'] = np.nan
+
+    promotion = np.where(rng.random(n) < profile['discount'][item], 'Amazon PLCC Free-Financing Universal Merchant', None)
+    return pd.DataFrame({
+        'index': np.arange(offset, offset + n),
+        'Order ID': order_ids,
+        'Date': profile['days'][day].strftime('%m-%d-%y'),
+        'Status': status,
+        'Fulfilment': np.where(rng.random(n) < 0.7, 'Amazon', 'Merchant'),
+        'Sales Channel ': np.where(rng.random(n) < 0.999, 'Amazon.in', 'Non-Amazon'),
+        'ship-service-level': np.where(rng.random(n) < 0.7, 'Expedited', 'Standard'),
+        'Style': scramble(rng, styles),
+        'SKU': sku,
+        'Category': scramble(rng, pick(rng, category_labels, category)),
+        'Size': size,
+        'ASIN': profile['asins'][item],
+        'Courier Status': courier,
+        'Qty': quantity.astype('int64'),
+        'currency': np.where(np.isnan(amount), None, 'INR'),
+        'Amount': amount,
+        'ship-city': scramble(rng, city),
+        'ship-state': scramble(rng, raw_state),
+        'ship-postal-code': postal,
+        'ship-country': np.where(np.isnan(amount), None, 'IN'),
+        'promotion-ids': promotion,
+        'B2B': rng.random(n) < 0.007,
+        'fulfilled-by': np.where(rng.random(n) < 0.3, 'Easy Ship', None),
+        'Unnamed: 22': np.where(rng.random(n) < 0.6, 'False', None)
+    })[raw_columns]
+
+
+def generate(rows, output, seed=0, chunksize=1_000_000, path=store_path):
+    profile = fit_profile(path)
+    for i, start in enumerate(range(0, rows, chunksize)):
+        chunk = generate_chunk(profile, min(chunksize, rows - start), [seed, i], start)
+        chunk.to_csv(output, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic raw Amazon sales report.')
+    parser.add_argument('rows', type=int, help='number of rows, e.g. 1000000')
+    parser.add_argument('output', help='path of the CSV to write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    args = parser.parse_args()
+    generate(args.rows, args.output, args.seed, args.chunksize)
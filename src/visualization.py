@@ -1,326 +1,452 @@
 # Import Dependencies
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import seaborn as sns
-from pandas_cleaning import project_root
+from store import project_root, store_path
+from pipeline import cache_path, fingerprint
+from catalog import Catalog, table
+from categoricals import drop_unused_categories
+from cube import load_cube, rates
+from items import load_item_stats, ItemIndex
+from densities import (
+    hue_levels, as_numbers, bin_density, scott_bandwidth, kde_curves, hue_colors, stacked_kdeplot
+)
+import sampling
+import instrument
+from instrument import step
 sns.set_theme()
 
 
+# Every figure is an independent render task that reads the shared `data` catalog, so tasks
+# can run in any order and in parallel. Worker processes are forked after the figures' data
+# is loaded and share its pages instead of receiving a pickled copy per task.
+#
+# Each figure declares the slice of `data` it plots and its plot parameters. Figures and
+# tables are keyed by a hash of that slice, the parameters and the plotting code, and an
+# output whose key has not changed since it was last written is skipped.
+data_path = store_path
+figures_path = os.path.join(project_root, 'outputs', 'figures')
+tables_path = os.path.join(project_root, 'outputs', 'tables')
+render_index_path = os.path.join(cache_path, 'renders.json')
+figures = {}
+# Binned density helpers are part of every figure's key
+density_code = [hue_levels, as_numbers, bin_density, scott_bandwidth, kde_curves, hue_colors, stacked_kdeplot]
+
+
+# Register a figure. `inputs` maps the loaded data to the frames passed to the plotting
+# function; `spec` holds its remaining plot parameters.
+def figure(name, inputs, **spec):
+    def register(func):
+        figures[name] = (func, inputs, spec)
+        return func
+    return register
+
+
+def savefig(name, **kwargs):
+    with step('savefig'):
+        plt.savefig(os.path.join(figures_path, f'{name}.png'), dpi=300, facecolor='white', **kwargs)
+
+
 # Load Data
-data_path = os.path.join(project_root, 'data', 'processed')
-dataframes = {}
-def clean_csvname(filename):
-    return filename.replace('.csv', '')
-for file in os.listdir(data_path):
-    if file.endswith('.csv'):
-        name = clean_csvname(file)
-        dataframes[name] = pd.read_csv(os.path.join(data_path, file))
+# Processed tables the figures read, with the columns they use. Dtypes come from the store
+# schemas; tables not listed here (the cancelled views, weekly revenue, the export below) are
+# never read.
+category_fixes = {'category': {'dupatta': 'ethnic dress'}}
+datasets = {
+    'sales': table('sales', [
+        'asin', 'category', 'total_orders', 'orders_at_discount', 'median_unit_price', 'revenue'
+    ], category_fixes),
+    # Orders are mapped from the compact copy; only the columns the order density plots and
+    # the cancellation correlation use are touched
+    'orders': table('orders', ['date', 'status', 'amount', 'quantity'], category_fixes),
+    'regional_sales': table('regional_sales', ['ship_state_or_territory']),
+    # Exported whole as top_regions_item_sales
+    'regional_demand': table('regional_demand', relabel=category_fixes)
+}
+
+
+# Items above the 80th percentile of orders or revenue are top sellers, as flagged in the
+# item statistics. Every sold asin has statistics, so a missing one means they are stale.
+def top_seller(data):
+    sales = data['dataframes']['sales']
+    items = data['item_index'].lookup(sales['asin'])
+    missing = sales['asin'][items['asin'].isna().to_numpy()]
+    if len(missing):
+        raise ValueError(f'{len(missing)} asins of the sales table have no item statistics, e.g. {missing.iloc[0]}; '
+                         'rebuild them with python src/items.py --rebuild')
+    return pd.Series(items['top_seller'].to_numpy(dtype=bool), index=sales.index)
+
+
+def seller_split(data, top):
+    sales = data['dataframes']['sales']
+    sales = drop_unused_categories(sales[data['top_seller'] == top])
+    sales['top_seller'] = top
+    sales['discount_percentage'] = sales['orders_at_discount']/sales['total_orders'] * 100
+    return sales
 
 
-# Relabel dupatta category
-dataframes['sales']['category'] = dataframes['sales']['category'].replace({'dupatta': 'ethnic dress'})
+# Define cancellation dataframe
+def cancellations(data):
+    cancellations = data['dataframes']['orders'].copy()
+    cancellations['is_cancelled'] = cancellations['status'] == 'cancelled or returned'
+    return cancellations
+
+
+# Cancellation percentages for categorical columns, looked up in the cancellation cube
+def cancel_percentage(data):
+    categorical_cols = ['category', 'size', 'sales_channel', 'ship_service_level',
+                        'fulfillment', 'style', 'b2b', 'ship_state_or_territory']
+    cancel_percentage = {}
+    for col in categorical_cols:
+        cancel_percentage[col] = rates(data['cube'], col)['cancel_rate'].sort_values(ascending=False) * 100
+        # Plain labels so bars keep the sorted order rather than the category order
+        cancel_percentage[col].index = cancel_percentage[col].index.astype(object)
+    return cancel_percentage
+
+
+# Top 10 states/territories sales data
+def top_regions(data):
+    return data['dataframes']['regional_sales'].head(10)['ship_state_or_territory'].tolist()
+
+
+def top_regions_item_sales(data):
+    demand = data['dataframes']['regional_demand']
+    return drop_unused_categories(demand[demand['ship_state_or_territory'].isin(data['top_regions'])])
+
+
+# Sum orders by region and category
+def regional_top_categories(data):
+    regional_top_categories = data['top_regions_item_sales'].groupby(['ship_state_or_territory', 'category'], observed=True).agg({'regional_orders': 'sum'}).reset_index()
+    regional_top_categories.sort_values(by=['ship_state_or_territory', 'regional_orders'], ascending=False, inplace=True)
+    regional_top_categories.reset_index(drop=True, inplace=True)
+    return regional_top_categories
+
+
+# Cancellation rates by region and category
+def grouped(data):
+    top_categories = ['set', 'kurta', 'top', 'western dress']
+
+    grouped = rates(data['cube'], 'ship_state_or_territory', 'category').reset_index()
+    grouped = grouped[
+        grouped['ship_state_or_territory'].isin(data['top_regions']) & grouped['category'].isin(top_categories)
+    ].rename(columns={'cancelled_orders': 'cancellations'}).reset_index(drop=True)
+    grouped[['ship_state_or_territory', 'category']] = grouped[['ship_state_or_territory', 'category']].astype('category')
+
+    # Compute category average cancellation rates and deviations
+    global_avg = grouped.groupby('category', observed=True)['cancel_rate'].transform('mean')
+    grouped['cancel_diff'] = grouped['cancel_rate'] - global_avg
+    return grouped
+
+
+# The data the figures and tables read, as a lazy catalog: building it reads nothing, and
+# each table or derived frame is loaded on its first access. The cube and the item statistics
+# are read from their files and rebuilt from the stored orders only when those changed.
+def load_data(path=data_path):
+    return Catalog({
+        'dataframes': lambda data: Catalog(datasets, data.path),
+        'top_seller': top_seller,
+        'sales': partial(seller_split, top=False),
+        'topsellers': partial(seller_split, top=True),
+        'cancellations': cancellations,
+        'cube': lambda data: load_cube(path=data.path),
+        'item_index': lambda data: ItemIndex(load_item_stats(path=data.path)),
+        'cancel_percentage': cancel_percentage,
+        'top_regions': top_regions,
+        'top_regions_item_sales': top_regions_item_sales,
+        'regional_top_categories': regional_top_categories,
+        'grouped': grouped
+    }, path)
+
+
+data = load_data()
+
+
+# Tables exported as CSV: name -> (directory, table builder, to_csv options)
+tables = {
+    # Top 10 states/territories sales data
+    'top_regions_item_sales': (
+        data_path, lambda data: data['top_regions_item_sales'], {'index': False}
+    ),
+    # Orders by region and category
+    'regional_top_categories': (
+        tables_path, lambda data: data['regional_top_categories'], {'index': False}
+    ),
+    # Correlation matrix for cancellations
+    'cancellation_correlation': (
+        tables_path, lambda data: data['cancellations'][['amount', 'quantity', 'is_cancelled']].corr(), {}
+    )
+}
+
 
 # Plot number of items by category
-dataframes['sales']['category'].value_counts().plot(kind='barh')
-plt.xlabel('Number of items')
-plt.ylabel('')
-plt.title('Number of Items By Category')
-plt.savefig(project_root + '/outputs/figures/item_count_by_category.png', dpi=300, facecolor='white', bbox_inches='tight')
-plt.close()
-
-# Split topsellers from sales
-dataframes['sales']['top_seller'] = (
-    (dataframes['sales']['total_orders'] > dataframes['sales']['total_orders'].quantile(0.8)) |
-    (dataframes['sales']['revenue'] > dataframes['sales']['revenue'].quantile(0.8))
-    )
-topsellers = dataframes['sales'][dataframes['sales']['top_seller']==True]
-sales = dataframes['sales'][dataframes['sales']['top_seller']==False]
+@figure('item_count_by_category', lambda data: (data['dataframes']['sales']['category'],))
+def item_count_by_category(category):
+    category.value_counts().plot(kind='barh')
+    plt.xlabel('Number of items')
+    plt.ylabel('')
+    plt.title('Number of Items By Category')
+    savefig('item_count_by_category', bbox_inches='tight')
 
 
 # Plot item order count and revenue distributions by category
-plt.subplots(1,2, figsize=(12, 5))
-# First plot: item order count distribution by category
-plt.subplot(1, 2, 1)
-sns.violinplot(data=sales, y='total_orders', x='category', hue='category', cut=0, inner='box')
-plt.title('Item Order Count Distribution by Category')
-plt.xticks(rotation=45)
-plt.xlabel('')
-plt.ylabel('total orders')
-# Second plot: item revenue distribution by category
-plt.subplot(1, 2, 2)
-sns.violinplot(data=sales, y='revenue', x='category', hue='category', cut=0, inner='box')
-plt.title('Item Revenue Distribution by Category')
-plt.xticks(rotation=45)
-plt.xlabel('')
-plt.savefig(project_root + '/outputs/figures/item_distributions_by_category.png', dpi=300, facecolor='white', bbox_inches='tight')
-plt.close()
+@figure('item_distributions_by_category', lambda data: (data['sales'][['category', 'total_orders', 'revenue']],))
+def item_distributions_by_category(sales):
+    plt.subplots(1,2, figsize=(12, 5))
+    # First plot: item order count distribution by category
+    plt.subplot(1, 2, 1)
+    sns.violinplot(data=sales, y='total_orders', x='category', hue='category', cut=0, inner='box')
+    plt.title('Item Order Count Distribution by Category')
+    plt.xticks(rotation=45)
+    plt.xlabel('')
+    plt.ylabel('total orders')
+    # Second plot: item revenue distribution by category
+    plt.subplot(1, 2, 2)
+    sns.violinplot(data=sales, y='revenue', x='category', hue='category', cut=0, inner='box')
+    plt.title('Item Revenue Distribution by Category')
+    plt.xticks(rotation=45)
+    plt.xlabel('')
+    savefig('item_distributions_by_category', bbox_inches='tight')
 
 
 # Plot median and mean item order count
-plt.subplot(1, 2, 1)
-sns.barplot(data=sales, x='total_orders', y='category', hue='category', estimator=np.median)
-plt.title('Median Item Order Count')
-plt.ylabel('')
-plt.tight_layout()
-plt.subplot(1, 2, 2)
-sns.barplot(data=sales, x='total_orders', y='category', hue='category', estimator=np.mean)
-plt.title('Mean Item Order Count')
-plt.ylabel('')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/order_count_skewness.png', dpi=300, facecolor='white')
+@figure('order_count_skewness', lambda data: (data['sales'][['category', 'total_orders']],))
+def order_count_skewness(sales):
+    plt.subplot(1, 2, 1)
+    sns.barplot(data=sales, x='total_orders', y='category', hue='category', estimator=np.median)
+    plt.title('Median Item Order Count')
+    plt.ylabel('')
+    plt.tight_layout()
+    plt.subplot(1, 2, 2)
+    sns.barplot(data=sales, x='total_orders', y='category', hue='category', estimator=np.mean)
+    plt.title('Mean Item Order Count')
+    plt.ylabel('')
+    plt.tight_layout()
+    savefig('order_count_skewness')
+
 
 # Plot median and mean item revenue
-plt.subplot(1, 2, 1)
-sns.barplot(data=sales, x='revenue', y='category', hue='category', estimator=np.median)
-plt.title('Median Item Revenue')
-plt.ylabel('')
-plt.tight_layout()
-plt.subplot(1, 2, 2)
-sns.barplot(data=sales, x='revenue', y='category', hue='category', estimator=np.mean)
-plt.title('Mean Item Revenue')
-plt.ylabel('')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/revenue_skewness.png', dpi=300, facecolor='white')
-plt.close()
+@figure('revenue_skewness', lambda data: (data['sales'][['category', 'revenue']],))
+def revenue_skewness(sales):
+    plt.subplot(1, 2, 1)
+    sns.barplot(data=sales, x='revenue', y='category', hue='category', estimator=np.median)
+    plt.title('Median Item Revenue')
+    plt.ylabel('')
+    plt.tight_layout()
+    plt.subplot(1, 2, 2)
+    sns.barplot(data=sales, x='revenue', y='category', hue='category', estimator=np.mean)
+    plt.title('Mean Item Revenue')
+    plt.ylabel('')
+    plt.tight_layout()
+    savefig('revenue_skewness')
 
 
 # Plot order density relative to median unit price
-plt.subplots(1, 2, figsize=(12, 5))
-plt.subplot(1, 2, 1)
-sns.kdeplot(data=sales, x='median_unit_price', hue='category', fill=True, multiple='stack', warn_singular=False)
-plt.title('Density of Orders by Median Unit Price and Category', fontsize=12)
-plt.xlabel('Median Unit Price', fontsize=9)
-plt.ylabel('Density', fontsize=9)
-# Plot percentage of orders at a discount
-plt.subplot(1, 2, 2)
-sales['discount_percentage'] = sales['orders_at_discount']/sales['total_orders'] * 100
-sns.barplot(data=sales, x='category', y='discount_percentage', hue='category', legend=False)
-plt.title('Discounted Orders Percentage by Category')
-plt.xticks(rotation=30)
-plt.xlabel('')
-plt.ylabel('Percentage')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/order_density_and_discount.png', dpi=300, facecolor='white')
-plt.close()
+@figure('order_density_and_discount', lambda data: (data['sales'][['category', 'median_unit_price', 'discount_percentage']],))
+def order_density_and_discount(sales):
+    plt.subplots(1, 2, figsize=(12, 5))
+    plt.subplot(1, 2, 1)
+    sns.kdeplot(data=sales, x='median_unit_price', hue='category', fill=True, multiple='stack', warn_singular=False)
+    plt.title('Density of Orders by Median Unit Price and Category', fontsize=12)
+    plt.xlabel('Median Unit Price', fontsize=9)
+    plt.ylabel('Density', fontsize=9)
+    # Plot percentage of orders at a discount
+    plt.subplot(1, 2, 2)
+    sns.barplot(data=sales, x='category', y='discount_percentage', hue='category', legend=False)
+    plt.title('Discounted Orders Percentage by Category')
+    plt.xticks(rotation=30)
+    plt.xlabel('')
+    plt.ylabel('Percentage')
+    plt.tight_layout()
+    savefig('order_density_and_discount')
 
 
 # Plot median unit price distributions per category
-g = sns.displot(
-    data=sales,
-    x='median_unit_price',
-    col='category',
-    hue='category',
-    kde=True,
-    col_wrap=3,  
-    height=4,
-    legend=False,
-    facet_kws={'sharex': False, 'sharey': False}
-)
-g.fig.suptitle('Price Distribution by Category', y=1.02)
-g.set_titles("{col_name}")
-g.set_axis_labels("Median Unit Price", "Count")
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/price_distribution.png', dpi=300, facecolor='white')
-plt.close()
+@figure('price_distribution', lambda data: (data['sales'][['category', 'median_unit_price']],))
+def price_distribution(sales):
+    g = sns.displot(
+        data=sales,
+        x='median_unit_price',
+        col='category',
+        hue='category',
+        kde=True,
+        col_wrap=3,
+        height=4,
+        legend=False,
+        facet_kws={'sharex': False, 'sharey': False}
+    )
+    g.fig.suptitle('Price Distribution by Category', y=1.02)
+    g.set_titles("{col_name}")
+    g.set_axis_labels("Median Unit Price", "Count")
+    plt.tight_layout()
+    savefig('price_distribution')
 
 
 # Plot item order and revenue distributions by category
-plt.subplots(1,2, figsize=(12, 5))
-plt.subplot(1, 2, 1)
-sns.violinplot(data=topsellers, y='total_orders', x='category', hue='category', cut=0, inner='box', palette='Paired')
-plt.title('Topsellers Item Order Count Distribution by Category')
-plt.xticks(rotation=45)
-plt.xlabel('')
-plt.ylabel('total orders')
-plt.subplot(1, 2, 2)
-sns.violinplot(data=topsellers, y='revenue', x='category', hue='category', cut=0, inner='box', palette='Paired')
-plt.title('Topsellers Item Revenue Distribution by Category')
-plt.xticks(rotation=45)
-plt.xlabel('')
-plt.savefig(project_root + '/outputs/figures/topseller_distributions_by_category.png', dpi=300, facecolor='white', bbox_inches='tight')
-plt.close()
-
-
-# Plot western dress top 20 sellers
-top20_WD= topsellers[topsellers['category']=='western dress'].sort_values('total_orders', ascending=False).iloc[:20].copy()
-top20_WD['non_discounted'] = top20_WD['total_orders'] - top20_WD['orders_at_discount']
-plt.figure(figsize=(12, 9))
-discounted_bars = plt.barh(top20_WD['asin'], top20_WD['orders_at_discount'], 
-                 color='#b7cf9b', label='Discounted Orders')
-nondiscounted_bars = plt.barh(top20_WD['asin'], top20_WD['non_discounted'], 
-                 left=top20_WD['orders_at_discount'], 
-                 color='#5d669e', label='Full-Price Orders')
-
-# Add revenue labels
-for i, (total, rev) in enumerate(zip(top20_WD['total_orders'], top20_WD['revenue'])):
-    label = f"{rev:,.0f}"
-    plt.text(total + 5, i, label, va='center', ha='left', fontsize=9, color='black')
-
-plt.xlabel('Total Orders', fontsize=12)
-plt.title('Top 20 Western Dress Sellers (Discounted vs Full Price)')
-plt.gca().invert_yaxis()
-plt.legend(frameon=True)
-plt.tight_layout()
-max_orders = top20_WD['total_orders'].max()
-plt.xlim(0, max_orders * 1.1)
-plt.savefig(project_root + '/outputs/figures/top20_WDproducts.png', dpi=300, facecolor='white')
-plt.close()
-
-
-# Plot Kurta top 20 sellers
-top20_K= topsellers[topsellers['category']=='kurta'].sort_values('total_orders', ascending=False).iloc[:20].copy()
-top20_K['non_discounted'] = top20_K['total_orders'] - top20_K['orders_at_discount']
-plt.figure(figsize=(12, 9))
-discounted_bars = plt.barh(top20_K['asin'], top20_K['orders_at_discount'], 
-                 color='#b7cf9b', label='Discounted Orders')
-nondiscounted_bars = plt.barh(top20_K['asin'], top20_K['non_discounted'], 
-                 left=top20_K['orders_at_discount'], 
-                 color='#5d669e', label='Full-Price Orders')
-
-# Add revenue labels
-for i, (total, rev) in enumerate(zip(top20_K['total_orders'], top20_K['revenue'])):
-    label = f"{rev:,.0f}"
-    plt.text(total + 5, i, label, va='center', ha='left', fontsize=9, color='black')
-
-plt.xlabel('Total Orders', fontsize=12)
-plt.title('Top 20 Kurta Sellers (Discounted vs Full Price)')
-plt.gca().invert_yaxis()
-plt.legend(frameon=True)
-plt.tight_layout()
-max_orders = top20_K['total_orders'].max()
-plt.xlim(0, max_orders * 1.1)
-plt.savefig(project_root + '/outputs/figures/top20_Kproducts.png', dpi=300, facecolor='white')
-plt.close()
-
-
-# Plot set top 20 sellers
-top20_S= topsellers[topsellers['category']=='set'].sort_values('total_orders', ascending=False).iloc[:20].copy()
-top20_S['non_discounted'] = top20_S['total_orders'] - top20_S['orders_at_discount']
-plt.figure(figsize=(12, 9))
-discounted_bars = plt.barh(top20_S['asin'], top20_S['orders_at_discount'], 
-                 color='#b7cf9b', label='Discounted Orders')
-nondiscounted_bars = plt.barh(top20_S['asin'], top20_S['non_discounted'], 
-                 left=top20_S['orders_at_discount'], 
-                 color='#5d669e', label='Full-Price Orders')
-
-# Add revenue labels
-for i, (total, rev) in enumerate(zip(top20_S['total_orders'], top20_S['revenue'])):
-    label = f"{rev:,.0f}"
-    plt.text(total + 5, i, label, va='center', ha='left', fontsize=9, color='black')
-
-plt.xlabel('Total Orders', fontsize=12)
-plt.title('Top 20 Sets Sellers (Discounted vs Full Price)')
-plt.gca().invert_yaxis()
-plt.legend(frameon=True)
-plt.tight_layout()
-max_orders = top20_S['total_orders'].max()
-plt.xlim(0, max_orders * 1.1)
-plt.savefig(project_root + '/outputs/figures/top20_Set_products.png', dpi=300, facecolor='white')
-plt.close()
+@figure('topseller_distributions_by_category', lambda data: (data['topsellers'][['category', 'total_orders', 'revenue']],))
+def topseller_distributions_by_category(topsellers):
+    plt.subplots(1,2, figsize=(12, 5))
+    plt.subplot(1, 2, 1)
+    sns.violinplot(data=topsellers, y='total_orders', x='category', hue='category', cut=0, inner='box', palette='Paired')
+    plt.title('Topsellers Item Order Count Distribution by Category')
+    plt.xticks(rotation=45)
+    plt.xlabel('')
+    plt.ylabel('total orders')
+    plt.subplot(1, 2, 2)
+    sns.violinplot(data=topsellers, y='revenue', x='category', hue='category', cut=0, inner='box', palette='Paired')
+    plt.title('Topsellers Item Revenue Distribution by Category')
+    plt.xticks(rotation=45)
+    plt.xlabel('')
+    savefig('topseller_distributions_by_category', bbox_inches='tight')
+
+
+# Plot top 20 sellers of a category
+def top20_products(top20, category, title, filename):
+    top20 = top20.copy()
+    top20['non_discounted'] = top20['total_orders'] - top20['orders_at_discount']
+    plt.figure(figsize=(12, 9))
+    discounted_bars = plt.barh(top20['asin'], top20['orders_at_discount'],
+                     color='#b7cf9b', label='Discounted Orders')
+    nondiscounted_bars = plt.barh(top20['asin'], top20['non_discounted'],
+                     left=top20['orders_at_discount'],
+                     color='#5d669e', label='Full-Price Orders')
+
+    # Add revenue labels
+    for i, (total, rev) in enumerate(zip(top20['total_orders'], top20['revenue'])):
+        label = f"{rev:,.0f}"
+        plt.text(total + 5, i, label, va='center', ha='left', fontsize=9, color='black')
+
+    plt.xlabel('Total Orders', fontsize=12)
+    plt.title(title)
+    plt.gca().invert_yaxis()
+    plt.legend(frameon=True)
+    plt.tight_layout()
+    max_orders = top20['total_orders'].max()
+    plt.xlim(0, max_orders * 1.1)
+    savefig(filename)
+
+
+# The category's first 20 top sellers by orders, read off the item index in rank order
+def category_top20(data, category):
+    columns = ['asin', 'category', 'total_orders', 'orders_at_discount', 'revenue']
+    return data['item_index'].top(category, 20, top_sellers=True)[columns]
+
+
+for name, category, label in [
+    ('top20_WDproducts', 'western dress', 'Western Dress'),
+    ('top20_Kproducts', 'kurta', 'Kurta'),
+    ('top20_Set_products', 'set', 'Sets')
+]:
+    figure(
+        name,
+        lambda data, category=category: (category_top20(data, category),),
+        category=category,
+        title=f'Top 20 {label} Sellers (Discounted vs Full Price)',
+        filename=name
+    )(top20_products)
 
 
 # Plot topseller order density relative to median unit price
-plt.subplots(1, 2, figsize=(12, 5))
-plt.subplot(1, 2, 1)
-sns.kdeplot(data=topsellers, x='median_unit_price', hue='category', fill=True, multiple='stack')
-plt.title('Topseller Density of Orders by Median Unit Price and Category', fontsize=12)
-plt.xlabel('Median Unit Price', fontsize=9)
-plt.ylabel('Density', fontsize=9)
-
-# Plot percentage of orders at a discount
-plt.subplot(1, 2, 2)
-topsellers['discount_percentage'] = topsellers['orders_at_discount']/topsellers['total_orders'] * 100
-sns.barplot(data=sales, x='category', y='discount_percentage', hue='category', legend=False)
-plt.title('Topseller Discounted Orders Percentage by Category')
-plt.xticks(rotation=30)
-plt.xlabel('')
-plt.ylabel('Percentage')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/topseller_order_density_and_discount.png', dpi=300, facecolor='white')
-plt.close()
+@figure('topseller_order_density_and_discount', lambda data: (
+    data['topsellers'][['category', 'median_unit_price']],
+    data['sales'][['category', 'discount_percentage']]
+))
+def topseller_order_density_and_discount(topsellers, sales):
+    plt.subplots(1, 2, figsize=(12, 5))
+    plt.subplot(1, 2, 1)
+    sns.kdeplot(data=topsellers, x='median_unit_price', hue='category', fill=True, multiple='stack')
+    plt.title('Topseller Density of Orders by Median Unit Price and Category', fontsize=12)
+    plt.xlabel('Median Unit Price', fontsize=9)
+    plt.ylabel('Density', fontsize=9)
+
+    # Plot percentage of orders at a discount
+    plt.subplot(1, 2, 2)
+    sns.barplot(data=sales, x='category', y='discount_percentage', hue='category', legend=False)
+    plt.title('Topseller Discounted Orders Percentage by Category')
+    plt.xticks(rotation=30)
+    plt.xlabel('')
+    plt.ylabel('Percentage')
+    plt.tight_layout()
+    savefig('topseller_order_density_and_discount')
 
 
 # Plot topseller median unit price distributions
-g = sns.displot(
-    data=topsellers,
-    x='median_unit_price',
-    col='category',
-    hue='category',
-    kde=True,
-    col_wrap=3,  
-    height=6,
-    legend=False,
-    facet_kws={'sharex': False, 'sharey': False}
-)
-g.fig.suptitle('Topsellers Price Distribution by Category', y=1.02)
-g.set_titles("{col_name}")
-g.set_axis_labels("Median Unit Price", "Count")
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/topseller_price_distribution.png', dpi=300, facecolor='white')
-plt.close()
+@figure('topseller_price_distribution', lambda data: (data['topsellers'][['category', 'median_unit_price']],))
+def topseller_price_distribution(topsellers):
+    g = sns.displot(
+        data=topsellers,
+        x='median_unit_price',
+        col='category',
+        hue='category',
+        kde=True,
+        col_wrap=3,
+        height=6,
+        legend=False,
+        facet_kws={'sharex': False, 'sharey': False}
+    )
+    g.fig.suptitle('Topsellers Price Distribution by Category', y=1.02)
+    g.set_titles("{col_name}")
+    g.set_axis_labels("Median Unit Price", "Count")
+    plt.tight_layout()
+    savefig('topseller_price_distribution')
 
 
 # Plot aggregates of topsellers and regular sellers
-fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 8))
-# Plot topsellers aggregates
-aggregates = topsellers.groupby('category').agg({'total_orders': 'sum', 'revenue': 'sum'}).reset_index().sort_values(by='revenue', ascending=False)
-sns.barplot(data=aggregates, x='total_orders', y='category', hue='category', ax=ax1)
-ax1.set_xlabel('Total Orders', fontsize=12)
-ax1.set_ylabel('')
-ax1.set_title('Topseller Total Orders', fontsize=14)
-sns.barplot(data=aggregates, x='revenue', y='category', hue='category', ax=ax3)
-ax3.set_xlabel('Revenue', fontsize=12)
-ax3.set_ylabel('')
-ax3.set_title('Topseller Total Revenue', fontsize=14)
-
-# Plot regular sellers aggregates
-aggregates_r = sales.groupby('category').agg({'total_orders': 'sum', 'revenue': 'sum'}).reset_index().sort_values(by='revenue', ascending=False)
-sns.barplot(data=aggregates_r, x='total_orders', y='category', hue='category', ax=ax2)
-ax2.set_xlabel('Total Orders', fontsize=12)
-ax2.set_ylabel('')
-ax2.set_title('Regular Sellers Total Orders', fontsize=14)
-ax2.sharey(ax1)
-ax2.set_xlim(ax1.get_xlim())
-sns.barplot(data=aggregates_r, x='revenue', y='category', hue='category', ax=ax4)
-ax4.set_xlabel('Revenue', fontsize=12)
-ax4.set_ylabel('')
-ax4.set_title('Regular Sellers Total Revenue', fontsize=14)
-ax4.sharey(ax3)
-ax4.set_xlim(ax3.get_xlim())
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/sales_aggregates.png', dpi=300, facecolor='white')
-plt.close()
-
-
-# Define cancellation dataframe
-cancellations = dataframes['orders'].copy()
-cancellations.replace({'category': 'dupatta'}, {'category': 'ethnic dress'}, inplace=True)
-cancellations['is_cancelled'] = cancellations['status'] == 'cancelled or returned'
-
-# Compute cancellation percentages for categorical columns
-categorical_cols = ['category', 'size', 'sales_channel', 'ship_service_level', 
-                    'fulfillment', 'style', 'b2b', 'ship_state_or_territory']
-
-cancel_percentage = {}
-for col in categorical_cols:
-    cat_cancelled = cancellations.groupby(col)['is_cancelled'].sum()
-    cat_totals = cancellations.groupby(col)['index_id'].count()
-    cancel_percentage[col] = (cat_cancelled/cat_totals).sort_values(ascending=False) * 100
+@figure('sales_aggregates', lambda data: (
+    data['topsellers'][['category', 'total_orders', 'revenue']],
+    data['sales'][['category', 'total_orders', 'revenue']]
+))
+def sales_aggregates(topsellers, sales):
+    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 8))
+    # Plot topsellers aggregates
+    aggregates = topsellers.groupby('category', observed=True).agg({'total_orders': 'sum', 'revenue': 'sum'}).reset_index().sort_values(by='revenue', ascending=False)
+    sns.barplot(data=aggregates, x='total_orders', y='category', hue='category', ax=ax1)
+    ax1.set_xlabel('Total Orders', fontsize=12)
+    ax1.set_ylabel('')
+    ax1.set_title('Topseller Total Orders', fontsize=14)
+    sns.barplot(data=aggregates, x='revenue', y='category', hue='category', ax=ax3)
+    ax3.set_xlabel('Revenue', fontsize=12)
+    ax3.set_ylabel('')
+    ax3.set_title('Topseller Total Revenue', fontsize=14)
+
+    # Plot regular sellers aggregates
+    aggregates_r = sales.groupby('category', observed=True).agg({'total_orders': 'sum', 'revenue': 'sum'}).reset_index().sort_values(by='revenue', ascending=False)
+    sns.barplot(data=aggregates_r, x='total_orders', y='category', hue='category', ax=ax2)
+    ax2.set_xlabel('Total Orders', fontsize=12)
+    ax2.set_ylabel('')
+    ax2.set_title('Regular Sellers Total Orders', fontsize=14)
+    ax2.sharey(ax1)
+    ax2.set_xlim(ax1.get_xlim())
+    sns.barplot(data=aggregates_r, x='revenue', y='category', hue='category', ax=ax4)
+    ax4.set_xlabel('Revenue', fontsize=12)
+    ax4.set_ylabel('')
+    ax4.set_title('Regular Sellers Total Revenue', fontsize=14)
+    ax4.sharey(ax3)
+    ax4.set_xlim(ax3.get_xlim())
+    plt.tight_layout()
+    savefig('sales_aggregates')
 
 
 # Plot cancellation percentages for categorical columns with few unique values
-for cat in ['sales_channel', 'fulfillment', 'ship_service_level', 'category', 'size', 'b2b']:
+def cancellation_percentage(percentage, cat):
     ax = sns.barplot(
-        x=cancel_percentage[cat].values, 
-        y=cancel_percentage[cat].index, 
-        hue=cancel_percentage[cat].index, 
+        x=percentage.values,
+        y=percentage.index,
+        hue=percentage.index,
         palette='flare'
     )
     # Add percentage labels to the bars
-    for i, v in enumerate(cancel_percentage[cat].values):
+    for i, v in enumerate(percentage.values):
         ax.text(
             v + 1,
             i,
@@ -329,150 +455,366 @@ for cat in ['sales_channel', 'fulfillment', 'ship_service_level', 'category', 's
         )
     plt.title(f"Relative Percentage of Cancellations by {cat.replace('_', ' ').title()}")
     plt.xlim(0, 105)
-    plt.savefig(
-        os.path.join(project_root, 'outputs', 'figures', f'cancellation_percentage_by_{cat}.png'), 
-        dpi=300, 
-        facecolor='white',
-        bbox_inches='tight'
-    )
-    plt.close()
+    savefig(f'cancellation_percentage_by_{cat}', bbox_inches='tight')
 
 
-# Plot order total amount distributions by status
-sns.kdeplot(dataframes['orders'], x='amount', hue='status', fill=True, multiple='stack')
-plt.xlabel('Order Total Amount')
-plt.title('Order Total Amount Distribution by Status')
-plt.savefig(project_root + '/outputs/figures/order_total_amount_distribution.png', dpi=300, facecolor='white', bbox_inches='tight')
-plt.close()
+for cat in ['sales_channel', 'fulfillment', 'ship_service_level', 'category', 'size', 'b2b']:
+    figure(
+        f'cancellation_percentage_by_{cat}',
+        lambda data, cat=cat: (data['cancel_percentage'][cat],),
+        cat=cat
+    )(cancellation_percentage)
 
 
-# Export correlation matrix for cancellations as CSV
-cancellation_corr = cancellations[['amount', 'quantity', 'is_cancelled']].corr()
-cancellation_corr.to_csv(os.path.join(project_root, 'outputs', 'tables', 'cancellation_correlation.csv'))
+# Plot order total amount distributions by status, from amounts binned per status
+@figure('order_total_amount_distribution', lambda data: (bin_density(data['dataframes']['orders'], 'amount', 'status'),))
+def order_total_amount_distribution(orders):
+    stacked_kdeplot(orders, x='amount', hue='status')
+    plt.xlabel('Order Total Amount')
+    plt.title('Order Total Amount Distribution by Status')
+    savefig('order_total_amount_distribution', bbox_inches='tight')
 
 
 # Plot cancellation percentages by ship state or territory
-pivot = cancellations.pivot_table(
-    values=['is_cancelled', 'index_id'],
-    index='ship_state_or_territory',
-    aggfunc=
-    {'is_cancelled' : 'mean',
-    'index_id' : 'count'},
-)
-pivot['is_cancelled'] = pivot['is_cancelled'] * 100
-pivot.columns = ['total order count', 'cancellation percentage']
-
-plt.figure(figsize=(12, 10))
-sns.heatmap(pivot, cmap='rocket_r', vmin=100, vmax=20000, annot=True, fmt=".1f")
-plt.title('Cancellation Percentages by State or Territory')
-plt.ylabel('State or Territory')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/cancellation_percentage_by_state.png', dpi=300, facecolor='white')
-plt.close()
-
-
-# Time analysis of shipment status
-dataframes['orders']['date'] = pd.to_datetime(dataframes['orders']['date'])
-plt.figure(figsize=(12, 5))
-sns.kdeplot(data=dataframes['orders'], x='date', hue='status', fill=True, multiple='stack', palette='rocket')
-plt.title('Shipment Status Over Time')
-plt.savefig(project_root + '/outputs/figures/shipment_status_time_analysis.png', dpi=300, facecolor='white')
-plt.close()
-
-
-# Export top 10 states/territories sales data as CSV
-top_regions = dataframes['regional_sales'].head(10)['ship_state_or_territory'].tolist()
-dataframes['regional_demand'] = dataframes['regional_demand'].replace({'category': 'dupatta'}, {'category': 'ethnic dress'})
-top_regions_item_sales = dataframes['regional_demand'][dataframes['regional_demand']['ship_state_or_territory'].isin(top_regions)]
-top_regions_item_sales.to_csv(os.path.join(project_root, 'data', 'processed', 'top_regions_item_sales.csv'), index=False)
-
+@figure('cancellation_percentage_by_state', lambda data: (
+    rates(data['cube'], 'ship_state_or_territory')[['total_orders', 'cancel_rate']],
+))
+def cancellation_percentage_by_state(state_rates):
+    pivot = state_rates.copy()
+    pivot['cancel_rate'] = pivot['cancel_rate'] * 100
+    pivot.columns = ['total order count', 'cancellation percentage']
+
+    plt.figure(figsize=(12, 10))
+    sns.heatmap(pivot, cmap='rocket_r', vmin=100, vmax=20000, annot=True, fmt=".1f")
+    plt.title('Cancellation Percentages by State or Territory')
+    plt.ylabel('State or Territory')
+    plt.tight_layout()
+    savefig('cancellation_percentage_by_state')
+
+
+# Time analysis of shipment status, from dates binned per status
+@figure('shipment_status_time_analysis', lambda data: (bin_density(data['dataframes']['orders'], 'date', 'status'),))
+def shipment_status_time_analysis(orders):
+    plt.figure(figsize=(12, 5))
+    stacked_kdeplot(orders, x='date', hue='status', palette='rocket')
+    plt.title('Shipment Status Over Time')
+    savefig('shipment_status_time_analysis')
+
+
+# Pivot regional orders to region vs category
+def regional_pivot(data):
+    pivot = data['regional_top_categories'].pivot_table(
+        index='ship_state_or_territory',
+        columns='category',
+        values='regional_orders',
+        observed=True
+    )
+    return pivot.loc[pivot.sum(axis=1).sort_values(ascending=False).index]
 
-# Sum orders by region and category and export as CSV
-regional_top_categories = top_regions_item_sales.groupby(['ship_state_or_territory', 'category']).agg({'regional_orders': 'sum'}).reset_index()
-regional_top_categories.sort_values(by=['ship_state_or_territory', 'regional_orders'], ascending=False, inplace=True)
-regional_top_categories.reset_index(drop=True, inplace=True)
-regional_top_categories.to_csv(os.path.join(project_root, 'outputs', 'tables', 'regional_top_categories.csv'), index=False)
 
 # Plot regional orders by category
-# Pivot data to region vs category and plot
-pivot = regional_top_categories.pivot_table(
-    index='ship_state_or_territory',
-    columns='category',
-    values='regional_orders'
-)
-pivot = pivot.loc[pivot.sum(axis=1).sort_values(ascending=False).index]
-pivot.plot(kind='barh', stacked=True, figsize=(7, 5))
-plt.title("Regional Orders by Category")
-plt.xlabel("Total Orders")
-plt.ylabel("State or Territory")
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/regional_orders_by_category.png', dpi=300, facecolor='white')
-plt.close()
+@figure('regional_orders_by_category', lambda data: (regional_pivot(data),))
+def regional_orders_by_category(pivot):
+    pivot.plot(kind='barh', stacked=True, figsize=(7, 5))
+    plt.title("Regional Orders by Category")
+    plt.xlabel("Total Orders")
+    plt.ylabel("State or Territory")
+    plt.tight_layout()
+    savefig('regional_orders_by_category')
 
 
 # Plot regional order percentages by category
-category_order_percentages = pivot
-total_orders = pivot.sum(axis=1)
-for col in pivot:
-    category_order_percentages[col] = category_order_percentages[col]/total_orders * 100
-
-category_order_percentages.plot(kind='barh', stacked=True, figsize=(7,5))
-plt.title("Order Percentage by Category")
-plt.xlabel("Percent")
-plt.ylabel("State or Territory")
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/regional_order_percentages_by_category.png', dpi=300, facecolor='white')
-plt.close()
+@figure('regional_order_percentages_by_category', lambda data: (regional_pivot(data),))
+def regional_order_percentages_by_category(pivot):
+    category_order_percentages = pivot
+    total_orders = pivot.sum(axis=1)
+    for col in pivot:
+        category_order_percentages[col] = category_order_percentages[col]/total_orders * 100
+
+    category_order_percentages.plot(kind='barh', stacked=True, figsize=(7,5))
+    plt.title("Order Percentage by Category")
+    plt.xlabel("Percent")
+    plt.ylabel("State or Territory")
+    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.tight_layout()
+    savefig('regional_order_percentages_by_category')
 
 
 # Plot cancellation rates heat map by region and category
-top_categories = ['set', 'kurta', 'top', 'western dress']
-
-grouped = cancellations[
-    (cancellations['ship_state_or_territory'].isin(top_regions)) & 
-    (cancellations['category'].isin(top_categories))
-].groupby(['ship_state_or_territory', 'category']).agg(
-    total_orders=('index_id', 'count'),
-    cancellations=('is_cancelled', 'sum')
-).reset_index()
-grouped['cancel_rate'] = grouped['cancellations'] / grouped['total_orders']
-
-pivot = grouped.pivot_table(
-    index='ship_state_or_territory',
-    columns= 'category',
-    values='cancel_rate'
-)
+@figure('cancellation_rate_heatmap', lambda data: (
+    data['grouped'][['ship_state_or_territory', 'category', 'cancel_rate']],
+))
+def cancellation_rate_heatmap(grouped):
+    pivot = grouped.pivot_table(
+        index='ship_state_or_territory',
+        columns= 'category',
+        values='cancel_rate',
+        observed=True
+    )
 
-plt.figure(figsize=(7, 7))
-sns.heatmap(pivot * 100, cmap='Reds', annot=False, fmt=".1f", linewidths=0.5)
-plt.title("Cancellation Rate (%) by Category and Region")
-plt.ylabel("Category")
-plt.xlabel("Region")
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/cancellation_rate_heatmap.png', dpi=300, facecolor='white')
-plt.close()
-
-
-# Compute category average cancellation rates.
-global_avg = grouped.groupby('category')['cancel_rate'].mean()
-# Calculate deviation and plot
-grouped['cancel_diff'] = grouped.apply(
-    lambda x: x['cancel_rate'] - global_avg[x['category']], axis=1
-)
-plt.figure(figsize=(12, 6))
-sns.barplot(
-    data=grouped,
-    x='category',
-    y='cancel_diff',
-    hue='ship_state_or_territory',
-    palette='deep'
-)
-plt.axhline(0, color='black', linewidth=0.8)
-plt.title("Cancellation Rate Deviation from Average by Category and Region")
-plt.ylabel("Deviation")
-plt.xticks(rotation=45)
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.tight_layout()
-plt.savefig(project_root + '/outputs/figures/cancellation_rate_deviation.png', dpi=300, facecolor='white')
-plt.close()
\ No newline at end of file
+    plt.figure(figsize=(7, 7))
+    sns.heatmap(pivot * 100, cmap='Reds', annot=False, fmt=".1f", linewidths=0.5)
+    plt.title("Cancellation Rate (%) by Category and Region")
+    plt.ylabel("Category")
+    plt.xlabel("Region")
+    plt.tight_layout()
+    savefig('cancellation_rate_heatmap')
+
+
+# Plot cancellation rate deviation from category average
+@figure('cancellation_rate_deviation', lambda data: (
+    data['grouped'][['category', 'cancel_diff', 'ship_state_or_territory']],
+))
+def cancellation_rate_deviation(grouped):
+    plt.figure(figsize=(12, 6))
+    sns.barplot(
+        data=grouped,
+        x='category',
+        y='cancel_diff',
+        hue='ship_state_or_territory',
+        palette='deep'
+    )
+    plt.axhline(0, color='black', linewidth=0.8)
+    plt.title("Cancellation Rate Deviation from Average by Category and Region")
+    plt.ylabel("Deviation")
+    plt.xticks(rotation=45)
+    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.tight_layout()
+    savefig('cancellation_rate_deviation')
+
+
+# Approximate figures, for exploring at any data size. They are drawn from the stratified
+# sample of the orders (src/sampling.py) with 95% intervals on every number, into their own
+# directory and at screen resolution, and are not cached: a run costs about the same whatever
+# the number of orders.
+approximate_figures = {}
+approximate_dpi = 100
+
+
+def approximate_figure(name):
+    def register(func):
+        approximate_figures[name] = func
+        return func
+    return register
+
+
+def save_approximate(name, **kwargs):
+    path = os.path.join(figures_path, 'approximate')
+    os.makedirs(path, exist_ok=True)
+    with step('savefig'):
+        plt.savefig(os.path.join(path, f'{name}.png'), dpi=approximate_dpi, facecolor='white', **kwargs)
+
+
+# Bars of estimated percentages, largest first, with their intervals as error bars and labels
+def interval_bars(estimates, title, limit=None):
+    estimates = estimates.sort_values('estimate', ascending=False) * 100
+    labels = [str(label) for label in estimates.index]
+    values = estimates['estimate'].to_numpy()
+    errors = [values - estimates['low'].to_numpy(), estimates['high'].to_numpy() - values]
+    plt.figure(figsize=(7, 1 + 0.4 * len(labels)))
+    ax = sns.barplot(x=values, y=labels, hue=labels, palette='flare')
+    ax.errorbar(values, range(len(labels)), xerr=errors, fmt='none', ecolor='black', capsize=3)
+    for i, (value, low, high) in enumerate(zip(values, estimates['low'], estimates['high'])):
+        ax.text(high + 1, i, f'{value:.1f}% ({low:.1f}-{high:.1f})', va='center')
+    plt.xlim(0, limit or estimates['high'].max() * 1.4)
+    plt.title(title)
+
+
+for cat in ['sales_channel', 'fulfillment', 'ship_service_level', 'category', 'size', 'b2b']:
+    def cancellation_estimate(sample, cat=cat):
+        interval_bars(
+            sampling.cancellation_rates(sample, cat),
+            f"Relative Percentage of Cancellations by {cat.replace('_', ' ').title()} (95% CI)", limit=105
+        )
+        save_approximate(f'cancellation_percentage_by_{cat}', bbox_inches='tight')
+    approximate_figure(f'cancellation_percentage_by_{cat}')(cancellation_estimate)
+
+
+@approximate_figure('discount_percentage_by_category')
+def discount_percentage_by_category(sample):
+    interval_bars(sampling.discount_rates(sample), 'Discounted Units per Completed Order Line by Category (95% CI)')
+    save_approximate('discount_percentage_by_category', bbox_inches='tight')
+
+
+# Stacked shares of the top states; the widest interval is given in the title
+@approximate_figure('regional_order_percentages_by_category')
+def regional_order_percentages_estimate(sample):
+    states = sampling.top_states(sample)
+    shares = sampling.regional_shares(sample, states) * 100
+    pivot = shares['estimate'].unstack('category').reindex(states[::-1])
+    pivot.plot(kind='barh', stacked=True, figsize=(7, 5))
+    widest = (shares['high'] - shares['low']).max() / 2
+    plt.title(f'Order Percentage by Category (95% CI within ±{widest:.1f} pts)')
+    plt.xlabel('Percent')
+    plt.ylabel('State or Territory')
+    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.tight_layout()
+    save_approximate('regional_order_percentages_by_category')
+
+
+# Weighted unit price histograms per category, with the median and its interval
+@approximate_figure('price_distribution')
+def price_distribution_estimate(sample):
+    completed, prices = sampling.unit_prices(sample)
+    completed = completed.assign(unit_price=prices, category=completed['category'].astype(str))
+    medians = sampling.quantile_estimates(completed, prices, ['category'])
+    g = sns.displot(
+        data=completed, x='unit_price', weights='weight', bins=30, col='category', hue='category',
+        col_wrap=3, height=3, legend=False, facet_kws={'sharex': False, 'sharey': False}
+    )
+    for category, ax in g.axes_dict.items():
+        median = medians.loc[category]
+        ax.axvspan(median['low'], median['high'], color='black', alpha=0.15)
+        ax.axvline(median['estimate'], color='black', linewidth=1)
+        ax.set_title(f"{category}: median {median['estimate']:.0f} ({median['low']:.0f}-{median['high']:.0f})")
+    g.fig.suptitle('Unit Price Distribution of Completed Orders by Category', y=1.02)
+    g.set_axis_labels('Unit Price', 'Orders')
+    save_approximate('price_distribution', bbox_inches='tight')
+
+
+# Draw the approximate figures from a sample of `size` order lines
+def render_approximate(names=None, size=sampling.sample_size, path=data_path):
+    with step('sample') as info:
+        sample = sampling.load_sample(size, path=path)
+        info['rows_out'] = len(sample)
+    for name in names or approximate_figures:
+        plt.close('all')
+        try:
+            with step(name):
+                approximate_figures[name](sample)
+        finally:
+            plt.close('all')
+    return list(names or approximate_figures)
+
+
+# Render cache index: output file -> key it was last written with
+def read_render_index():
+    if os.path.exists(render_index_path):
+        with open(render_index_path) as f:
+            return json.load(f)
+    return {}
+
+
+def write_render_index(index):
+    os.makedirs(cache_path, exist_ok=True)
+    with open(render_index_path, 'w') as f:
+        json.dump(index, f, indent=1)
+
+
+def render_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(fingerprint(part).encode())
+    return digest.hexdigest()[:16]
+
+
+def figure_key(name):
+    func, inputs, spec = figures[name]
+    return render_key(name, func, inputs, savefig, *density_code, spec, *inputs(data))
+
+
+# Render one figure on a clean pyplot state
+def render(name):
+    func, inputs, spec = figures[name]
+    plt.close('all')
+    try:
+        with step(name):
+            func(*inputs(data), **spec)
+    finally:
+        plt.close('all')
+    return name
+
+
+# Pool task: render and hand the worker's step records back to the parent
+def render_task(name, parents=()):
+    instrument.reset(parents)
+    render(name)
+    return instrument.snapshot()
+
+
+# Write the exported tables whose content changed. Returns table name -> 'hit' or 'miss'.
+def export_tables(force=False):
+    index = read_render_index()
+    report = {}
+    for name, (path, build, options) in tables.items():
+        with step(name) as info:
+            table = build(data)
+            info['rows_out'] = len(table)
+            file = os.path.join(path, f'{name}.csv')
+            key = render_key(name, build, options, table)
+            report[name] = 'hit' if not force and index.get(file) == key and os.path.exists(file) else 'miss'
+            if report[name] == 'miss':
+                table.to_csv(file, **options)
+                index[file] = key
+    write_render_index(index)
+    return report
+
+
+# Render the figures whose key changed across a process pool. Computing the keys loads the
+# data of every figure asked for, so forked workers inherit it; where fork is unavailable
+# each worker loads what its tasks read.
+# Returns figure name -> 'hit' or 'miss'.
+def render_figures(names=None, workers=None, force=False):
+    names = list(figures) if names is None else names
+    index = read_render_index()
+    keys = {name: figure_key(name) for name in names}
+    files = {name: os.path.join(figures_path, f'{name}.png') for name in names}
+    stale = [
+        name for name in names
+        if force or index.get(files[name]) != keys[name] or not os.path.exists(files[name])
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    if workers <= 1:
+        for name in stale:
+            render(name)
+    else:
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        task = partial(render_task, parents=list(instrument.stack))
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method)) as pool:
+            for records in pool.map(task, stale):
+                instrument.merge(records)
+    index.update({files[name]: keys[name] for name in stale})
+    write_render_index(index)
+    return {name: 'miss' if name in stale else 'hit' for name in names}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the analysis figures and tables.')
+    parser.add_argument('--figures', nargs='+', metavar='NAME', choices=sorted(set(figures) | set(approximate_figures)),
+                        help='render only these figures')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='redraw even when nothing changed')
+    parser.add_argument('--list', action='store_true', help='list figure names and exit')
+    parser.add_argument('--approximate', action='store_true',
+                        help='draw the approximate figures from a stratified sample of the orders')
+    parser.add_argument('--sample-size', type=int, default=sampling.sample_size,
+                        help='order lines in the sample for --approximate')
+    parser.add_argument('--flame', action='store_true',
+                        help='print a per-step summary and write folded stacks next to the run report')
+    args = parser.parse_args()
+
+    available = approximate_figures if args.approximate else figures
+    unknown = [name for name in args.figures or [] if name not in available]
+    if unknown:
+        parser.error(f'no {"approximate " if args.approximate else ""}figure {", ".join(unknown)}')
+    if args.list:
+        print('\n'.join(available))
+    elif args.approximate:
+        with step('approximate'):
+            drawn = render_approximate(args.figures, args.sample_size)
+        print(f'{len(drawn)} approximate figures in {os.path.join(figures_path, "approximate")}')
+        run_report = instrument.write_report('visualization_approximate', args.flame)
+        if run_report:
+            print(f'run report: {run_report}')
+    else:
+        with step('tables'):
+            report = export_tables(args.force)
+        with step('figures'):
+            report.update(render_figures(args.figures, args.workers, args.force))
+        for name, result in report.items():
+            print(f'{name}: {result}')
+        hits = sum(result == 'hit' for result in report.values())
+        print(f'{hits} hit, {len(report) - hits} miss')
+        run_report = instrument.write_report('visualization', args.flame)
+        if run_report:
+            print(f'run report: {run_report}')
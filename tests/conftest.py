@@ -0,0 +1,57 @@
+# Import dependencies
+import os
+import shutil
+import sys
+import pytest
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+source_path = os.path.join(repo_root, 'src')
+processed_path = os.path.join(repo_root, 'data', 'processed')
+sys.path.insert(0, source_path)
+
+from imputation import impute_orders, build_orders
+from pandas_cleaning import clean, read_raw
+from store import apply_schema
+from synthetic import generate
+
+
+# Modules loaded from a src directory
+def source_modules(path):
+    return {name: module for name, module in list(sys.modules.items())
+            if os.path.dirname(os.path.abspath(getattr(module, '__file__', None) or os.sep)) == path}
+
+
+# A small synthetic raw report fitted to the committed feature tables, shared by every test
+@pytest.fixture(scope='session')
+def raw_report(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('raw')
+    profile = directory / 'processed'
+    profile.mkdir()
+    for file in os.listdir(processed_path):
+        if file.endswith('.csv'):
+            shutil.copy(os.path.join(processed_path, file), profile)
+    return generate(4000, str(directory / 'amazon_sales_report.csv'), seed=0, path=str(profile))
+
+
+# The report cleaned and imputed like the orders table
+@pytest.fixture(scope='session')
+def orders(raw_report):
+    return apply_schema(build_orders(impute_orders(clean(read_raw(raw_report)))), 'orders')
+
+
+# A copy of the project in a temporary directory, first on the import path. Modules take their
+# data paths from their own location when imported, so tests that write state import them
+# inside the fixture and leave the repository's data alone.
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    root = tmp_path / 'project'
+    shutil.copytree(source_path, root / 'src', ignore=shutil.ignore_patterns('__pycache__'))
+    (root / 'data' / 'processed').mkdir(parents=True)
+    saved = source_modules(source_path)
+    for name in saved:
+        del sys.modules[name]
+    monkeypatch.syspath_prepend(str(root / 'src'))
+    yield root
+    for name in source_modules(str(root / 'src')):
+        del sys.modules[name]
+    sys.modules.update(saved)
@@ -0,0 +1,63 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import build_feature_tables, cancelled_status
+
+
+@pytest.fixture(scope='module')
+def tables(orders):
+    return build_feature_tables(orders)
+
+
+def test_sales(orders, tables):
+    for name, cancelled in [('sales', False), ('sales_cancelled', True)]:
+        rows = orders[(orders['status'] == cancelled_status) == cancelled]
+        rows = rows.assign(asin=rows['asin'].astype(str), discounted=rows['quantity'] * rows['promotion_ids'])
+        grouped = rows.groupby('asin')
+        expected = pd.DataFrame({
+            'total_orders': grouped.size(),
+            'orders_at_discount': grouped['discounted'].sum(),
+            'units_sold': grouped['quantity'].sum(),
+            'median_unit_price': (rows['amount'] / rows['quantity']).groupby(rows['asin']).median(),
+            'amount': grouped['amount'].sum()
+        })
+        table = tables[name].set_index(tables[name]['asin'].astype(str))
+        assert len(table) == len(expected)
+        table = table.reindex(expected.index)
+        for col in ['total_orders', 'orders_at_discount', 'units_sold']:
+            assert table[col].tolist() == expected[col].tolist(), (name, col)
+        assert np.allclose(table['median_unit_price'], expected['median_unit_price'])
+        revenue = 'missed_revenue' if cancelled else 'revenue'
+        assert np.allclose(table[revenue], expected['amount'], rtol=0, atol=0.5 + 1e-6)
+        # Ordered by units sold, then asin
+        order = tables[name][['units_sold', 'asin']].astype({'asin': str})
+        assert order.equals(order.sort_values(['units_sold', 'asin'], ascending=[False, True]))
+
+
+def test_regional(orders, tables):
+    state = orders['ship_state_or_territory'].astype(str)
+    cancelled = orders['status'] == cancelled_status
+    regional = tables['regional_sales'].set_index(tables['regional_sales']['ship_state_or_territory'].astype(str))
+    assert regional['total_orders'].to_dict() == state.value_counts().to_dict()
+    assert regional['cancelled_orders'].to_dict() == cancelled.groupby(state).sum().to_dict()
+    assert regional['unique_orders'].to_dict() == orders['order_id'].groupby(state).nunique().to_dict()
+    demand = tables['regional_demand']
+    counts = orders.groupby([orders['asin'].astype(str), state]).size()
+    found = demand.set_index([demand['asin'].astype(str), demand['ship_state_or_territory'].astype(str)])['regional_orders']
+    assert found.sort_index().tolist() == counts.sort_index().tolist()
+    # Each asin's states are ranked 1..n by orders
+    ranks = demand.sort_values(['asin', 'rank'])
+    assert (ranks.groupby('asin', observed=True)['regional_orders'].diff().dropna() <= 0).all()
+
+
+def test_weekly(orders, tables):
+    completed = orders[orders['status'] != cancelled_status]
+    week = completed['date'].dt.to_period('W-SUN').dt.start_time
+    weekly = tables['weekly_revenue'].set_index('week_start')
+    assert weekly['total_orders'].tolist() == completed['order_id'].groupby(week).nunique().tolist()
+    assert weekly['units_sold'].tolist() == completed['quantity'].groupby(week).sum().tolist()
+    revenue = completed['amount'].groupby(week).sum()
+    assert np.allclose(weekly['revenue'], revenue, rtol=0, atol=0.5 + 1e-6)
+    growth = (weekly['revenue'] - weekly['revenue'].shift()) / weekly['revenue'].shift() * 100
+    assert np.allclose(weekly['revenue_growth_pct'].iloc[1:].astype(float), growth.iloc[1:].round())
@@ -0,0 +1,40 @@
+# Import dependencies
+import pandas as pd
+from aggregates import build_feature_tables, feature_tables
+from backends import backends, run_backends, differences, build_tables, fastest, read_picks, write_picks
+from store import apply_schema
+
+
+def test_backends_agree(orders):
+    tables = run_backends(orders)[0]
+    assert set(tables) == set(backends)
+    assert differences(tables) == []
+
+
+# The pandas backend gives the tables the pipeline writes
+def test_pandas_backend(orders):
+    tables = run_backends(orders, ['pandas'])[0]['pandas']
+    expected = build_feature_tables(orders)
+    for name in feature_tables:
+        pd.testing.assert_frame_equal(tables[name], apply_schema(expected[name].reset_index(drop=True), name), obj=name)
+
+
+# Views run on their picked backends give the same tables, and picks round-trip through disk
+def test_build_picks(orders, tmp_path):
+    picks = {name: ['pandas', 'sqlite'][i % 2] for i, name in enumerate(feature_tables)}
+    path = str(tmp_path / 'picks.json')
+    assert read_picks(path) is None
+    write_picks(picks, path)
+    assert read_picks(path) == picks
+    tables = build_tables(orders, picks)
+    expected = run_backends(orders, ['pandas'])[0]['pandas']
+    for name in feature_tables:
+        pd.testing.assert_frame_equal(tables[name], expected[name], obj=name)
+
+
+def test_fastest():
+    seconds = {'pandas': dict.fromkeys(feature_tables, 1.0), 'sqlite': dict.fromkeys(feature_tables, 2.0)}
+    seconds['sqlite'][feature_tables[0]] = 0.5
+    picks = fastest(seconds)
+    assert picks[feature_tables[0]] == 'sqlite'
+    assert set(picks[name] for name in feature_tables[1:]) == {'pandas'}
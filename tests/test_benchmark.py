@@ -0,0 +1,13 @@
+# Import dependencies
+import pandas as pd
+from benchmark import bench_clean, bench_stream_clean
+
+
+# Large reports are cleaned in chunks and give the orders, and categoricals, of the in-memory stages
+def test_stream_clean(raw_report):
+    results = {}
+    expected = bench_clean(results, raw_report, 4000)
+    streamed = bench_stream_clean(results, raw_report, chunksize=700)
+    pd.testing.assert_frame_equal(streamed.astype(object), expected.astype(object))
+    assert list(streamed.select_dtypes('category')) == list(expected.select_dtypes('category'))
+    assert {'clean/read_raw', 'clean/dedup', 'clean/concat', 'clean/cities'} <= set(results)
@@ -0,0 +1,43 @@
+# Import dependencies
+import pandas as pd
+import pytest
+from catalog import Catalog, table
+from store import write_table
+
+
+def test_lazy():
+    built = []
+
+    def entry(name, value):
+        def build(catalog):
+            built.append(name)
+            return value(catalog)
+        return build
+
+    catalog = Catalog({
+        'numbers': entry('numbers', lambda catalog: pd.Series([1, 2, 3])),
+        'total': entry('total', lambda catalog: catalog['numbers'].sum())
+    })
+    assert built == [] and catalog.loaded() == [] and set(catalog) == {'numbers', 'total'}
+    assert catalog['total'] == 6 and catalog['total'] == 6
+    assert built == ['total', 'numbers'] and catalog.loaded() == ['numbers', 'total']
+    catalog.clear()
+    assert catalog['numbers'].sum() == 6 and built.count('numbers') == 2
+    with pytest.raises(KeyError):
+        catalog['missing']
+
+
+def test_table(orders, tmp_path):
+    write_table(orders, 'orders', str(tmp_path))
+    orders.to_csv(tmp_path / 'orders.csv', index=False)
+    catalog = Catalog({
+        'sales': table('orders', ['asin', 'category', 'amount'], {'category': {'dupatta': 'ethnic dress'}}),
+    }, str(tmp_path))
+    sales = catalog['sales']
+    assert list(sales.columns) == ['asin', 'category', 'amount']
+    assert sales['category'].dtype == 'category' and sales['amount'].dtype == 'float64'
+    assert 'dupatta' not in set(sales['category'].astype(str))
+    expected = orders['category'].astype(str).replace('dupatta', 'ethnic dress')
+    assert sales['category'].astype(str).tolist() == expected.tolist()
+    with pytest.raises(ValueError, match='no_such_column'):
+        table('orders', ['asin', 'no_such_column'])
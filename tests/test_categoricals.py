@@ -0,0 +1,49 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+from categoricals import (
+    relabel_categories, assign_category, fill_category, category_mask, drop_unused_categories
+)
+
+
+def states():
+    return pd.Series(['kerala', None, 'delhi', 'new delhi', 'kerala', 'goa'], index=range(3, 9), dtype='category')
+
+
+def values(series):
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+# Every transform gives the rows a fresh astype('category') of the plain values would
+def assert_fresh(series, expected):
+    assert values(series) == expected
+    assert list(series.cat.categories) == sorted({value for value in expected if value is not None})
+
+
+def test_relabel():
+    series = states()
+    relabeled = relabel_categories(series, {'new delhi': 'delhi', 'goa': 'panaji'})
+    assert_fresh(relabeled, ['kerala', None, 'delhi', 'delhi', 'kerala', 'panaji'])
+    assert relabeled.index.equals(series.index)
+    assert_fresh(relabel_categories(series, str.upper), ['KERALA', None, 'DELHI', 'NEW DELHI', 'KERALA', 'GOA'])
+
+
+def test_assign_and_fill():
+    series = states()
+    assert_fresh(fill_category(series, 'unknown'), ['kerala', 'unknown', 'delhi', 'new delhi', 'kerala', 'goa'])
+    mask = (series == 'kerala').to_numpy()
+    # Categories no row uses any more are kept, and new ones sorted in
+    assigned = assign_category(series, mask, 'assam')
+    assert values(assigned) == ['assam', None, 'delhi', 'new delhi', 'assam', 'goa']
+    assert list(assigned.cat.categories) == ['assam', 'delhi', 'goa', 'kerala', 'new delhi']
+    assert_fresh(assign_category(series, mask, 'delhi').cat.remove_unused_categories(),
+                 ['delhi', None, 'delhi', 'new delhi', 'delhi', 'goa'])
+
+
+def test_mask_and_drop():
+    series = states()
+    assert category_mask(series, ['goa', 'kerala', 'sikkim']).tolist() == [True, False, False, False, True, True]
+    assert not category_mask(series, []).any()
+    frame = drop_unused_categories(pd.DataFrame({'state': series[series != 'goa'], 'n': np.arange(5)}))
+    assert list(frame['state'].cat.categories) == ['delhi', 'kerala', 'new delhi']
+    assert list(series.cat.categories) == ['delhi', 'goa', 'kerala', 'new delhi']
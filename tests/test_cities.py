@@ -0,0 +1,93 @@
+# Import dependencies
+import pandas as pd
+import pytest
+import cities
+import pipeline
+from cities import CityIndex, bounded_distance, build_reference, load_reference, resolve_cities, memo_path
+
+
+rows = [
+    ('maharashtra', 'mumbai', 900), ('maharashtra', 'pune', 400), ('karnataka', 'bengaluru', 700),
+    ('uttar pradesh', 'rampur', 10), ('chhattisgarh', 'raipur', 50), ('kerala', 'kochi', 80)
+]
+
+
+def write_reference(path, rows=rows):
+    pd.DataFrame(rows, columns=['ship_state_or_territory', 'ship_city', 'orders']).to_csv(path, index=False)
+    return str(path)
+
+
+# Memos and file digests go to a scratch cache rather than data/cache
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache')
+    monkeypatch.setattr(cities, 'cache_path', path)
+    monkeypatch.setattr(pipeline, 'cache_path', path)
+    return path
+
+
+def test_bounded_distance():
+    assert bounded_distance('mumbai', 'mumbia', 2) == 2
+    assert bounded_distance('kochi', 'kochi', 1) == 0
+    assert bounded_distance('kitten', 'sitting', 2) is None
+    assert bounded_distance('pune', 'bengaluru', 2) is None
+
+
+def test_resolve_typos(tmp_path):
+    index = CityIndex(load_reference(write_reference(tmp_path / 'cities.csv')))
+    assert index.resolve('mumbia', 'maharashtra') == 'mumbai'
+    assert index.resolve('bengaluur', 'karnataka') == 'bengaluru'
+    assert index.resolve('kochii', 'kerala') == 'kochi'
+    # Known names and the unknown marker pass through; names beyond the bound are kept
+    assert index.resolve('pune', 'kerala') == 'pune'
+    assert index.resolve('unknown', 'kerala') == 'unknown'
+    assert index.resolve('thiruvananthapuram', 'kerala') == 'thiruvananthapuram'
+    assert index.resolve('puna', 'maharashtra') == 'pune'
+
+
+# One edit from both rampur and raipur: the state decides, else the more common name
+def test_resolve_by_state(tmp_path):
+    index = CityIndex(load_reference(write_reference(tmp_path / 'cities.csv')))
+    assert index.resolve('raimpur', 'uttar pradesh') == 'rampur'
+    assert index.resolve('raimpur', 'chhattisgarh') == 'raipur'
+    assert index.resolve('raimpur', None) == 'raipur'
+    # A state the reference does not list searches every state
+    assert index.resolve('mumbay', 'goa') == 'mumbai'
+
+
+def test_memo(tmp_path, cache):
+    reference = write_reference(tmp_path / 'cities.csv')
+    orders = pd.DataFrame({
+        'ship_state_or_territory': pd.Series(['maharashtra', 'maharashtra', None, 'kerala'], dtype='category'),
+        'ship_city': pd.Series(['mumbia', 'pune', 'kochii', None], dtype='string')
+    })
+    resolved = resolve_cities(orders.copy(), reference)
+    assert resolved['ship_city'].tolist()[:3] == ['mumbai', 'pune', 'kochi']
+    assert pd.isna(resolved['ship_city'].iloc[3])
+    assert resolved['ship_city'].dtype == orders['ship_city'].dtype
+
+    # A later run takes its answers from the memo of the same reference
+    memo = cities.read_memo(reference)
+    assert memo['maharashtra|mumbia'] == 'mumbai' and memo['None|kochii'] == 'kochi'
+    memo['maharashtra|mumbia'] = 'pune'
+    cities.write_memo(memo, reference)
+    assert resolve_cities(orders.copy(), reference)['ship_city'].iloc[0] == 'pune'
+
+    # A changed reference is a new memo
+    before = memo_path(reference)
+    write_reference(tmp_path / 'cities.csv', rows + [('maharashtra', 'thane', 5)])
+    assert memo_path(reference) != before
+    assert resolve_cities(orders.copy(), reference)['ship_city'].iloc[0] == 'mumbai'
+
+
+# A reference built from the cleaned orders resolves misspelt copies of their own cities
+def test_orders_reference(orders, tmp_path, cache):
+    reference = build_reference(orders, min_orders=20)
+    reference.to_csv(tmp_path / 'cities.csv', index=False)
+    index = CityIndex(load_reference(str(tmp_path / 'cities.csv')))
+    names = reference[reference['ship_city'].str.len() > 6]
+    assert len(names) > 0
+    for state, city in names[['ship_state_or_territory', 'ship_city']].itertuples(index=False):
+        # Two letters swapped
+        typo = city[:2] + city[3] + city[2] + city[4:]
+        assert index.resolve(typo, state) in set(reference.loc[reference['ship_state_or_territory'] == state, 'ship_city'])
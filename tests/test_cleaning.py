@@ -0,0 +1,56 @@
+# Import dependencies
+import filecmp
+import pandas as pd
+import pytest
+from pandas_cleaning import (
+    clean, read_raw, stream_clean, parallel_clean, hash_dedup_keys, find_incorrect_states,
+    states_territories, update
+)
+from store import write_table, read_table
+
+
+# The in-memory export (CSV and store) every other mode must reproduce byte for byte
+@pytest.fixture(scope='module')
+def serial(raw_report, tmp_path_factory):
+    output = tmp_path_factory.mktemp('serial') / 'amazon_sales_pdcleaned.csv'
+    cleaned = clean(read_raw(raw_report))
+    cleaned.to_csv(output, index=False)
+    write_table(cleaned, 'amazon_sales_pdcleaned', str(output.parent))
+    return output
+
+
+# The same CSV bytes, and the same typed table; categories may be listed in another order
+def assert_same_export(output, expected):
+    assert filecmp.cmp(output, expected, shallow=False)
+    pd.testing.assert_frame_equal(
+        read_table('amazon_sales_pdcleaned', path=str(output.parent)),
+        read_table('amazon_sales_pdcleaned', path=str(expected.parent)),
+        check_categorical=False
+    )
+
+
+# Chunks smaller than the report, so repeated keys fall in different chunks
+@pytest.mark.parametrize('chunksize', [333, 1000, 10_000])
+def test_stream_matches_serial(raw_report, serial, tmp_path, chunksize):
+    assert pd.Series(hash_dedup_keys(read_raw(raw_report))).duplicated().any()
+    output = tmp_path / 'amazon_sales_pdcleaned.csv'
+    stream_clean(raw_report, str(output), chunksize)
+    assert_same_export(output, serial)
+
+
+# One process over several partitions, and a pool of workers
+@pytest.mark.parametrize('workers, partitions', [(1, 3), (2, 2), (2, 5)])
+def test_parallel_matches_serial(raw_report, serial, tmp_path, workers, partitions):
+    output = tmp_path / 'amazon_sales_pdcleaned.csv'
+    cleaned = parallel_clean(raw_report, str(output), workers, partitions)
+    assert cleaned.equals(clean(read_raw(raw_report)))
+    assert_same_export(output, serial)
+
+
+# Names at the ends of the listing's lines are parsed like the others
+def test_states_territories():
+    assert len(states_territories) == 36
+    assert {'haryana', 'himachal pradesh', 'uttar pradesh', 'uttarakhand', 'delhi'} <= set(states_territories)
+    assert set(update.values()) - {'unknown'} <= set(states_territories)
+    states = pd.DataFrame({'ship_state': pd.Series(['haryana', 'meghalaya', 'rj', 'delhi'], dtype='category')})
+    assert find_incorrect_states(states).tolist() == ['rj']
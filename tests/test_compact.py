@@ -0,0 +1,32 @@
+# Import dependencies
+import pandas as pd
+from compact import write_compact, read_compact, open_compact
+from store import schemas
+
+
+def test_round_trip(orders, tmp_path):
+    write_compact(orders, 'orders', str(tmp_path))
+    decoded = read_compact('orders', path=str(tmp_path))
+    assert list(decoded.columns) == list(orders.columns)
+    for col, dtype in schemas['orders'].items():
+        values = decoded[col]
+        # String ids come back as categoricals over their vocabulary
+        if dtype == 'string':
+            values = values.astype(object).astype('string')
+        pd.testing.assert_series_equal(values, orders[col], obj=col)
+
+
+# Codes, and numbers stored in their declared type, are views of the mapped file
+def test_views(orders, tmp_path):
+    orders = orders.assign(index_id=orders['index_id'] + 2**40)
+    write_compact(orders, 'orders', str(tmp_path))
+    decoded = read_compact('orders', path=str(tmp_path))
+    file = open_compact('orders', str(tmp_path))
+    for col in ['asin', 'order_id', 'category']:
+        codes = decoded[col].cat.codes.to_numpy()
+        assert codes.dtype == file.column(col).type.index_type.to_pandas_dtype()
+        assert not codes.flags.writeable
+    assert file.schema.field('index_id').type == 'int64'
+    assert not decoded['index_id'].to_numpy().flags.writeable
+    # Decoded columns are new arrays
+    assert decoded['amount'].to_numpy().flags.writeable
@@ -0,0 +1,45 @@
+# Import dependencies
+import numpy as np
+import pytest
+from aggregates import cancelled_status
+from cube import build_cube, rates, cancel_rate, cube_dimensions, cube_pairs
+
+
+@pytest.fixture(scope='module')
+def cube(orders):
+    return build_cube(orders)
+
+
+# Orders, cancellations and rate by `dims`, grouped directly with labels as text
+def grouped_rates(orders, dims):
+    orders = orders.assign(
+        category=orders['category'].astype(str).replace('dupatta', 'ethnic dress'),
+        cancelled=orders['status'] == cancelled_status
+    )
+    keys = [orders[dim].astype(object).where(orders[dim].notna()).map(str, na_action='ignore') for dim in dims]
+    table = orders.groupby(keys, dropna=True)['cancelled'].agg(total_orders='size', cancelled_orders='sum')
+    return table.assign(cancel_rate=table['cancelled_orders'] / table['total_orders'])
+
+
+@pytest.mark.parametrize('dims', [(dim,) for dim in cube_dimensions] + [tuple(pair) for pair in cube_pairs])
+def test_rates(orders, cube, dims):
+    expected = grouped_rates(orders, list(dims))
+    table = rates(cube, *dims)
+    assert len(table) == len(expected)
+    table.index = table.index.map(lambda key: tuple(map(str, key)) if isinstance(key, tuple) else str(key))
+    table = table.reindex(expected.index)
+    assert table['total_orders'].tolist() == expected['total_orders'].tolist()
+    assert table['cancelled_orders'].tolist() == expected['cancelled_orders'].tolist()
+    assert np.allclose(table['cancel_rate'], expected['cancel_rate'])
+
+
+def test_cells(orders, cube):
+    total = rates(cube)
+    assert total['total_orders'].iloc[0] == len(orders)
+    assert total['cancelled_orders'].iloc[0] == (orders['status'] == cancelled_status).sum()
+    expected = grouped_rates(orders, ['ship_state_or_territory', 'category'])
+    (state, category), row = next(iter(expected.iterrows()))
+    # Dimensions can be named in any order
+    assert cancel_rate(cube, category=category, ship_state_or_territory=state) == pytest.approx(row['cancel_rate'])
+    with pytest.raises(ValueError):
+        rates(cube, 'size', 'style')
@@ -0,0 +1,38 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+from densities import bin_density, kde_curves, scott_bandwidth, as_numbers
+
+
+# Binning keeps every level's row count, mean and range
+def test_bin_density(orders):
+    binned = bin_density(orders, 'amount', 'status', size=256)
+    assert len(binned) <= 256 * orders['status'].cat.categories.size
+    rows = orders.dropna(subset=['amount'])
+    weights = binned.groupby('status', observed=True)['weight'].sum()
+    counts = rows.groupby('status', observed=True).size()
+    assert np.allclose(weights, counts.reindex(weights.index))
+    means = (binned['amount'] * binned['weight']).groupby(binned['status'], observed=True).sum() / weights
+    assert np.allclose(means, rows.groupby('status', observed=True)['amount'].mean().reindex(means.index))
+    assert binned['amount'].min() == rows['amount'].min() and binned['amount'].max() == rows['amount'].max()
+
+
+def test_bin_dates(orders):
+    binned = bin_density(orders, 'date', 'status')
+    assert pd.api.types.is_datetime64_any_dtype(binned['date'])
+    assert binned['date'].min() == orders['date'].min() and binned['date'].max() == orders['date'].max()
+
+
+# Curves from the grid match Gaussian kernels summed over the rows themselves
+def test_kde_curves(orders):
+    curves = kde_curves(bin_density(orders, 'amount', 'status'), 'amount', 'status')
+    rows = orders.dropna(subset=['amount'])
+    support = curves.index.to_numpy()
+    for level, curve in curves.items():
+        values = as_numbers(rows.loc[rows['status'] == level, 'amount'])
+        bandwidth, _ = scott_bandwidth(values, np.ones(len(values)))
+        kernel = np.exp(-0.5 * ((support[:, None] - values[None, :]) / bandwidth) ** 2)
+        expected = kernel.sum(axis=1) / (len(rows) * bandwidth * np.sqrt(2 * np.pi))
+        assert np.abs(curve.to_numpy() - expected).max() < 1e-3 * expected.max()
+    # Levels are scaled by their share of the rows, so the curves integrate to one together
+    assert abs(np.trapezoid(curves.sum(axis=1), support) - 1) < 0.01
@@ -0,0 +1,79 @@
+# Import dependencies
+from collections import Counter
+import numpy as np
+import pandas as pd
+import pytest
+from imputation import impute_payments
+from pandas_cleaning import clean, read_raw
+
+
+# The payment recovery of notebooks/sql_cleaning.txt, one statement at a time over plain rows
+def sql_recovery(orders):
+    rows = [dict(zip(['asin', 'quantity', 'amount'], values))
+            for values in zip(orders['asin'].astype(object), orders['quantity'], orders['amount'])]
+    for row, index in zip(rows, orders.index):
+        row['amount'] = None if pd.isna(row['amount']) else float(row['amount'])
+        row['index'] = index
+    # CREATE TABLE unit_price: mode() WITHIN GROUP (ORDER BY amount/quantity), smallest on ties
+    prices = {}
+    for row in rows:
+        if row['quantity'] >= 1 and row['amount'] is not None and row['amount'] > 0:
+            prices.setdefault(row['asin'], Counter())[row['amount'] / row['quantity']] += 1
+    mode = {asin: min(counts, key=lambda price: (-counts[price], price)) for asin, counts in prices.items()}
+    # UPDATE ... SET quantity FROM unit_price
+    for row in rows:
+        if row['asin'] in mode and row['quantity'] == 0:
+            row['quantity'] = 1 if row['amount'] is None else round(row['amount'] / mode[row['asin']])
+    # UPDATE ... SET quantity = 1 WHERE quantity = 0 AND amount IS NOT NULL
+    for row in rows:
+        if row['quantity'] == 0 and row['amount'] is not None:
+            row['quantity'] = 1
+    rows = [row for row in rows if row['quantity'] != 0]
+    # UPDATE ... SET amount FROM unit_price
+    for row in rows:
+        if row['asin'] in mode and (row['amount'] is None or row['amount'] == 0):
+            row['amount'] = mode[row['asin']] * row['quantity']
+    rows = [row for row in rows if row['amount'] is not None and row['amount'] != 0]
+    return pd.DataFrame(rows).set_index('index').rename_axis(None)
+
+
+def assert_matches_sql(orders):
+    recovered = impute_payments(orders)
+    expected = sql_recovery(orders)
+    assert recovered.index.tolist() == expected.index.tolist()
+    assert recovered['quantity'].tolist() == expected['quantity'].tolist()
+    assert np.allclose(recovered['amount'], expected['amount'].astype('float64'))
+
+
+def test_cases():
+    orders = pd.DataFrame({
+        'asin': ['A', 'A', 'A', 'A', 'A', 'B', 'B', 'C', 'C', 'D', 'E', 'E'],
+        'quantity': [1, 2, 1, 0, 0, 0, 1, 0, 1, 0, 1, 2],
+        'amount': [500, 1000, 450, 1250, np.nan, 0, 300, np.nan, 0, 200, 700, 1600]
+    })
+    assert_matches_sql(orders)
+    recovered = impute_payments(orders)
+    # A's mode is 500; 1250 / 500 rounds half to even
+    assert recovered.loc[3, 'quantity'] == 2
+    assert recovered.loc[4, ['quantity', 'amount']].tolist() == [1, 500]
+    # B recovers its amount; C has no price and is dropped; D has an amount and is one item
+    assert recovered.loc[5, ['quantity', 'amount']].tolist() == [1, 300]
+    assert 7 not in recovered.index and 8 not in recovered.index
+    assert recovered.loc[9, ['quantity', 'amount']].tolist() == [1, 200]
+    # E's prices tie (700 and 800), so its mode is the smaller
+    tie = pd.DataFrame({'asin': ['E', 'E', 'E'], 'quantity': [1, 2, 0], 'amount': [700, 1600, np.nan]})
+    assert impute_payments(tie)['amount'].tolist() == [700, 1600, 700]
+
+
+# Known prices from a longer history take the place of the modes found among the orders
+def test_unit_prices():
+    orders = pd.DataFrame({'asin': ['A', 'A', 'B'], 'quantity': [1, 0, 0], 'amount': [500, np.nan, np.nan]})
+    recovered = impute_payments(orders, pd.Series({'A': 450.0, 'B': 300.0}))
+    assert recovered['amount'].tolist() == [500, 450, 300]
+
+
+@pytest.mark.parametrize('start, size', [(0, 4000), (0, 600), (1500, 900)])
+def test_report(raw_report, start, size):
+    orders = clean(read_raw(raw_report)).iloc[start:start + size]
+    assert ((orders['quantity'] == 0) | orders['amount'].isna() | (orders['amount'] == 0)).any()
+    assert_matches_sql(orders)
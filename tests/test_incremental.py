@@ -0,0 +1,64 @@
+# Import dependencies
+import pandas as pd
+import pytest
+
+
+# The raw report split by date: the first part builds the store, the rest is appended
+@pytest.fixture
+def reports(raw_report, tmp_path):
+    raw = pd.read_csv(raw_report, dtype=str, keep_default_na=False)
+    dates = pd.to_datetime(raw['Date'], format='%m-%d-%y')
+    first = raw[dates <= dates.quantile(0.8)]
+    paths = [str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')]
+    first.to_csv(paths[0], index=False)
+    raw.drop(first.index).to_csv(paths[1], index=False)
+    return paths
+
+
+def assert_same_tables(tables, expected):
+    from aggregates import feature_tables
+    from store import apply_schema
+    for name in feature_tables:
+        pd.testing.assert_frame_equal(
+            apply_schema(tables[name].reset_index(drop=True), name),
+            apply_schema(expected[name].reset_index(drop=True), name),
+            obj=name
+        )
+
+
+# Merged summaries give the tables a rebuild over the stored history and the imputed report
+# gives. The history is not imputed again (see src/incremental.py).
+def test_append_matches_rebuild(project, reports):
+    import incremental
+    from aggregates import build_feature_tables
+    from pandas_cleaning import build_pipeline, clean, read_raw
+    from store import load_table
+
+    build_pipeline(path=reports[0]).run()
+    history = load_table('orders')
+    incremental.initialize(history)
+    report = incremental.impute_report(clean(read_raw(reports[1])))
+    appended = incremental.append_orders(report)
+    expected = build_feature_tables(incremental.complete_orders(pd.concat([history, report], ignore_index=True)))
+    assert_same_tables(appended, expected)
+    # Lines already merged are dropped, so appending the report again changes nothing
+    again = incremental.append_orders(incremental.impute_report(clean(read_raw(reports[1]))))
+    assert_same_tables(again, expected)
+
+
+# A report's payments are recovered as if the history and the report were imputed together
+def test_report_prices_from_history(project, reports):
+    import incremental
+    from imputation import impute_orders
+    from pandas_cleaning import build_pipeline, clean, read_raw
+    from store import load_table
+
+    build_pipeline(path=reports[0]).run()
+    history = load_table('orders')
+    incremental.initialize(history)
+    report = clean(read_raw(reports[1]))
+    both = impute_orders(pd.concat([history, report], ignore_index=True))
+    expected = both[both.index >= len(history)]
+    imputed = incremental.impute_report(report)
+    for col in ['quantity', 'amount']:
+        assert imputed[col].tolist() == expected[col].tolist()
@@ -0,0 +1,74 @@
+# Import dependencies
+import json
+import pandas as pd
+import pytest
+import instrument
+from instrument import step, iterate
+
+
+@pytest.fixture
+def records(monkeypatch):
+    monkeypatch.setattr(instrument, 'enabled', True)
+    instrument.reset()
+    yield instrument.steps
+    instrument.reset()
+
+
+def test_nested_steps(records):
+    frame = pd.DataFrame({'a': range(10)})
+    with step('clean', len(frame)) as info:
+        for chunk in iterate('read', [frame.iloc[:4], frame.iloc[4:]]):
+            with step('dedup', len(chunk)) as inner:
+                inner['rows_out'] = len(chunk) - 1
+        info['rows_out'] = 8
+    assert list(records) == ['clean', 'clean;read', 'clean;dedup']
+    assert records['clean;read']['calls'] == 3 and records['clean;read']['rows_out'] == 10
+    assert records['clean;dedup']['calls'] == 2
+    assert (records['clean;dedup']['rows_in'], records['clean;dedup']['rows_out']) == (10, 8)
+    assert records['clean']['wall'] >= records['clean;dedup']['wall']
+    assert records['clean']['peak_rss'] > 0
+
+
+# Steps are recorded even when the block raises
+def test_failed_step(records):
+    with pytest.raises(ValueError):
+        with step('load'):
+            raise ValueError
+    assert records['load']['calls'] == 1 and instrument.stack == []
+
+
+# Records of a worker fold into the parent's under the path it was started from
+def test_merge(records):
+    with step('figures'):
+        parents = list(instrument.stack)
+    parent = instrument.snapshot()
+    instrument.reset(parents)
+    with step('render'):
+        pass
+    worker = instrument.snapshot()
+    instrument.reset()
+    instrument.merge(parent)
+    instrument.merge(worker)
+    instrument.merge(worker)
+    assert list(instrument.steps) == ['figures', 'figures;render']
+    assert instrument.steps['figures;render']['calls'] == 2
+    # Folded stacks give each step the time not spent in its children
+    stacks = dict(line.rsplit(' ', 1) for line in instrument.folded_stacks(instrument.snapshot()))
+    total = instrument.steps['figures']['wall']
+    assert int(stacks['figures']) == max(int((total - instrument.steps['figures;render']['wall']) * 1e6), 0)
+
+
+def test_report(records, tmp_path):
+    with step('clean', 5) as info:
+        info['rows_out'] = 4
+    with open(instrument.write_report('test', path=str(tmp_path))) as f:
+        report = json.load(f)
+    assert report['run'] == 'test'
+    assert [(row['step'], row['rows_in'], row['rows_out']) for row in report['steps']] == [('clean', 5, 4)]
+
+
+def test_disabled(records, monkeypatch, tmp_path):
+    monkeypatch.setattr(instrument, 'enabled', False)
+    with step('clean', 5) as info:
+        info['rows_out'] = 4
+    assert records == {} and instrument.write_report('test', path=str(tmp_path)) is None
@@ -0,0 +1,57 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import cancelled_status
+from items import build_item_stats, quantile_from_counts, ItemIndex, rank_orders
+
+
+# PERCENTILE_CONT interpolates linearly between the values either side of q * (n - 1)
+@pytest.mark.parametrize('q', [0, 0.1, 0.25, 0.5, 0.75, 0.9, 1])
+def test_quantile_from_counts(q):
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame({
+        'asin': rng.choice([f'B{i:03d}' for i in range(40)], 400),
+        'unit_price': rng.choice([299.0, 349.5, 399.0, 412.25, 599.0, 1099.0], 400),
+        'count': rng.integers(1, 6, 400)
+    })
+    expected = prices.groupby('asin').apply(
+        lambda rows: np.quantile(np.repeat(rows['unit_price'], rows['count']), q, method='linear'),
+        include_groups=False
+    )
+    result = quantile_from_counts(prices, q)
+    pd.testing.assert_series_equal(result, expected, check_names=False, check_index_type=False)
+
+
+def test_item_stats(orders):
+    stats = build_item_stats(orders).set_index('asin')
+    priced = orders[(orders['quantity'] > 0) & (orders['amount'] > 0)]
+    priced = priced.assign(asin=priced['asin'].astype(str), unit_price=priced['amount'] / priced['quantity'])
+    completed = priced[priced['status'] != cancelled_status].groupby('asin')
+    rows = stats.loc[completed.size().index]
+    assert rows['total_orders'].tolist() == completed.size().tolist()
+    assert rows['units_sold'].tolist() == completed['quantity'].sum().tolist()
+    assert np.allclose(rows['median_unit_price'], completed['unit_price'].median())
+    # Mode over every priced line, ties to the smallest price
+    mode = priced.groupby('asin')['unit_price'].agg(lambda prices: prices.mode().min())
+    assert np.allclose(stats.loc[mode.index, 'unit_price_mode'], mode.to_numpy())
+
+
+def test_index(orders):
+    stats = build_item_stats(orders)
+    index = ItemIndex(stats)
+    for category in stats['category'].unique():
+        rows = stats[stats['category'] == category].sort_values(
+            ['total_orders', 'units_sold', 'asin'], ascending=[False, False, True]
+        )
+        assert index.top(category, 20)['asin'].tolist() == rows['asin'].iloc[:20].tolist()
+        sellers = rows[rows['top_seller']]
+        assert index.top(category, 20, top_sellers=True)['asin'].tolist() == sellers['asin'].iloc[:20].tolist()
+        by_revenue = rows.sort_values(['revenue', 'asin'], ascending=[False, True])
+        assert index.top(category, 5, 'revenue_rank')['asin'].tolist() == by_revenue['asin'].iloc[:5].tolist()
+    assert index.top('no such category').empty
+    asin = stats['asin'].iloc[3]
+    assert index.get(asin)['asin'] == asin
+    found = index.lookup([asin, 'B000000000'])
+    assert found['asin'].iloc[0] == asin and found['asin'].isna().iloc[1]
+    assert set(rank_orders) <= set(stats.columns)
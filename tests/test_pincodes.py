@@ -0,0 +1,61 @@
+# Import dependencies
+import pandas as pd
+from pincodes import PinIndex, repair_states, pin_numbers
+from store import read_table
+
+
+def orders():
+    return pd.DataFrame({
+        'ship_state_or_territory': pd.Series(
+            ['delhi', None, 'unknown', 'kerala', None, 'maharashtra', None], dtype='category'
+        ),
+        'ship_postal_code': ['110001', '110017', '400050', '110020', '999999', '400050', '12a']
+    })
+
+
+def values(column):
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def write_reference(path, rows):
+    pd.DataFrame(rows, columns=['prefix', 'ship_state_or_territory']).to_csv(path, index=False)
+    return str(path)
+
+
+def test_lookup_longest_prefix(tmp_path):
+    reference = write_reference(tmp_path / 'pins.csv', [('40', 'maharashtra'), ('4000', 'goa'), ('110', 'delhi')])
+    index = PinIndex(pd.read_csv(reference, dtype=str))
+    states = index.lookup(pin_numbers(pd.Series(['400050', '401000', '110001', '560001', '99999', None])))
+    assert [index.states[s] if s >= 0 else None for s in states] == ['goa', 'maharashtra', 'delhi', None, None, None]
+
+
+def test_repair(tmp_path):
+    reference = write_reference(tmp_path / 'pins.csv', [('110', 'delhi'), ('400', 'maharashtra')])
+    repaired = repair_states(orders(), reference, output=str(tmp_path))
+    # States missing, unknown or not in the reference take the PIN's; unmatched PINs are kept
+    assert values(repaired['ship_state_or_territory']) == [
+        'delhi', 'delhi', 'maharashtra', 'delhi', None, 'maharashtra', None
+    ]
+    report = read_table('pin_state_report', path=str(tmp_path))
+    counts = dict(zip(zip(*(values(report[col]) for col in report.columns[:3])), report['orders']))
+    assert counts == {('repaired', None, 'delhi'): 1, ('repaired', 'unknown', 'maharashtra'): 1,
+                      ('repaired', 'kerala', 'delhi'): 1}
+
+
+def test_repair_known_conflict(tmp_path):
+    reference = write_reference(tmp_path / 'pins.csv', [('110', 'delhi'), ('400', 'maharashtra')])
+    repaired = repair_states(orders(), reference, known=['delhi', 'kerala', 'maharashtra'], output=str(tmp_path))
+    assert repaired['ship_state_or_territory'].iloc[3] == 'kerala'
+    report = read_table('pin_state_report', path=str(tmp_path))
+    conflicts = report[report['kind'] == 'conflict']
+    assert conflicts[['ship_state_or_territory', 'pin_state_or_territory', 'orders']].values.tolist() == [
+        ['kerala', 'delhi', 1]
+    ]
+
+
+def test_empty_reference(tmp_path):
+    reference = write_reference(tmp_path / 'pins.csv', [])
+    expected = orders()
+    repaired = repair_states(orders(), reference, output=str(tmp_path))
+    pd.testing.assert_frame_equal(repaired, expected)
+    assert read_table('pin_state_report', path=str(tmp_path)).empty
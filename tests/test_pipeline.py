@@ -0,0 +1,72 @@
+# Import dependencies
+import filecmp
+import os
+import pytest
+import pipeline
+from pipeline import Stage, project_modules
+from pandas_cleaning import build_pipeline, clean, read_raw, fix_addresses
+
+
+# Stage outputs and file digests go to a scratch cache rather than data/cache
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache')
+    monkeypatch.setattr(pipeline, 'cache_path', path)
+    return path
+
+
+def test_cached_run(raw_report, tmp_path, cache):
+    output = tmp_path / 'amazon_sales_pdcleaned.csv'
+    orders = str(tmp_path / 'orders.csv')
+    stages = build_pipeline(raw_report, str(output), orders)
+    stages.run('export')
+    assert set(stages.report().values()) == {'miss', 'skipped'}
+    assert stages.report()['export'] == 'miss' and stages.report()['payments'] == 'skipped'
+    expected = tmp_path / 'expected.csv'
+    clean(read_raw(raw_report)).to_csv(expected, index=False)
+    assert filecmp.cmp(output, expected, shallow=False)
+    # A second run finds the export cached and evaluates nothing upstream
+    stages = build_pipeline(raw_report, str(output), orders)
+    stages.run('export')
+    assert stages.report() == {
+        'load': 'skipped', 'normalize': 'skipped', 'dedup': 'skipped', 'status': 'skipped',
+        'states': 'skipped', 'export': 'hit', 'payments': 'skipped', 'cities': 'skipped', 'orders': 'skipped'
+    }
+    # A deleted output is written again
+    os.remove(output)
+    stages = build_pipeline(raw_report, str(output), orders)
+    stages.run('export')
+    assert stages.report()['export'] == 'miss' and stages.report()['states'] == 'hit'
+    assert filecmp.cmp(output, expected, shallow=False)
+
+
+# Keys follow the raw file's content, not its path
+def test_file_keys(raw_report, tmp_path, cache):
+    copy = tmp_path / 'copy.csv'
+    copy.write_bytes(open(raw_report, 'rb').read())
+    assert build_pipeline(str(copy))['export'].key() == build_pipeline(raw_report)['export'].key()
+    with open(copy, 'a') as f:
+        f.write(open(raw_report).readlines()[-1])
+    assert build_pipeline(str(copy))['load'].key() != build_pipeline(raw_report)['load'].key()
+    assert build_pipeline(str(copy))['export'].key() != build_pipeline(raw_report)['export'].key()
+
+
+def test_project_modules():
+    names = {os.path.basename(file) for file in project_modules(fix_addresses)}
+    assert {'pandas_cleaning.py', 'pipeline.py', 'store.py'} <= names
+    assert all(os.path.dirname(file) == pipeline.source_path for file in project_modules(fix_addresses))
+
+
+# Editing a module the stage function only reaches through an import changes its key
+def test_helper_source_in_key(tmp_path, cache, monkeypatch):
+    source = tmp_path / 'src'
+    source.mkdir()
+    (source / 'scratch_helper.py').write_text('def scale(x):\n    return 2 * x\n')
+    (source / 'scratch_stage.py').write_text('from scratch_helper import scale\n\n\ndef run(x):\n    return scale(x)\n')
+    monkeypatch.setattr(pipeline, 'source_path', str(source))
+    monkeypatch.syspath_prepend(str(source))
+    import scratch_stage
+    before = Stage('scaled', scratch_stage.run, args=[1]).key()
+    assert Stage('scaled', scratch_stage.run, args=[1]).key() == before
+    (source / 'scratch_helper.py').write_text('def scale(x):\n    return x + x + x\n')
+    assert Stage('scaled', scratch_stage.run, args=[1]).key() != before
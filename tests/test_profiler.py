@@ -0,0 +1,51 @@
+# Import dependencies
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+from profiler import Profile, diff
+
+
+vocabularies = {'status': ['shipped', 'cancelled or returned', 'pending', 'unshipped']}
+
+
+def assert_same_summary(merged, single):
+    merged, single = copy.deepcopy(merged), copy.deepcopy(single)
+    assert list(merged) == list(single)
+    for col in single:
+        expected, found = single[col], merged[col]
+        assert found.pop('mean', None) == pytest.approx(expected.pop('mean', None)), col
+        assert found == expected, col
+
+
+# Chunks profiled on their own and folded together give the single-pass profile
+@pytest.mark.parametrize('size', [97, 500, 1500])
+def test_merge_chunks(orders, size):
+    single = Profile(vocabularies).add(orders).summary()
+    chunked = Profile(vocabularies)
+    for start in range(0, len(orders), size):
+        chunked.add(orders.iloc[start:start + size])
+    assert_same_summary(chunked.summary(), single)
+    # Partitions profiled apart and merged, in any order
+    parts = [Profile(vocabularies).add(orders.iloc[start::3]) for start in range(3)]
+    merged = parts[2].merge(parts[0]).merge(parts[1])
+    assert_same_summary(merged.summary(), single)
+    assert diff(merged.summary(), single).empty
+
+
+# Chunks of a single value and of nothing but nulls still fold into the single-pass profile
+def test_merge_degenerate_chunks():
+    frame = pd.DataFrame({
+        'amount': [500.0] * 50 + [np.nan] * 20 + list(np.linspace(199, 5685, 130)),
+        'quantity': [1] * 120 + list(range(1, 16)) * 4 + [3] * 20,
+        'promotion_ids': [False] * 100 + [True, False] * 50,
+        'date': pd.to_datetime('2022-04-01') + pd.to_timedelta(np.arange(200) // 7, unit='D'),
+        'status': ['shipped'] * 150 + ['unknown'] * 10 + ['lost'] * 40
+    })
+    single = Profile(vocabularies).add(frame).summary()
+    chunked = Profile(vocabularies)
+    for start in range(0, len(frame), 25):
+        chunked.add(frame.iloc[start:start + 25])
+    assert_same_summary(chunked.summary(), single)
+    assert single['status']['unknown'] == 10 and single['status']['invalid_labels'] == {'unknown': 10, 'lost': 40}
+    assert single['amount']['nulls'] == 20
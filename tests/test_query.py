@@ -0,0 +1,83 @@
+# Import dependencies
+import pandas as pd
+import pytest
+from aggregates import build_feature_tables, write_feature_tables, cancelled_status
+from query import SalesIndex, QueryService, records
+from store import write_table
+
+
+@pytest.fixture(scope='module')
+def tables(orders):
+    return build_feature_tables(orders)
+
+
+@pytest.fixture(scope='module')
+def index(orders, tables, tmp_path_factory):
+    path = tmp_path_factory.mktemp('processed')
+    write_feature_tables(tables, str(path))
+    write_table(orders, 'orders', str(path))
+    return SalesIndex(str(path), str(path / 'rollups'))
+
+
+def asins(rows):
+    return [row['asin'] for row in rows]
+
+
+def test_top(index, tables):
+    sales = tables['sales']
+    expected = sales.sort_values(['total_orders', 'asin'], ascending=[False, True])
+    assert asins(index.top(n=20)) == expected['asin'].head(20).tolist()
+    category = expected['category'].iloc[0]
+    assert asins(index.top(category=category, n=5)) == expected.loc[expected['category'] == category, 'asin'].head(5).tolist()
+    by_revenue = sales.sort_values(['revenue', 'asin'], ascending=[False, True])
+    assert asins(index.top(n=10, by='revenue')) == by_revenue['asin'].head(10).tolist()
+    assert index.top(category='no such category') == []
+    with pytest.raises(ValueError):
+        index.top(by='asin')
+
+
+def test_top_state(index, tables):
+    demand = tables['regional_demand']
+    state, category = demand[['ship_state_or_territory', 'category']].iloc[0]
+    rows = demand[(demand['ship_state_or_territory'] == state) & (demand['category'] == category)]
+    expected = rows.sort_values(['regional_orders', 'asin'], ascending=[False, True])
+    assert asins(index.top(category=category, state=state, n=5)) == expected['asin'].head(5).tolist()
+
+
+def test_asin(index, tables):
+    sales, cancelled = tables['sales'], tables['sales_cancelled']
+    asin = sales.sort_values('total_orders', ascending=False)['asin'].iloc[0]
+    answer = index.asin(asin, n=3)
+    assert answer['sales'] == records(sales[sales['asin'] == asin])[0]
+    assert (answer['cancelled'] is None) == (asin not in set(cancelled['asin']))
+    demand = tables['regional_demand']
+    regions = demand[demand['asin'] == asin].sort_values(['rank', 'ship_state_or_territory'])
+    assert [row['ship_state_or_territory'] for row in answer['regions']] == regions['ship_state_or_territory'].head(3).tolist()
+    with pytest.raises(KeyError):
+        index.asin('B000000000')
+
+
+def test_cancellation(index, orders):
+    cancelled = orders['status'] == cancelled_status
+    kurta = orders['category'] == 'kurta'
+    answer = index.cancellation(category='kurta')
+    assert answer['cancel_rate'] == pytest.approx(cancelled[kurta].mean())
+    state = orders['ship_state_or_territory'].value_counts().index[0]
+    rows = kurta & (orders['ship_state_or_territory'] == state)
+    assert index.cancellation(category='kurta', state=state)['cancel_rate'] == pytest.approx(cancelled[rows].mean())
+    by_size = pd.DataFrame(index.cancellation(by='size')).set_index('size')['cancel_rate']
+    assert by_size.to_dict() == pytest.approx(cancelled.groupby(orders['size'].astype(str)).mean().to_dict())
+    with pytest.raises(KeyError):
+        index.cancellation(category='no such category')
+
+
+# Repeated queries are answered from the cache, failed ones are not cached
+def test_service(index):
+    service = QueryService(index)
+    first = service.query('top', category='kurta', n='3')
+    assert service.query('top', n='3', category='kurta') == first
+    with pytest.raises(KeyError):
+        service.query('asin', asin='B000000000')
+    stats = service.stats()
+    assert stats['cache']['hits'] == 1 and stats['cache']['size'] == 1
+    assert stats['latency']['top']['count'] == 2 and stats['latency']['asin']['count'] == 1
@@ -0,0 +1,42 @@
+# Import dependencies
+import pandas as pd
+import pytest
+from aggregates import build_feature_tables
+from store import apply_schema
+from rollups import build_rollups, merge_rollups, daily_rollups, series, partition_months
+
+
+@pytest.fixture(scope='module')
+def rollups(orders, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('rollups'))
+    build_rollups(orders, path)
+    return path
+
+
+def test_weekly_matches_feature_table(orders, rollups):
+    expected = build_feature_tables(orders)['weekly_revenue'].reset_index(drop=True)
+    weekly = series('W', path=rollups).rename(columns={'period_start': 'week_start'})
+    assert len(partition_months(rollups)) > 1
+    pd.testing.assert_frame_equal(
+        apply_schema(weekly[expected.columns].copy(), 'weekly_revenue'), apply_schema(expected, 'weekly_revenue')
+    )
+
+
+# A range only covers its own days, and sums the days it spans
+def test_range(orders, rollups):
+    daily = series('D', path=rollups)
+    start, end = daily['period_start'].iloc[[3, -4]]
+    days = daily[(daily['period_start'] >= start) & (daily['period_start'] <= end)]
+    total = series('range', start, end, path=rollups)
+    assert len(total) == 1
+    for col in ['total_orders', 'units_sold', 'orders_at_discount', 'order_lines', 'cancelled_lines']:
+        assert total[col].iloc[0] == days[col].sum()
+
+
+def test_merge_batches(orders, rollups, tmp_path):
+    dates = pd.to_datetime(orders['date'])
+    middle = dates.sort_values().iloc[len(dates) // 2]
+    merge_rollups(daily_rollups(orders[dates < middle]), str(tmp_path))
+    merge_rollups(daily_rollups(orders[dates >= middle]), str(tmp_path))
+    for by in [(), ('category',), ('category', 'ship_state_or_territory')]:
+        pd.testing.assert_frame_equal(series('M', by=by, path=str(tmp_path)), series('M', by=by, path=rollups))
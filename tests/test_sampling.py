@@ -0,0 +1,84 @@
+# Import dependencies
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import cancelled_status
+from sampling import stratified_sample, ratio_estimates, cancellation_rates, regional_shares, strata
+
+
+@pytest.fixture(scope='module')
+def population(orders):
+    orders = orders.copy()
+    orders['category'] = orders['category'].astype(str).replace('dupatta', 'ethnic dress')
+    orders['cancelled'] = orders['status'] == cancelled_status
+    return orders
+
+
+def true_rates(population, col):
+    return population.groupby(population[col].astype(str))['cancelled'].mean()
+
+
+def test_sample(orders):
+    sample = stratified_sample(orders, 800, seed=3)
+    assert sample['weight'].sum() == pytest.approx(len(orders))
+    stratum_rows = sample.groupby('stratum')['stratum_rows'].first()
+    # Proportional shares, topped up to two rows in the small strata
+    assert 0.9 * 800 <= len(sample) <= 800 + 2 * len(stratum_rows)
+    assert stratum_rows.sum() == len(orders)
+    taken = sample.groupby('stratum').size()
+    assert (taken == sample.groupby('stratum')['stratum_sample'].first()).all()
+    assert (taken >= np.minimum(2, stratum_rows)).all()
+    # Every row of a stratum shares its labels
+    assert (sample.groupby('stratum')[strata].nunique(dropna=False) == 1).all().all()
+
+
+# Rates that split whole strata are exact, with a zero-width interval up to rounding
+@pytest.mark.parametrize('col', ['category', 'ship_state_or_territory'])
+def test_exact_strata(orders, population, col):
+    rates = cancellation_rates(stratified_sample(orders, 500, seed=1), col)
+    rates.index = rates.index.astype(str)
+    expected = true_rates(population, col)
+    assert np.allclose(rates['estimate'], expected.reindex(rates.index))
+    assert (rates['std_error'] < 1e-8).all()
+    assert (rates['low'] <= rates['estimate']).all() and (rates['estimate'] <= rates['high'] + 1e-12).all()
+
+
+def test_exact_shares(orders, population):
+    shares = regional_shares(stratified_sample(orders, 500, seed=1))
+    counts = population.groupby([population['ship_state_or_territory'].astype(str), 'category']).size()
+    expected = counts / counts.groupby(level=0).transform('sum')
+    shares.index = shares.index.map(lambda key: (str(key[0]), key[1]))
+    present = shares[shares['estimate'] > 0]
+    assert np.allclose(present['estimate'], expected.reindex(present.index))
+    assert (shares['std_error'] < 1e-8).all()
+
+
+# One stratum sampled without replacement: the usual standard error of a proportion
+def test_simple_random_sample():
+    rng = np.random.default_rng(0)
+    y = rng.random(200) < 0.3
+    sample = pd.DataFrame({
+        'group': 0, 'stratum': 0, 'stratum_rows': 1000, 'stratum_sample': 200, 'weight': 5.0
+    }, index=range(200))
+    table = ratio_estimates(sample, y, np.ones(200), ['group'])
+    assert table['estimate'].iloc[0] == pytest.approx(y.mean())
+    expected = np.sqrt((1 - 200 / 1000) * y.var(ddof=1) / 200)
+    assert table['std_error'].iloc[0] == pytest.approx(expected)
+    # The whole stratum sampled leaves no error
+    sample = sample.assign(stratum_rows=200, weight=1.0)
+    assert ratio_estimates(sample, y, np.ones(200), ['group'])['std_error'].iloc[0] == pytest.approx(0)
+
+
+# Rates across strata are estimated; their 95% intervals cover the true rate about that often
+def test_interval_coverage(orders, population):
+    expected = true_rates(population, 'size')
+    covered = []
+    for seed in range(40):
+        rates = cancellation_rates(stratified_sample(orders, 600, seed=seed), 'size')
+        rates.index = rates.index.astype(str)
+        rates = rates[rates['sample_rows'] >= 30]
+        truth = expected.reindex(rates.index)
+        covered += ((rates['low'] <= truth) & (truth <= rates['high'])).tolist()
+        assert (rates['std_error'] > 0).all()
+    assert len(covered) > 100
+    assert np.mean(covered) > 0.85
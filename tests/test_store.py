@@ -0,0 +1,53 @@
+# Import dependencies
+import os
+import pandas as pd
+import pytest
+from pandas_cleaning import clean, read_raw
+from store import schemas, apply_schema, write_table, read_table, read_csv_table, load_table, table_path, TableWriter
+
+
+# The cleaning export in its declared dtypes
+@pytest.fixture(scope='module')
+def cleaned(raw_report):
+    return apply_schema(clean(read_raw(raw_report)).reset_index(drop=True), 'amazon_sales_pdcleaned')
+
+
+def test_round_trip(cleaned, tmp_path):
+    write_table(cleaned, 'amazon_sales_pdcleaned', str(tmp_path))
+    stored = read_table('amazon_sales_pdcleaned', path=str(tmp_path))
+    assert stored.dtypes.astype(str).to_dict() == schemas['amazon_sales_pdcleaned']
+    pd.testing.assert_frame_equal(stored, cleaned)
+    assert list(read_table('amazon_sales_pdcleaned', ['asin', 'amount'], str(tmp_path))) == ['asin', 'amount']
+    # The CSV hand-off parses back to the same dtypes
+    cleaned.to_csv(tmp_path / 'amazon_sales_pdcleaned.csv', index=False)
+    parsed = read_csv_table('amazon_sales_pdcleaned', path=str(tmp_path))
+    pd.testing.assert_frame_equal(parsed, cleaned, check_categorical=False)
+
+
+# A CSV newer than its parquet copy is parsed again and refreshes the store
+def test_load_newer_csv(cleaned, tmp_path):
+    write_table(cleaned, 'amazon_sales_pdcleaned', str(tmp_path))
+    head = cleaned.head(10)
+    head.to_csv(tmp_path / 'amazon_sales_pdcleaned.csv', index=False)
+    parquet = table_path('amazon_sales_pdcleaned', str(tmp_path))
+    os.utime(parquet, (0, 0))
+    assert len(load_table('amazon_sales_pdcleaned', ['asin', 'amount'], str(tmp_path))) == 10
+    assert os.path.getmtime(parquet) > 0
+    pd.testing.assert_frame_equal(read_table('amazon_sales_pdcleaned', path=str(tmp_path)), head,
+                                  check_categorical=False)
+
+
+# Later chunks may bring more categories than the first chunk's dictionary index could hold
+def test_writer_widens_dictionaries(cleaned, tmp_path):
+    first = cleaned.head(50).copy()
+    first['ship_state_or_territory'] = pd.Categorical(['delhi'] * len(first))
+    second = cleaned.iloc[50:450].copy()
+    second['ship_state_or_territory'] = pd.Categorical([f'state {i}' for i in range(len(second))])
+    with TableWriter('amazon_sales_pdcleaned', str(tmp_path)) as writer:
+        writer.write(first)
+        writer.write(second)
+    stored = read_table('amazon_sales_pdcleaned', path=str(tmp_path))
+    assert stored['ship_state_or_territory'].dtype == 'category'
+    assert stored['ship_state_or_territory'].astype(str).tolist() == ['delhi'] * 50 + [f'state {i}' for i in range(400)]
+    expected = pd.concat([first, second], ignore_index=True).drop(columns='ship_state_or_territory')
+    pd.testing.assert_frame_equal(stored.drop(columns='ship_state_or_territory'), expected, check_categorical=False)
@@ -0,0 +1,34 @@
+# Import dependencies
+import filecmp
+import os
+import pandas as pd
+from pandas_cleaning import read_raw, raw_dtypes
+from store import load_table
+from synthetic import generate
+
+
+# The fixture's report was fitted to the committed feature tables copied next to it
+def profile_path(raw_report):
+    return os.path.join(os.path.dirname(raw_report), 'processed')
+
+
+def test_same_seed_same_file(raw_report, tmp_path):
+    path = profile_path(raw_report)
+    first = generate(2500, str(tmp_path / 'first.csv'), seed=7, chunksize=1000, path=path)
+    second = generate(2500, str(tmp_path / 'second.csv'), seed=7, chunksize=1000, path=path)
+    other = generate(2500, str(tmp_path / 'other.csv'), seed=8, chunksize=1000, path=path)
+    assert filecmp.cmp(first, second, shallow=False)
+    assert not filecmp.cmp(first, other, shallow=False)
+
+
+def test_report_shape(raw_report):
+    report = read_raw(raw_report)
+    assert list(report.columns) == list(raw_dtypes)
+    assert len(report) == 4000 and report['index'].tolist() == list(range(4000))
+    sales = load_table('sales', path=profile_path(raw_report))
+    assert set(report['ASIN']) <= set(sales['asin']) | set(load_table('sales_cancelled', path=profile_path(raw_report))['asin'])
+    # Repeated lines and missing payments for the cleaning to handle
+    assert report.duplicated(['Order ID', 'ASIN', 'Date']).any()
+    assert ((report['Qty'] == 0) & report['Amount'].isna()).any()
+    dates = pd.to_datetime(report['Date'], format='%m-%d-%y')
+    assert dates.min() >= pd.Timestamp('2022-03-31') and dates.max() <= pd.Timestamp('2022-06-29')
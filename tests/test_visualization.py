@@ -0,0 +1,100 @@
+# Import dependencies
+import os
+from pathlib import Path
+import pandas as pd
+import pytest
+import visualization
+from aggregates import build_feature_tables, write_feature_tables
+from items import build_item_stats, ItemIndex
+from store import read_table, write_table
+from visualization import top_seller
+
+
+def test_top_seller(orders):
+    stats = build_item_stats(orders)
+    sales = pd.DataFrame({'asin': stats['asin'].iloc[::-1].to_numpy()}, index=range(5, 5 + len(stats)))
+    flags = top_seller({'dataframes': {'sales': sales}, 'item_index': ItemIndex(stats)})
+    assert flags.dtype == bool and flags.index.equals(sales.index)
+    assert flags.tolist() == stats['top_seller'].iloc[::-1].tolist()
+
+
+def test_top_seller_missing_asin(orders):
+    stats = build_item_stats(orders)
+    sales = pd.DataFrame({'asin': [stats['asin'].iloc[0], 'B000000000']})
+    with pytest.raises(ValueError, match='B000000000'):
+        top_seller({'dataframes': {'sales': sales}, 'item_index': ItemIndex(stats)})
+
+
+# The feature tables of the orders in a scratch store, with figures and render keys kept
+# next to them
+@pytest.fixture
+def scratch(orders, tmp_path, monkeypatch):
+    path = tmp_path / 'processed'
+    path.mkdir()
+    (tmp_path / 'figures').mkdir()
+    write_feature_tables(build_feature_tables(orders), str(path))
+    write_table(orders, 'orders', str(path))
+    monkeypatch.setattr(visualization, 'figures_path', str(tmp_path / 'figures'))
+    monkeypatch.setattr(visualization, 'cache_path', str(tmp_path))
+    monkeypatch.setattr(visualization, 'render_index_path', str(tmp_path / 'renders.json'))
+    monkeypatch.setattr(visualization, 'data', visualization.load_data(str(path)))
+    return path
+
+
+def bar_counts(category, color):
+    category.value_counts().plot(kind='barh', color=color)
+    visualization.savefig('bar_counts')
+
+
+def test_render_cache(scratch, monkeypatch):
+    inputs = lambda data: (data['dataframes']['sales']['category'],)
+    monkeypatch.setitem(visualization.figures, 'bar_counts', (bar_counts, inputs, {'color': 'red'}))
+    file = os.path.join(visualization.figures_path, 'bar_counts.png')
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'miss'}
+    written = os.path.getmtime(file)
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'hit'}
+    assert os.path.getmtime(file) == written
+    assert visualization.render_figures(['bar_counts'], workers=1, force=True) == {'bar_counts': 'miss'}
+
+    # A new plot parameter, a missing file or a changed data slice is drawn again
+    monkeypatch.setitem(visualization.figures, 'bar_counts', (bar_counts, inputs, {'color': 'blue'}))
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'miss'}
+    os.remove(file)
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'miss'}
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'hit'}
+    sales = read_table('sales', path=str(scratch))
+    write_feature_tables({'sales': sales.iloc[1:]}, str(scratch))
+    monkeypatch.setattr(visualization, 'data', visualization.load_data(str(scratch)))
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'miss'}
+    assert os.path.exists(file)
+
+    # Columns the figure does not read leave its key alone
+    write_feature_tables({'sales': sales.iloc[1:].assign(revenue=0)}, str(scratch))
+    monkeypatch.setattr(visualization, 'data', visualization.load_data(str(scratch)))
+    assert visualization.render_figures(['bar_counts'], workers=1) == {'bar_counts': 'hit'}
+
+
+# A bar chart saved under `name`
+def counts_figure(name):
+    def plot(category, color):
+        category.value_counts().plot(kind='barh', color=color)
+        visualization.savefig(name)
+    return plot
+
+
+# Figures drawn across a process pool are the ones drawn in this process
+def test_parallel_render(scratch, monkeypatch):
+    inputs = lambda data: (data['dataframes']['sales']['category'],)
+    names = []
+    for color in ['red', 'blue', 'green']:
+        name = f'bar_counts_{color}'
+        monkeypatch.setitem(visualization.figures, name, (counts_figure(name), inputs, {'color': color}))
+        names.append(name)
+
+    def images():
+        return {name: Path(visualization.figures_path, f'{name}.png').read_bytes() for name in names}
+
+    assert visualization.render_figures(names, workers=3) == dict.fromkeys(names, 'miss')
+    pooled = images()
+    assert visualization.render_figures(names, workers=1, force=True) == dict.fromkeys(names, 'miss')
+    assert images() == pooled